@@ -29,7 +29,7 @@
 
 import logging
 import ssl
-from typing import Match
+from typing import Match, Optional
 
 import httpx
 import lazy_object_proxy
@@ -37,11 +37,35 @@ import lazy_object_proxy
 from ucsschool.kelvin.client import Session
 from ucsschool_id_connector.constants import HTTP_REQUEST_TIMEOUT
 from ucsschool_id_connector.models import SchoolAuthorityConfiguration
+from ucsschool_id_connector.rate_limit import RateLimiter, get_rate_limiter, parse_retry_after
 from ucsschool_id_connector.utils import ConsoleAndFileLogging, kelvin_url_regex
 
 logger: logging.Logger = lazy_object_proxy.Proxy(lambda: ConsoleAndFileLogging.get_logger(__name__))
 
 
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """Sends the requests of a Kelvin client session through a :py:class:`RateLimiter`."""
+
+    def __init__(self, rate_limiter: RateLimiter, transport: httpx.AsyncBaseTransport) -> None:
+        self.rate_limiter = rate_limiter
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await self.rate_limiter.acquire()
+        status: Optional[int] = None
+        retry_after: Optional[float] = None
+        try:
+            response = await self.transport.handle_async_request(request)
+            status = response.status_code
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            return response
+        finally:
+            self.rate_limiter.release(status, retry_after)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
 def kelvin_client_session(school_authority: SchoolAuthorityConfiguration, plugin_name: str) -> Session:
     m: Match = kelvin_url_regex().match(school_authority.url)
     if not m:
@@ -62,10 +86,18 @@ def kelvin_client_session(school_authority: SchoolAuthorityConfiguration, plugin
     for k, v in school_authority.plugin_configs[plugin_name].get("ssl_context", {}).items():
         logger.info("Applying to SSL context: %r=%r", k, v)
         setattr(ssl_context, k, v)
+    kwargs = {}
+    rate_limiter = get_rate_limiter(school_authority, plugin_name)
+    if rate_limiter:
+        # the client ignores `verify` when a transport is passed
+        kwargs["transport"] = RateLimitedTransport(
+            rate_limiter, httpx.AsyncHTTPTransport(verify=ssl_context)
+        )
     return Session(
         username=username,
         password=password,
         host=host,
         verify=ssl_context,
         timeout=timeout,
+        **kwargs,
     )
@@ -194,8 +194,10 @@ class PerSchoolAuthorityDispatcherBase(abc.ABC):
         return self._school_ids_on_target_cache
 
     async def refresh_schools(self):
+        # fetch before clearing, so concurrent out queue workers never see an empty cache
+        schools = await self.fetch_schools()
         self._school_ids_on_target_cache.clear()
-        self._school_ids_on_target_cache.update(await self.fetch_schools())
+        self._school_ids_on_target_cache.update(schools)
         self.logger.debug(
             "Schools known by API server: %s",
             ", ".join(self._school_ids_on_target_cache.keys()),
@@ -224,13 +226,24 @@ class PerSchoolAuthorityDispatcherBase(abc.ABC):
         return self._roles_on_target_cache
 
     async def refresh_roles(self):
+        roles = await self.fetch_roles()
         self._roles_on_target_cache.clear()
-        self._roles_on_target_cache.update(await self.fetch_roles())
+        self._roles_on_target_cache.update(roles)
         self.logger.debug(
             "Roles known by API server: %s",
             ", ".join(self._roles_on_target_cache.keys()),
         )
 
+    async def health_check(self) -> None:
+        """
+        Check the connection to the API of the school authority.
+
+        Only the short list of roles is fetched, the list of schools is reused
+        from :py:attr:`schools_ids_on_target` until its cache expires.
+        """
+        await self.refresh_roles()
+        await self.schools_ids_on_target
+
     async def fetch_roles(self) -> Dict[str, str]:
         """
         Fetch all roles from API of school authority.
@@ -454,8 +467,7 @@ class DispatcherPluginBase(abc.ABC):
         """impl for ucsschool_id_connector.plugins.Postprocessing.school_authority_ping"""
         handler = self.handler(school_authority, self.plugin_name)
         try:
-            await handler.refresh_roles()
-            await handler.refresh_schools()
+            await handler.health_check()
         except APICommunicationError as exc:
             self.logger.error(
                 "Error calling school authority API (%s): %s",
@@ -32,12 +32,16 @@ import binascii
 from pathlib import Path
 from typing import Any, Dict, Optional, Type, Union
 
-import aiofiles
 import ujson
 from pydantic import ValidationError
 
-from ucsschool_id_connector.constants import OLD_DATA_DB_PATH
+from ucsschool_id_connector.constants import (
+    OLD_DATA_DB_PATH,
+    UCRV_OLD_DATA_CACHE_SIZE,
+    UCRV_OLD_DATA_CACHE_TTL,
+)
 from ucsschool_id_connector.db import OldDataDB
+from ucsschool_id_connector.durable_files import get_group_commit, write_file_atomic_async
 from ucsschool_id_connector.ldap_access import LDAPAccess
 from ucsschool_id_connector.models import (
     ListenerAddModifyObject,
@@ -52,7 +56,7 @@ from ucsschool_id_connector.models import (
     ListenerUserRemoveObject,
 )
 from ucsschool_id_connector.plugins import hook_impl, plugin_manager
-from ucsschool_id_connector.utils import ConsoleAndFileLogging
+from ucsschool_id_connector.utils import ConsoleAndFileLogging, get_ucrv_int
 
 
 class ListenerObjectHandlerImpl:
@@ -68,7 +72,12 @@ class ListenerObjectHandlerImpl:
 
     def __init__(self):
         self.logger = ConsoleAndFileLogging.get_logger(self.__class__.__name__)
-        self.old_data_db = OldDataDB(OLD_DATA_DB_PATH, self.listener_old_data_entry_type)
+        self.old_data_db = OldDataDB(
+            OLD_DATA_DB_PATH,
+            self.listener_old_data_entry_type,
+            cache_size=get_ucrv_int(*UCRV_OLD_DATA_CACHE_SIZE),
+            cache_ttl=get_ucrv_int(*UCRV_OLD_DATA_CACHE_TTL),
+        )
 
     @hook_impl
     async def shutdown(self) -> None:
@@ -78,6 +87,16 @@ class ListenerObjectHandlerImpl:
         """
         self.old_data_db.close()
 
+    @hook_impl
+    async def preprocess_pass_start(self) -> None:
+        """Collect the old data stored during a preprocessing batch."""
+        self.old_data_db.begin()
+
+    @hook_impl
+    async def preprocess_pass_end(self) -> None:
+        """Store the old data of a preprocessing batch in one transaction."""
+        self.old_data_db.commit()
+
     @hook_impl
     def get_listener_object(self, obj_dict: Dict[str, Any]) -> Optional[ListenerObject]:
         """
@@ -112,7 +131,8 @@ class ListenerObjectHandlerImpl:
     @hook_impl
     async def save_listener_object(self, obj: ListenerObject, path: Path) -> bool:
         """
-        Store `obj` JSON encoded into file at `path`.
+        Store `obj` JSON encoded into file at `path`. The file is replaced
+        atomically, once the new content is synced to disk.
 
         Multiple `save_listener_object` hook implementations may run, until one
         returns `True`. Further implementations will not be executed.
@@ -130,8 +150,7 @@ class ListenerObjectHandlerImpl:
         obj_as_dict = await self.obj_as_dict(obj)
         json_text = ujson.dumps(obj_as_dict, sort_keys=True, indent=4)
 
-        async with aiofiles.open(path, "w") as fp:
-            await fp.write(json_text)
+        await write_file_atomic_async(path, json_text, get_group_commit())
         return True
 
     def get_old_data(self, obj: ListenerObject) -> Optional[ListenerOldDataEntry]:
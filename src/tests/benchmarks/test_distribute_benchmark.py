@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+import shutil
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+import ucsschool_id_connector.queue_backends
+import ucsschool_id_connector.queues
+
+NUM_FILES = 200
+
+
+def _distribute_to(s_a_names):
+    async def _s_a_names():
+        return set(s_a_names)
+
+    return Mock(side_effect=lambda **kwargs: [_s_a_names()])
+
+
+def _written_bytes(out_queues):
+    inodes = {}
+    for out_queue in out_queues:
+        for path in out_queue.path.glob("*.json"):
+            stat = path.stat()
+            inodes[stat.st_ino] = stat.st_blocks * 512
+    return sum(inodes.values())
+
+
+async def _distribute(temp_dir_func, school_authority_configuration, listener_file, num_s_a, link):
+    out_queues = []
+    for num in range(num_s_a):
+        s_a_config = school_authority_configuration(name=f"auth{num}")
+        out_queues.append(
+            ucsschool_id_connector.queues.OutQueue(
+                name=s_a_config.name, path=temp_dir_func(), school_authority=s_a_config
+            )
+        )
+    in_queue = ucsschool_id_connector.queues.InQueue(path=temp_dir_func(), out_queues=out_queues)
+    for num in range(NUM_FILES):
+        shutil.copy2(listener_file, in_queue.path / f"2020-01-01-00-00-00-{num:06d}_ready.json")
+    in_queue.logger.info = Mock()
+    with patch.object(
+        ucsschool_id_connector.queues.plugin_manager.hook,
+        "school_authorities_to_distribute_to",
+        _distribute_to([q.name for q in out_queues]),
+    ), patch(
+        "ucsschool_id_connector.queue_backends.os.link",
+        (
+            ucsschool_id_connector.queue_backends.os.link
+            if link
+            else Mock(side_effect=OSError(18, "EXDEV"))
+        ),
+    ):
+        t0 = time.perf_counter()
+        await in_queue.distribute()
+        duration = time.perf_counter() - t0
+    return duration, _written_bytes(out_queues)
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+@pytest.mark.parametrize("num_s_a", [1, 5, 20])
+async def test_distribute_fan_out(
+    num_s_a, mock_plugins, temp_dir_func, school_authority_configuration, example_user_json_path_real
+):
+    copy_time, copy_bytes = await _distribute(
+        temp_dir_func, school_authority_configuration, example_user_json_path_real, num_s_a, link=False
+    )
+    link_time, link_bytes = await _distribute(
+        temp_dir_func, school_authority_configuration, example_user_json_path_real, num_s_a, link=True
+    )
+    print(
+        f"\n{NUM_FILES} files to {num_s_a:>2} school authorities: "
+        f"copy: {copy_bytes / 1024:>8.0f} KiB {copy_time:.3f}s, "
+        f"link: {link_bytes / 1024:>8.0f} KiB {link_time:.3f}s"
+    )
+    assert link_bytes * num_s_a == copy_bytes
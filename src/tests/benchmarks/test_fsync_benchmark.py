@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+import asyncio
+import time
+
+import pytest
+
+from ucsschool_id_connector.durable_files import (
+    GroupCommit,
+    fsync_paths,
+    tmp_path_of,
+    write_file_atomic_async,
+)
+
+NUM_FILES = 500
+CONCURRENCY = 8
+DATA = '{"dn": "uid=demo_student,cn=schueler,cn=users,ou=DEMOSCHOOL,dc=foo,dc=bar"}' * 20
+
+
+async def _write_files(path, group_commit):
+    queue = asyncio.Queue()
+    for num in range(NUM_FILES):
+        queue.put_nowait(path / f"2020-01-01-00-00-00-{num:06d}.json")
+
+    async def writer():
+        while not queue.empty():
+            await write_file_atomic_async(queue.get_nowait(), DATA, group_commit)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(writer() for _ in range(CONCURRENCY)))
+    if group_commit is not None:
+        await group_commit.sync()
+    return time.perf_counter() - t0
+
+
+async def _write_files_fsync_each(path):
+    async def write(num):
+        target = path / f"2020-01-01-00-00-00-{num:06d}.json"
+        tmp_path = tmp_path_of(target)
+        tmp_path.write_text(DATA)
+        fsync_paths([str(tmp_path)], [])
+        tmp_path.rename(target)
+        fsync_paths([], [str(path)])
+
+    t0 = time.perf_counter()
+    for num in range(NUM_FILES):
+        await write(num)
+    return time.perf_counter() - t0
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+@pytest.mark.parametrize("window_ms", [None, 0, 2, 10, 50])
+async def test_fsync_batch_window(window_ms, temp_dir_func):
+    """
+    Throughput of crash-safe writes of listener files, without syncing
+    (`None`), and with group commits of several windows, compared to one
+    `fsync()` per file and directory.
+    """
+    path = temp_dir_func()
+    group_commit = None if window_ms is None else GroupCommit(window_ms / 1000)
+    duration = await _write_files(path, group_commit)
+    flushes = 0 if group_commit is None else group_commit.flushes
+    fsync_each = await _write_files_fsync_each(temp_dir_func())
+    print(
+        f"\nwindow {window_ms!s:>4} ms: {NUM_FILES / duration:>7.0f} files/s, {flushes:>4} flushes "
+        f"(one fsync per file: {NUM_FILES / fsync_each:>7.0f} files/s)"
+    )
+    assert len(list(path.iterdir())) == NUM_FILES
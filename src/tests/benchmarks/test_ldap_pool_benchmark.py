@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import ucsschool_id_connector.ldap_access
+
+NUM_QUERIES = 500
+# TCP connect, StartTLS, bind and reading the schema on a LAN
+CONNECT_LATENCY = 0.005
+QUERY_LATENCY = 0.0002
+
+
+def _connection(server, user=None, password=None, **kwargs):
+    time.sleep(CONNECT_LATENCY)
+    conn = MagicMock(bound=True, closed=False, user=user, password=password)
+    conn.search.side_effect = lambda *args, **kwargs: time.sleep(QUERY_LATENCY)
+    return conn
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+@pytest.mark.parametrize("pool_size", [0, 1, 4])
+async def test_ldap_connection_pool(pool_size):
+    """
+    Queries per second of :py:meth:`LDAPAccess.get_passwords` with a new
+    connection per query (pool size 0, like before the pool existed) and with
+    pooled connections. The LDAP server is simulated with fixed latencies.
+    """
+    ldap_access = ucsschool_id_connector.ldap_access.LDAPAccess()
+    with patch("ucsschool_id_connector.ldap_access.Connection", side_effect=_connection), patch.object(
+        ldap_access, "machine_password", return_value="secret"
+    ), patch("ucsschool_id_connector.ldap_access.get_ucrv_int", return_value=pool_size):
+        ldap_access.host_dn = "cn=host"
+        t0 = time.perf_counter()
+        for num in range(NUM_QUERIES):
+            await ldap_access.get_passwords(f"user{num}")
+        duration = time.perf_counter() - t0
+        pool = ucsschool_id_connector.ldap_access.get_connection_pool(ldap_access.server, "cn=host")
+        connects = pool.connects
+        ucsschool_id_connector.ldap_access.close_connection_pools()
+    print(f"\npool size {pool_size}: {NUM_QUERIES / duration:>6.0f} queries/s, {connects} connects")
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+import time
+
+import pytest
+
+from ucsschool_id_connector.db import OldDataDB
+from ucsschool_id_connector.models import ListenerUserOldDataEntry
+
+NUM_EVENTS = 10000
+NUM_OBJECTS = 2000
+
+
+def _events():
+    # several changes per object, like in a full sync or a school year change
+    for num in range(NUM_EVENTS):
+        key = f"{num % NUM_OBJECTS:08d}-0000-0000-0000-000000000000"
+        yield key, ListenerUserOldDataEntry(
+            record_uid=f"record_uid_{num}",
+            source_uid="TESTID",
+            schools=["DEMOSCHOOL", f"school{num % 10}"],
+        )
+
+
+def _preprocess(db, batched):
+    t0 = time.perf_counter()
+    if batched:
+        db.begin()
+    for key, entry in _events():
+        db.get(key)
+        db[key] = entry
+    if batched:
+        db.commit()
+    return time.perf_counter() - t0
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("cache_size", [0, NUM_OBJECTS])
+def test_old_data_db_batched_writes(cache_size, temp_dir_func):
+    """
+    Throughput of the old data DB during preprocessing, with one transaction
+    per preprocessing pass compared to one transaction per written entry.
+    """
+    single = _preprocess(OldDataDB(temp_dir_func(), ListenerUserOldDataEntry, cache_size), False)
+    db = OldDataDB(temp_dir_func(), ListenerUserOldDataEntry, cache_size)
+    batched = _preprocess(db, True)
+    print(
+        f"\ncache size {cache_size:>5}: single writes {NUM_EVENTS / single:>7.0f} events/s, "
+        f"batched writes {NUM_EVENTS / batched:>7.0f} events/s"
+    )
+    assert len(db._cache) == NUM_OBJECTS
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+import random
+import time
+
+import pytest
+from diskcache import Cache
+
+from ucsschool_id_connector.db import OldDataDB
+from ucsschool_id_connector.models import ListenerGroupOldDataEntry, ListenerUserOldDataEntry
+
+NUM_USERS = 195000
+NUM_GROUPS = 5000
+MEMBERS_PER_GROUP = 40
+NUM_DOMAIN_USERS = 20000  # members of one large group, like "Domain Users SCHOOL"
+NUM_READS = 20000
+
+
+def _user_dn(num):
+    return f"uid=user{num:06d},cn=schueler,cn=users,ou=school{num % 20:02d},dc=example,dc=com"
+
+
+def _entries():
+    for num in range(NUM_USERS):
+        yield f"user-{num:06d}", ListenerUserOldDataEntry(
+            schools=[f"school{num % 20:02d}"], record_uid=f"user{num:06d}", source_uid="TESTID"
+        )
+    for num in range(NUM_GROUPS):
+        members = [
+            _user_dn((num * MEMBERS_PER_GROUP + member) * 20 % NUM_USERS)
+            for member in range(MEMBERS_PER_GROUP)
+        ]
+        yield f"group-{num:06d}", ListenerGroupOldDataEntry(users=members)
+    yield "domain-users", ListenerGroupOldDataEntry(
+        users=[_user_dn(num) for num in range(NUM_DOMAIN_USERS)]
+    )
+
+
+def _db_size(path):
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+
+def _fill_legacy(path):
+    cache = Cache(str(path))
+    t0 = time.perf_counter()
+    with cache.transact():
+        for key, entry in _entries():
+            cache[key] = entry.dict()
+    duration = time.perf_counter() - t0
+    cache.close()
+    return duration
+
+
+def _fill(path):
+    db = OldDataDB(path, ListenerUserOldDataEntry)
+    t0 = time.perf_counter()
+    with db.transaction():
+        for key, entry in _entries():
+            db[key] = entry
+    duration = time.perf_counter() - t0
+    db.close()
+    return duration
+
+
+def _read(path):
+    user_db = OldDataDB(path, ListenerUserOldDataEntry)
+    group_db = OldDataDB(path, ListenerGroupOldDataEntry)
+    keys = [f"user-{random.randrange(NUM_USERS):06d}" for _ in range(NUM_READS)]
+    t0 = time.perf_counter()
+    for key in keys:
+        user_db.get(key)
+    users = (time.perf_counter() - t0) / NUM_READS
+    keys = [f"group-{random.randrange(NUM_GROUPS):06d}" for _ in range(NUM_READS)]
+    t0 = time.perf_counter()
+    for key in keys:
+        group_db.get(key)
+    groups = (time.perf_counter() - t0) / NUM_READS
+    t0 = time.perf_counter()
+    domain_users = group_db.get("domain-users")
+    large_group = time.perf_counter() - t0
+    assert len(domain_users.users) == NUM_DOMAIN_USERS
+    user_db.close()
+    group_db.close()
+    return users, groups, large_group
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("data_format", ["previous", "current", "migrated"])
+def test_old_data_format(data_format, temp_dir_func):
+    """
+    Size and latency of the old data DB with 200k objects, in the previous
+    format (pickled dicts), the current format and after the migration from
+    the previous format.
+    """
+    path = temp_dir_func()
+    num_objects = NUM_USERS + NUM_GROUPS + 1
+    if data_format == "current":
+        duration = _fill(path)
+    else:
+        duration = _fill_legacy(path)
+    if data_format == "migrated":
+        db = OldDataDB(path, ListenerUserOldDataEntry)
+        t0 = time.perf_counter()
+        while db.migrate()[1]:
+            pass
+        duration = time.perf_counter() - t0
+        db.close()
+    size = _db_size(path)
+    users, groups, large_group = _read(path)
+    print(
+        f"\n{data_format:>8}: {size / 2**20:6.1f} MiB, "
+        f"write {duration / num_objects * 1e6:5.1f} µs/object, "
+        f"get user {users * 1e6:5.1f} µs, get group {groups * 1e6:5.1f} µs, "
+        f"get group of {NUM_DOMAIN_USERS} members {large_group * 1e3:5.1f} ms"
+    )
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+import time
+
+import pytest
+
+from ucsschool_id_connector.old_data_rebuild import OldDataRebuild
+
+NUM_USERS = 100000
+NUM_GROUPS = 5000
+MEMBERS_PER_GROUP = 30
+
+
+def _user_dn(num):
+    return f"uid=user{num:06d},cn=schueler,cn=users,ou=school{num % 20:02d},dc=example,dc=com".encode()
+
+
+class PagesLDAPAccess:
+    """Yields prepared pages, to measure the rebuild without an LDAP server."""
+
+    def __init__(self):
+        self.users = [
+            {
+                "dn": _user_dn(num).decode(),
+                "raw_attributes": {
+                    "entryUUID": [f"user-{num:06d}".encode()],
+                    "ucsschoolSchool": [f"school{num % 20:02d}".encode()],
+                    "ucsschoolRecordUID": [f"user{num:06d}".encode()],
+                    "ucsschoolSourceUID": [b"TESTID"],
+                },
+            }
+            for num in range(NUM_USERS)
+        ]
+        self.groups = [
+            {
+                "dn": f"cn=class{num},cn=klassen,cn=groups,dc=example,dc=com",
+                "raw_attributes": {
+                    "entryUUID": [f"group-{num:06d}".encode()],
+                    "uniqueMember": [
+                        _user_dn((num * MEMBERS_PER_GROUP + member) % NUM_USERS)
+                        for member in range(MEMBERS_PER_GROUP)
+                    ],
+                },
+            }
+            for num in range(NUM_GROUPS)
+        ]
+
+    async def paged_search(self, filter_s, attributes=None, base=None, page_size=1000):
+        results = self.groups if "ucsschoolRole" in filter_s else self.users
+        for start in range(0, len(results), page_size):
+            yield results[start : start + page_size]
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+@pytest.mark.parametrize("overwrite", [False, True])
+async def test_old_data_rebuild(overwrite, temp_dir_func):
+    """
+    Throughput of building and writing the old data entries of 105k objects,
+    into an empty DB, and again overwriting all entries.
+    """
+    path = temp_dir_func()
+    ldap_access = PagesLDAPAccess()
+    t0 = time.perf_counter()
+    await OldDataRebuild(ldap_access, path).run()
+    empty = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    progress = await OldDataRebuild(ldap_access, path, overwrite=overwrite).run()
+    again = time.perf_counter() - t0
+    num = NUM_USERS + NUM_GROUPS
+    print(
+        f"\nempty DB: {num / empty:>7.0f} objects/s, "
+        f"again {'overwriting' if overwrite else 'keeping entries'}: {num / again:>7.0f} objects/s"
+    )
+    assert sum(p.read for p in progress) == num
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+import logging
+import time
+import uuid
+
+import pytest
+
+from ucsschool_id_connector.queue_backends import DirectoryQueueBackend, QueueEntry, SQLiteQueueBackend
+
+logger = logging.getLogger(__name__)
+
+
+def _backend(backend_name, path):
+    (path / "trash").mkdir()
+    (path / "keep").mkdir()
+    if backend_name == "sqlite":
+        return SQLiteQueueBackend(path, logger, lambda udm_object_type: 0)
+    return DirectoryQueueBackend(path, logger)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("num_items", [1000, 10000])
+@pytest.mark.parametrize("backend_name", ["directory", "sqlite"])
+def test_queue_backend(backend_name, num_items, temp_dir_func, example_user_json_path_real):
+    in_queue_dir = temp_dir_func()
+    backend = _backend(backend_name, temp_dir_func())
+    data = example_user_json_path_real.read_text()
+    sources = []
+    for num in range(num_items):
+        source = in_queue_dir / f"2020-01-01-00-00-00-{num:06d}_ready.json"
+        source.write_text(data)
+        sources.append(source)
+
+    t0 = time.perf_counter()
+    for source in sources:
+        backend.enqueue(source, QueueEntry(0, "users/user", str(uuid.uuid4()), 0.0))
+    enqueue_time = time.perf_counter() - t0
+
+    # one pass of the out queue: look for new items, get the next ones
+    t0 = time.perf_counter()
+    backend.unindexed_names()
+    head = backend.peek(100)
+    peek_time = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _, name in head:
+        backend.ack(name)
+    ack_time = (time.perf_counter() - t0) / len(head)
+
+    print(
+        f"\n{backend_name:>9} {num_items:>6} items: enqueue {num_items / enqueue_time:>7.0f}/s, "
+        f"pass {peek_time * 1000:>7.2f} ms, ack {ack_time * 1e6:>6.0f} µs"
+    )
+    assert len(backend) == num_items - len(head)
+    backend.close()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+import time
+import tracemalloc
+
+import pytest
+
+from ucsschool_id_connector.constants import QUEUE_SCAN_BATCH_SIZE
+from ucsschool_id_connector.queue_backends import list_queue_dir, scan_queue_dir
+
+
+def _measure(func):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    func()
+    duration = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return duration, peak
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("num_files", [10000, 50000])
+def test_queue_scan(num_files, temp_dir_func):
+    path = temp_dir_func()
+    for num in range(num_files):
+        (path / f"2020-01-01-00-00-00-{num:06d}.json").touch()
+
+    def _list():
+        list_queue_dir(path)
+
+    def _scan():
+        # the first batch of a pass
+        scan_queue_dir(path, QUEUE_SCAN_BATCH_SIZE)
+
+    list_time, list_peak = _measure(_list)
+    scan_time, scan_peak = _measure(_scan)
+    print(
+        f"\n{num_files:>6} files: list {list_peak / 1024:>7.0f} KiB {list_time * 1000:>6.1f} ms, "
+        f"scan {scan_peak / 1024:>7.0f} KiB {scan_time * 1000:>6.1f} ms"
+    )
+    assert scan_peak < list_peak
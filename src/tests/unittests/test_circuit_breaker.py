@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+import logging
+from unittest.mock import patch
+
+from ucsschool_id_connector.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def test_circuit_breaker_backoff():
+    breaker = CircuitBreaker("test", 5, 60, logging.getLogger(__name__))
+    assert breaker.state == HALF_OPEN
+    assert breaker.probe_due()
+    with patch("ucsschool_id_connector.circuit_breaker.time.monotonic", return_value=1000.0):
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.retry_in() == 5
+        for expected in (10, 20, 40, 60, 60):
+            breaker.record_failure()
+            assert breaker.backoff == expected
+    with patch("ucsschool_id_connector.circuit_breaker.time.monotonic", return_value=1059.0):
+        assert breaker.retry_in() == 1
+        assert breaker.state == OPEN
+    with patch("ucsschool_id_connector.circuit_breaker.time.monotonic", return_value=1060.0):
+        assert breaker.retry_in() == 0
+        assert breaker.state == HALF_OPEN
+        assert breaker.probe_due()
+
+
+def test_circuit_breaker_recovers():
+    breaker = CircuitBreaker("test", 5, 600, logging.getLogger(__name__))
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert not breaker.probe_due()
+    assert breaker.retry_in() == 0
+    breaker.record_failure()
+    assert breaker.backoff == 5
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from diskcache import Cache
+
+import ucsschool_id_connector.constants
+import ucsschool_id_connector.db
+from ucsschool_id_connector.models import ListenerGroupOldDataEntry, ListenerUserOldDataEntry
+
+
+def _old_data_db(path, **kwargs):
+    return ucsschool_id_connector.db.OldDataDB(path, ListenerUserOldDataEntry, **kwargs)
+
+
+def _entry(random_name):
+    return ListenerUserOldDataEntry(
+        schools=[random_name()], record_uid=random_name(), source_uid=random_name()
+    )
+
+
+def test_old_data_db_cache_read_through(temp_dir_func, random_name):
+    path = temp_dir_func()
+    db = _old_data_db(path, cache_size=10)
+    other_db = _old_data_db(path)
+    entry = _entry(random_name)
+    # write-through
+    db["key"] = entry
+    assert other_db["key"] == entry
+    with patch.object(db._cache, "get", side_effect=AssertionError("DB read")), patch.object(
+        db._cache, "__getitem__", side_effect=AssertionError("DB read")
+    ):
+        assert db.get("key") is entry
+        assert db["key"] is entry
+        assert "key" in db
+    assert db.cache_info() == ucsschool_id_connector.db.CacheInfo(hits=3, misses=0, size=1, max_size=10)
+
+    # written by another process: noticed after the check interval or when a transaction begins
+    other_entry = _entry(random_name)
+    other_db["key"] = other_entry
+    assert db.get("key") is entry
+    with patch(
+        "ucsschool_id_connector.db.time.monotonic",
+        return_value=time.monotonic()
+        + ucsschool_id_connector.constants.KEY_VALUE_DB_CHANGE_CHECK_INTERVAL,
+    ):
+        assert db.get("key") == other_entry
+    assert db.cache_info().misses == 1
+    assert db.get("key") is db.get("key")
+    newer_entry = _entry(random_name)
+    other_db["key"] = newer_entry
+    with db.transaction():
+        assert db.get("key") == newer_entry
+    assert db.cache_info().misses == 2
+
+    del db["key"]
+    assert db.get("key") is None
+    assert "key" not in other_db
+
+
+def test_old_data_db_cache_lru_and_ttl(temp_dir_func, random_name):
+    path = temp_dir_func()
+    db = _old_data_db(path, cache_size=2, cache_ttl=60)
+    for key in ("a", "b", "c"):
+        db[key] = _entry(random_name)
+    assert list(db._lru) == ["b", "c"]
+    db.get("b")
+    db.get("a")
+    # least recently used entry was dropped
+    assert list(db._lru) == ["b", "a"]
+
+    misses = db.cache_info().misses
+    with patch("ucsschool_id_connector.db.time.monotonic", return_value=db._lru["b"][0] + 59):
+        db.get("b")
+    assert db.cache_info().misses == misses
+    with patch("ucsschool_id_connector.db.time.monotonic", return_value=db._lru["b"][0] + 61):
+        db.get("b")
+    assert db.cache_info().misses == misses + 1
+
+
+def test_old_data_db_cache_touch_and_disabled(temp_dir_func, random_name):
+    path = temp_dir_func()
+    db = _old_data_db(path, cache_size=10)
+    db["key"] = _entry(random_name)
+    db.touch("key", expire=60)
+    assert "key" not in db._lru
+    assert db.get("key") == _old_data_db(path).get("key")
+
+    db = _old_data_db(path)
+    assert db.get("key")
+    assert db.cache_info() == ucsschool_id_connector.db.CacheInfo(0, 0, 0, 0)
+
+
+def test_old_data_db_transaction(temp_dir_func, random_name):
+    path = temp_dir_func()
+    other_db = _old_data_db(path)
+    db = _old_data_db(path)
+    entries = {key: _entry(random_name) for key in ("a", "b", "c")}
+    db["a"] = entries["a"]
+    with db.transaction():
+        db["b"] = entries["b"]
+        db.set_many({"c": entries["c"], "a": entries["b"]})
+        # visible in this instance, not yet written to the DB
+        assert db.get_many(["a", "b", "c", "d"]) == {
+            "a": entries["b"],
+            "b": entries["b"],
+            "c": entries["c"],
+        }
+        assert "c" in db
+        assert other_db.get("a") == entries["a"]
+        assert "b" not in other_db
+        db.touch("b", expire=60)
+        assert other_db.get("b") == entries["b"]
+        del db["c"]
+        assert "c" not in db
+    assert other_db.get_many(["a", "b", "c"]) == {"a": entries["b"], "b": entries["b"]}
+
+
+def test_old_data_db_transaction_commits_on_error(temp_dir_func, random_name):
+    path = temp_dir_func()
+    db = _old_data_db(path)
+    entry = _entry(random_name)
+    with patch("ucsschool_id_connector.db.KEY_VALUE_DB_BATCH_SIZE", 2):
+        try:
+            with db.transaction():
+                db.begin()
+                db["a"] = entry
+                db.commit()
+                # nested transaction: nothing is written yet
+                assert "a" not in _old_data_db(path)
+                db["b"] = entry
+                # batch size reached: written before the end of the transaction
+                assert "b" in _old_data_db(path)
+                db["c"] = entry
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+    assert _old_data_db(path).get_many(["a", "b", "c"]) == {"a": entry, "b": entry, "c": entry}
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"schools": ["DEMOSCHOOL"], "record_uid": "a", "source_uid": None},
+        {"users": []},
+        {
+            "users": [
+                "uid=a,cn=schueler,cn=users,ou=DEMOSCHOOL,dc=foo,dc=bar",
+                "uid=b,cn=schueler,cn=users,ou=DEMOSCHOOL,dc=foo,dc=bar",
+                "cn=Doe\\, John,cn=lehrer,cn=users,ou=DEMOSCHOOL,dc=foo,dc=bar",
+                "uid=\\\\,cn=users,dc=foo,dc=bar",
+                "dc=bar",
+                "uid=c,cn=schueler,cn=users,ou=DEMOSCHOOL,dc=foo,dc=bar",
+                "uid=ä,cn=schüler,dc=foo,dc=bar",
+            ],
+            "numbers": [1, 2],
+        },
+    ],
+)
+def test_old_data_encoding(data):
+    value = ucsschool_id_connector.db.encode_old_data(data)
+    assert value[0] == ucsschool_id_connector.db.OLD_DATA_FORMAT_VERSION
+    assert ucsschool_id_connector.db.decode_old_data(value) == data
+    with pytest.raises(ValueError):
+        ucsschool_id_connector.db.decode_old_data(b"\x00" + value[1:])
+
+
+def test_old_data_db_migrate(temp_dir_func, random_name):
+    path = temp_dir_func()
+    users = [f"uid={random_name()},cn=schueler,cn=users,ou=DEMOSCHOOL,dc=foo,dc=bar" for _ in range(3)]
+    legacy = Cache(str(path))
+    for num in range(5):
+        legacy[f"group{num}"] = {"users": users}
+    legacy.set("removed", {"users": users}, expire=60)
+    legacy.close()
+
+    db = ucsschool_id_connector.db.OldDataDB(path, ListenerGroupOldDataEntry)
+    # previous format is read
+    assert db.get("group0") == ListenerGroupOldDataEntry(users=users)
+    assert db.migrate(limit=4) == (4, True)
+    assert db.migrate(limit=4) == (2, False)
+    assert db.migrate(limit=4) == (0, False)
+    assert isinstance(db._cache.get("group4"), bytes)
+    assert db.get_many(f"group{num}" for num in range(5)) == {
+        f"group{num}": ListenerGroupOldDataEntry(users=users) for num in range(5)
+    }
+    _, expire_time = db._cache.get("removed", expire_time=True)
+    assert 0 < expire_time - time.time() <= 60
+
+
+def test_old_data_db_cull_and_vacuum(temp_dir_func, random_name):
+    path = temp_dir_func()
+    db = _old_data_db(path, cache_size=10)
+    entry = _entry(random_name)
+    for num in range(5):
+        db[f"key{num}"] = entry
+    for num in range(3):
+        db.touch(f"key{num}", expire=60)
+    db.get("key0")
+    assert len(db) == 5
+    assert db.cull() == 0
+    with patch("ucsschool_id_connector.db.time.time", return_value=time.time() + 61):
+        assert db.cull(limit=2) == 2
+        assert db.cull(limit=2) == 1
+    assert len(db) == 2
+    assert "key0" not in db._lru
+    assert db.get_many(f"key{num}" for num in range(5)) == {"key3": entry, "key4": entry}
+    db.vacuum()
+    assert not Path(path, "cache.db-wal").exists() or Path(path, "cache.db-wal").stat().st_size == 0
+    assert db.size() >= Path(path, "cache.db").stat().st_size
+
+
+def test_diskcache_internals(temp_dir_func):
+    """
+    KeyValueDB detects changes by other connections with the SQLite connection
+    of diskcache. Fails if a diskcache upgrade changes it (diskcache is pinned).
+    """
+    path = temp_dir_func()
+    cache = Cache(str(path))
+    other_cache = Cache(str(path))
+
+    def data_version():
+        return cache._con.execute("PRAGMA data_version").fetchone()[0]
+
+    version = data_version()
+    cache["key"] = "value"
+    assert data_version() == version
+    other_cache["key"] = "other value"
+    assert data_version() != version
+
+
+def test_diskcache_cull_internals(temp_dir_func):
+    """
+    KeyValueDB.cull() reads and deletes expired rows of the diskcache table
+    directly. Fails if a diskcache upgrade changes the table or the methods
+    used (diskcache is pinned).
+    """
+    cache = Cache(str(temp_dir_func()))
+    cache.set("small", "value", expire=1)
+    cache.set("large", "x" * 2**20, expire=1)
+    rows = cache._sql(
+        "SELECT rowid, key, raw, filename FROM Cache WHERE expire_time IS NOT NULL AND expire_time < ?",
+        (time.time() + 2,),
+    ).fetchall()
+    assert sorted(cache._disk.get(db_key, raw) for _, db_key, raw, _ in rows) == ["large", "small"]
+    (filename,) = [filename for *_, filename in rows if filename]
+    assert Path(cache.directory, filename).exists()
+    cache._disk.remove(filename)
+    assert not Path(cache.directory, filename).exists()
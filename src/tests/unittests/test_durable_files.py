@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+import asyncio
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+import ucsschool_id_connector.durable_files
+from ucsschool_id_connector.durable_files import (
+    GroupCommit,
+    tmp_path_of,
+    write_file_atomic,
+    write_file_atomic_async,
+)
+from ucsschool_id_connector.queue_backends import list_queue_dir
+
+
+def test_write_file_atomic(temp_dir_func):
+    path = temp_dir_func() / "test.json"
+    path.write_text("old")
+    write_file_atomic(path, "new")
+    assert path.read_text() == "new"
+    assert list(path.parent.iterdir()) == [path]
+
+
+@pytest.mark.asyncio
+async def test_write_file_atomic_async_keeps_old_content_on_error(temp_dir_func):
+    path = temp_dir_func() / "test.json"
+    path.write_text("old")
+    group_commit = GroupCommit(0)
+    with patch.object(group_commit, "sync", side_effect=OSError("disk full")):
+        with pytest.raises(OSError):
+            await write_file_atomic_async(path, "new", group_commit)
+    assert path.read_text() == "old"
+    assert not tmp_path_of(path).exists()
+
+
+@pytest.mark.asyncio
+async def test_group_commit_batches_fsyncs(temp_dir_func):
+    temp_dir = temp_dir_func()
+    paths = [temp_dir / f"{num}.json" for num in range(10)]
+    group_commit = GroupCommit(0.05)
+    with patch(
+        "ucsschool_id_connector.durable_files.fsync_paths",
+        wraps=ucsschool_id_connector.durable_files.fsync_paths,
+    ) as fsync_paths:
+        await asyncio.gather(*(write_file_atomic_async(path, "data", group_commit) for path in paths))
+        # one flush for the data of all files
+        fsync_paths.assert_called_once()
+        files, dirs = fsync_paths.call_args[0]
+        assert files == {str(tmp_path_of(path)) for path in paths}
+        assert dirs == {str(temp_dir)}
+        # the renames are synced with the next flush
+        assert len(group_commit) == 1
+        assert not group_commit.due()
+        await asyncio.sleep(0.05)
+        assert group_commit.due()
+        await group_commit.sync()
+        assert fsync_paths.call_count == 2
+        assert len(group_commit) == 0
+    assert sorted(temp_dir.iterdir()) == sorted(paths)
+
+
+def test_list_queue_dir_skips_tmp_files_being_written(temp_dir_func):
+    temp_dir = temp_dir_func()
+    path = temp_dir / "2020-01-01-00-00-00-000000.json"
+    path.write_text("{}")
+    tmp_path = tmp_path_of(temp_dir / "2020-01-01-00-00-00-000001.json")
+    tmp_path.write_text("{")
+    assert list_queue_dir(temp_dir) == ([path], [])
+    # left over from a crash
+    stale = time.time() - ucsschool_id_connector.constants.TMP_FILE_MAX_AGE - 1
+    os.utime(tmp_path, (stale, stale))
+    assert list_queue_dir(temp_dir) == ([path], [tmp_path])
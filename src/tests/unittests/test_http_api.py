@@ -69,10 +69,21 @@ def test_read_queues(zmq_context_mock, random_name, random_int, zmq_socket):
             "name": random_name(),
             "head": random_name(),
             "length": random_int(),
+            "oldest_entry_age": random_int(),
         },
         "out_queues": [
-            {"name": random_name(), "head": random_name(), "length": random_int()},
-            {"name": random_name(), "head": random_name(), "length": random_int()},
+            {
+                "name": random_name(),
+                "head": random_name(),
+                "length": random_int(),
+                "oldest_entry_age": random_int(),
+            },
+            {
+                "name": random_name(),
+                "head": random_name(),
+                "length": random_int(),
+                "oldest_entry_age": random_int(),
+            },
         ],
     }
     socket = zmq_socket({"result": queue_data})
@@ -88,15 +99,19 @@ def test_read_queues(zmq_context_mock, random_name, random_int, zmq_socket):
         ).json()
     )
     assert res.status_code == 200
-    queue_data["in_queue"]["school_authority"] = ""
-    queue_data["out_queues"][0]["school_authority"] = ""
-    queue_data["out_queues"][1]["school_authority"] = ""
+    for queue in [queue_data["in_queue"], *queue_data["out_queues"]]:
+        queue.update(school_authority="", overflow=0, alarm=False)
     assert res.json() == [queue_data["in_queue"], *queue_data["out_queues"]]
 
 
 @patch("ucsschool_id_connector.http_api.zmq_context")
 def test_read_queue(zmq_context_mock, random_name, random_int, zmq_socket):
-    queue_data = {"name": random_name(), "head": random_name(), "length": random_int()}
+    queue_data = {
+        "name": random_name(),
+        "head": random_name(),
+        "length": random_int(),
+        "oldest_entry_age": random_int(),
+    }
     socket = zmq_socket({"result": queue_data})
     zmq_context_mock.socket.return_value = socket
 
@@ -113,7 +128,7 @@ def test_read_queue(zmq_context_mock, random_name, random_int, zmq_socket):
         ).json()
     )
     assert res.status_code == 200
-    queue_data["school_authority"] = ""
+    queue_data.update(school_authority="", overflow=0, alarm=False)
     assert res.json() == queue_data
 
 
@@ -368,6 +383,94 @@ def test_create_school_to_school_authority_mapping(
     assert res.json() == school_to_authority_mapping.dict()
 
 
+@patch("ucsschool_id_connector.http_api.zmq_context")
+def test_read_dead_letters(zmq_context_mock, random_name, random_int, zmq_socket):
+    queue_name = random_name()
+    dead_letter = {
+        "name": f"{random_name()}.json",
+        "queue": queue_name,
+        "attempts": random_int(),
+        "last_error": random_name(),
+        "failed": "2020-01-01T00:00:00",
+        "data": None,
+    }
+    socket = zmq_socket({"result": [dead_letter]})
+    zmq_context_mock.socket.return_value = socket
+
+    res = client.get(
+        f"{ucsschool_id_connector.constants.URL_PREFIX}/queues/{queue_name}/dead_letters",
+        timeout=4.0,
+        headers={"Authorization": "Bearer TODO da token"},
+    )
+    socket.send_string.assert_called_with(
+        ucsschool_id_connector.models.RPCRequest(
+            cmd=ucsschool_id_connector.models.RPCCommand.get_dead_letters, name=queue_name
+        ).json()
+    )
+    assert res.status_code == 200
+    assert res.json() == [dead_letter]
+
+
+@patch("ucsschool_id_connector.http_api.zmq_context")
+def test_replay_dead_letters(zmq_context_mock, random_name, zmq_socket):
+    queue_name = random_name()
+    items = [f"{random_name()}.json", f"{random_name()}.json"]
+    socket = zmq_socket({"result": items})
+    zmq_context_mock.socket.return_value = socket
+
+    res = client.post(
+        f"{ucsschool_id_connector.constants.URL_PREFIX}/queues/{queue_name}/dead_letters/replay",
+        json={"items": items},
+        timeout=4.0,
+        headers={"Authorization": "Bearer TODO da token"},
+    )
+    socket.send_string.assert_called_with(
+        ucsschool_id_connector.models.RPCRequest(
+            cmd=ucsschool_id_connector.models.RPCCommand.replay_dead_letters,
+            name=queue_name,
+            items=items,
+        ).json()
+    )
+    assert res.status_code == 200
+    assert res.json() == items
+
+
+@patch("ucsschool_id_connector.http_api.zmq_context")
+def test_read_maintenance(zmq_context_mock, random_name, random_int, zmq_socket):
+    retention = {
+        "queue": random_name(),
+        "directory": "trash",
+        "files": random_int(),
+        "archives": random_int(),
+        "size": random_int(),
+        "compressed": random_int(),
+        "expired": random_int(),
+        "last_run": "2020-01-01T00:00:00",
+    }
+    old_data = {
+        "entries": random_int(),
+        "size": random_int(),
+        "culled": random_int(),
+        "last_vacuum": None,
+        "last_run": "2020-01-01T00:00:00",
+    }
+    socket = zmq_socket({"result": {"retention": [retention], "old_data": old_data}})
+    zmq_context_mock.socket.return_value = socket
+
+    res = client.get(
+        f"{ucsschool_id_connector.constants.URL_PREFIX}/maintenance",
+        timeout=4.0,
+        headers={"Authorization": "Bearer TODO da token"},
+    )
+    socket.send_string.assert_called_with(
+        ucsschool_id_connector.models.RPCRequest(
+            cmd=ucsschool_id_connector.models.RPCCommand.get_maintenance
+        ).json()
+    )
+    assert res.status_code == 200
+    assert res.json() == {"retention": [retention], "old_data": old_data}
+
+
 # TODO: test non-auth-access
 # del ucsschool_id_connector.http_api. \
 # app.dependency_overrides[ucsschool_id_connector.token.get_current_active_user] ?
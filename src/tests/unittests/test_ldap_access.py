@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+import asyncio
+import gc
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from ldap3 import Server
+from ldap3.core.exceptions import LDAPSocketReceiveError
+
+import ucsschool_id_connector.ldap_access
+from ucsschool_id_connector.ldap_access import LDAPConnectionPool
+
+
+def _connection(server, user=None, password=None, **kwargs):
+    return MagicMock(bound=True, closed=False, user=user, password=password)
+
+
+@pytest.fixture
+def connection_mock():
+    with patch(
+        "ucsschool_id_connector.ldap_access.Connection", side_effect=_connection
+    ) as mock, patch.object(ucsschool_id_connector.ldap_access.LDAPAccess, "host_dn", "cn=host"):
+        yield mock
+    ucsschool_id_connector.ldap_access.close_connection_pools()
+
+
+def test_connection_pool_reuses_connections(connection_mock):
+    pool = LDAPConnectionPool(Server("localhost"), "cn=admin", size=1)
+    with pool.connection("secret") as conn1:
+        pass
+    with pool.connection("secret") as conn2:
+        # all connections in use: an additional connection is opened
+        with pool.connection("secret") as conn3:
+            pass
+    assert conn1 is conn2
+    assert conn3 is not conn1
+    assert pool.connects == 2
+    # only `size` idle connections are kept
+    assert [conn for conn, _ in pool._idle] == [conn3]
+    conn2.unbind.assert_called_once()
+
+    # password changed
+    with pool.connection("new secret") as conn4:
+        assert conn4.password == "new secret"
+    conn3.unbind.assert_called_once()
+
+
+def test_connection_pool_health_check(connection_mock):
+    pool = LDAPConnectionPool(Server("localhost"), "cn=admin", size=2)
+    with pool.connection("secret") as conn1:
+        pass
+
+    def idle_long():
+        ((conn, released),) = pool._idle
+        pool._idle = [(conn, released - ucsschool_id_connector.ldap_access.LDAP_POOL_CHECK_IDLE - 1)]
+
+    idle_long()
+    conn1.extend.standard.who_am_i.return_value = "dn:cn=admin"
+    with pool.connection("secret") as conn2:
+        assert conn2 is conn1
+    idle_long()
+    conn1.extend.standard.who_am_i.side_effect = LDAPSocketReceiveError("closed")
+    with pool.connection("secret") as conn3:
+        assert conn3 is not conn1
+    conn1.unbind.assert_called_once()
+
+    with pytest.raises(LDAPSocketReceiveError):
+        with pool.connection("secret") as conn4:
+            raise LDAPSocketReceiveError("closed")
+    conn4.unbind.assert_called_once()
+    assert [conn for conn, _ in pool._idle] == []
+
+    # other errors return the connection to the pool
+    with pytest.raises(ValueError):
+        with pool.connection("secret") as conn5:
+            raise ValueError("test")
+    conn5.unbind.assert_not_called()
+    assert [conn for conn, _ in pool._idle] == [conn5]
+
+
+@pytest.mark.asyncio
+async def test_search_uses_pool_and_reconnects(connection_mock):
+    ldap_access = ucsschool_id_connector.ldap_access.LDAPAccess()
+    with patch.object(ldap_access, "machine_password", return_value="secret"):
+        await ldap_access.search("(uid=a)", bind_dn="cn=host")
+        await ldap_access.search("(uid=b)", bind_dn="cn=host")
+    assert connection_mock.call_count == 1
+    pool = ucsschool_id_connector.ldap_access.get_connection_pool(ldap_access.server, "cn=host")
+    ((conn1, _),) = pool._idle
+    assert [c.args[1] for c in conn1.search.call_args_list] == ["(uid=a)", "(uid=b)"]
+
+    # connection was closed by the server
+    conn1.search.side_effect = LDAPSocketReceiveError("closed")
+    with patch.object(ldap_access, "machine_password", return_value="secret"):
+        entries = await ldap_access.search("(uid=c)", bind_dn="cn=host")
+    assert connection_mock.call_count == 2
+    conn1.unbind.assert_called_once()
+    ((conn2, _),) = pool._idle
+    assert entries is conn2.entries
+
+
+@pytest.mark.asyncio
+async def test_paged_search_stopped_early_retrieves_prefetch_error(connection_mock):
+    def paged_connection(*args, **kwargs):
+        conn = _connection(*args, **kwargs)
+        conn.response = []
+        conn.result = {
+            "controls": {
+                ucsschool_id_connector.ldap_access.PAGED_RESULTS_CONTROL: {"value": {"cookie": b"c"}}
+            }
+        }
+        # the prefetch of the second page fails
+        conn.search.side_effect = [None, LDAPSocketReceiveError("closed")]
+        return conn
+
+    connection_mock.side_effect = paged_connection
+    loop_errors = []
+    loop = asyncio.get_running_loop()
+    loop.set_exception_handler(lambda loop, context: loop_errors.append(context))
+    ldap_access = ucsschool_id_connector.ldap_access.LDAPAccess()
+    try:
+        with patch.object(ldap_access, "machine_password", return_value="secret"):
+            pages = ldap_access.paged_search("(uid=*)")
+            assert await pages.__anext__() == []
+            await pages.aclose()
+        del pages
+        gc.collect()
+    finally:
+        loop.set_exception_handler(None)
+    assert loop_errors == []
+    # the connection failed, it is not returned to the pool
+    pool = ucsschool_id_connector.ldap_access.get_connection_pool(ldap_access.server, "cn=host")
+    assert pool._idle == []
+    assert connection_mock.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_search_with_user_credentials_binds_every_time(connection_mock):
+    ldap_access = ucsschool_id_connector.ldap_access.LDAPAccess()
+    await ldap_access.search("(uid=a)", bind_dn="uid=a,cn=users", bind_pw="secret")
+    await ldap_access.search("(uid=a)", bind_dn="uid=a,cn=users", bind_pw="secret")
+    assert connection_mock.call_count == 2
+    assert ucsschool_id_connector.ldap_access._connection_pools == {}
+
+
+@pytest.mark.asyncio
+async def test_search_does_not_block_event_loop(connection_mock):
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def slow_search(*args, **kwargs):
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(0.1)
+        with lock:
+            running -= 1
+
+    def slow_connection(*args, **kwargs):
+        conn = _connection(*args, **kwargs)
+        conn.search.side_effect = slow_search
+        return conn
+
+    connection_mock.side_effect = slow_connection
+    max_lag = 0.0
+
+    async def ticker():
+        nonlocal max_lag
+        while True:
+            t0 = time.monotonic()
+            await asyncio.sleep(0.01)
+            max_lag = max(max_lag, time.monotonic() - t0 - 0.01)
+
+    ldap_access = ucsschool_id_connector.ldap_access.LDAPAccess()
+    num_searches = 2 * ucsschool_id_connector.ldap_access.LDAP_MAX_THREADS
+    ticker_task = asyncio.ensure_future(ticker())
+    try:
+        with patch.object(ldap_access, "machine_password", return_value="secret"):
+            t0 = time.monotonic()
+            await asyncio.gather(
+                *(
+                    ldap_access.search(f"(uid=user{num})", bind_dn="cn=host")
+                    for num in range(num_searches)
+                )
+            )
+            duration = time.monotonic() - t0
+    finally:
+        ticker_task.cancel()
+    # 0.8 s when run in the event loop
+    assert duration < 0.6
+    assert max_running == ucsschool_id_connector.ldap_access.LDAP_MAX_THREADS
+    assert max_lag < 0.05
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+import asyncio
+import datetime
+import os
+import tarfile
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from diskcache import Cache
+
+import ucsschool_id_connector.queues
+from ucsschool_id_connector.db import OldDataDB
+from ucsschool_id_connector.maintenance import (
+    DAY,
+    Maintenance,
+    OldDataDBMaintenance,
+    OldDataMigration,
+    QueueRetention,
+    compact_directory,
+    directory_usage,
+    scan_directory,
+)
+from ucsschool_id_connector.models import ListenerGroupOldDataEntry, MaintenanceModel
+
+
+def _write_files(path, mtimes, size=100):
+    paths = []
+    for num, mtime in enumerate(mtimes):
+        file_path = path / f"2020-01-01-00-00-00-{num:06d}.json"
+        file_path.write_text("x" * size)
+        os.utime(file_path, (mtime, mtime))
+        paths.append(file_path)
+    return paths
+
+
+def test_compact_directory_compresses_per_day(temp_dir_func):
+    path = temp_dir_func()
+    now = time.time()
+    day1 = now - 3 * DAY
+    day2 = now - 2 * DAY
+    paths = _write_files(path, [day1, day1 + 1, day2, now])
+    assert list(compact_directory(path, now - DAY, None, 0)) == [(3, 0)]
+    archive1 = path / f"{datetime.date.fromtimestamp(day1).isoformat()}.tar.xz"
+    archive2 = path / f"{datetime.date.fromtimestamp(day2).isoformat()}.tar.xz"
+    assert sorted(path.iterdir()) == sorted([archive1, archive2, paths[3]])
+    with tarfile.open(archive1) as tar:
+        assert tar.getnames() == [paths[0].name, paths[1].name]
+    # archives expire with their newest member
+    assert archive1.stat().st_mtime == pytest.approx(day1 + 1)
+    assert directory_usage(path)[:2] == (1, 2)
+
+    paths = _write_files(path, [day1])
+    assert list(compact_directory(path, now - DAY, None, 0)) == [(1, 0)]
+    assert (path / f"{datetime.date.fromtimestamp(day1).isoformat()}.1.tar.xz").exists()
+
+
+def test_compact_directory_expires_by_age_and_size(temp_dir_func):
+    path = temp_dir_func()
+    now = time.time()
+    paths = _write_files(path, [now - 10 * DAY, now - 3, now - 2, now - 1])
+    assert list(compact_directory(path, None, now - 5 * DAY, 250)) == [(0, 2)]
+    assert sorted(path.iterdir()) == paths[2:]
+
+
+def test_compact_directory_incremental(temp_dir_func):
+    path = temp_dir_func()
+    now = time.time()
+    _write_files(path, [now - 10 * DAY] * 5)
+    with patch("ucsschool_id_connector.maintenance.scan_directory", wraps=scan_directory) as scan_mock:
+        steps = compact_directory(path, None, now - DAY, 0, limit=2)
+        assert next(steps) == (0, 2)
+        assert len(list(path.iterdir())) == 3
+        assert list(steps) == [(0, 2), (0, 1)]
+    assert list(path.iterdir()) == []
+    # the directory is listed only once
+    assert scan_mock.call_count == 1
+
+    now = time.time()
+    _write_files(path, [now - 3 * DAY] * 3 + [now - 2 * DAY] * 2 + [now])
+    assert list(compact_directory(path, now - DAY, None, 0, limit=2)) == [(2, 0), (2, 0), (1, 0)]
+    assert len(list(path.glob("*.tar.xz"))) == 4
+    assert list(compact_directory(path, now - DAY, None, 0, limit=2)) == []
+
+
+@pytest.mark.asyncio
+async def test_queue_retention(temp_dir_func):
+    queue = ucsschool_id_connector.queues.InQueue(path=temp_dir_func())
+    now = time.time()
+    _write_files(queue.trash_dir, [now - 40 * DAY, now - 2 * DAY, now])
+    dead_letters = _write_files(queue.keep_dir, [now - 2 * DAY])
+    job = QueueRetention(lambda: [queue])
+    with patch("ucsschool_id_connector.maintenance.MAINTENANCE_BATCH_SIZE", 1):
+        await job.run()
+    keep_stats, trash_stats = Maintenance([job]).as_model().retention
+    assert (trash_stats.directory, trash_stats.files, trash_stats.archives) == ("trash", 1, 1)
+    assert (trash_stats.compressed, trash_stats.expired) == (1, 1)
+    assert trash_stats.last_run
+    # dead letters are not compressed
+    assert (keep_stats.directory, keep_stats.files, keep_stats.archives) == ("keep", 1, 0)
+    assert list(queue.keep_dir.iterdir()) == dead_letters
+
+
+@pytest.mark.asyncio
+async def test_maintenance_runs_due_jobs():
+    job = QueueRetention(lambda: [])
+    job.run = AsyncMock(side_effect=ValueError("test"))
+    maintenance = Maintenance([job])
+    await maintenance.run_due_jobs()
+    await maintenance.run_due_jobs()
+    # failures are logged, the job is run again after its interval
+    job.run.assert_awaited_once()
+    with patch.object(job, "interval", 0):
+        await maintenance.run_due_jobs()
+    assert job.run.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_old_data_migration(temp_dir_func):
+    path = temp_dir_func()
+    legacy = Cache(str(path))
+    for num in range(3):
+        legacy[f"group{num}"] = {"users": [f"uid=user{num},cn=users,dc=foo,dc=bar"]}
+    legacy.close()
+    job = OldDataMigration(path)
+    with patch("ucsschool_id_connector.maintenance.MAINTENANCE_BATCH_SIZE", 2):
+        await Maintenance([job]).run_due_jobs()
+    assert job.migrated == 3
+    assert not job.due(time.monotonic() + 2 * job.interval)
+    assert OldDataDB(path, ListenerGroupOldDataEntry).migrate() == (0, False)
+
+
+@pytest.mark.asyncio
+async def test_old_data_db_maintenance(temp_dir_func):
+    path = temp_dir_func()
+    db = OldDataDB(path, ListenerGroupOldDataEntry)
+    for num in range(5):
+        db[f"group{num}"] = ListenerGroupOldDataEntry(users=[])
+        db.touch(f"group{num}", expire=60 if num < 3 else None)
+    db.close()
+    in_queue = MagicMock(preprocess_lock=asyncio.Lock())
+    in_queue.__len__.return_value = 1
+    job = OldDataDBMaintenance(in_queue, path)
+
+    with patch("ucsschool_id_connector.db.time.time", return_value=time.time() + 61), patch(
+        "ucsschool_id_connector.maintenance.MAINTENANCE_CULL_BATCH_SIZE", 2
+    ):
+        await job.run()
+    model = MaintenanceModel()
+    job.update_model(model)
+    assert (model.old_data.entries, model.old_data.culled) == (2, 3)
+    assert model.old_data.size > 0
+    # in queue not empty
+    assert model.old_data.last_vacuum is None
+    assert job.vacuum_due()
+
+    in_queue.__len__.return_value = 0
+    await job.run()
+    assert job.stats.last_vacuum is not None
+    assert not job.vacuum_due()
+    assert len(OldDataDB(path, ListenerGroupOldDataEntry)) == 2
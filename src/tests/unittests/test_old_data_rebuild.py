@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+from click.testing import CliRunner
+
+import ucsschool_id_connector.ldap_access
+from ucsschool_id_connector.db import OldDataDB
+from ucsschool_id_connector.models import ListenerGroupOldDataEntry, ListenerUserOldDataEntry
+from ucsschool_id_connector.old_data_rebuild import OldDataRebuild, group_old_data
+from ucsschool_id_connector.scripts.rebuild_old_data import rebuild
+
+BASE = "dc=foo,dc=bar"
+
+
+def _user(num):
+    return {
+        "dn": f"uid=user{num},cn=schueler,cn=users,ou=DEMOSCHOOL,{BASE}",
+        "raw_attributes": {
+            "entryUUID": [f"user-{num}".encode()],
+            "ucsschoolSchool": [b"DEMOSCHOOL", b"OTHERSCHOOL"],
+            "ucsschoolRecordUID": [f"record{num}".encode()],
+            "ucsschoolSourceUID": [b"TESTID"],
+        },
+    }
+
+
+def _group(num, members):
+    return {
+        "dn": f"cn=DEMOSCHOOL-class{num},cn=klassen,cn=schueler,cn=groups,ou=DEMOSCHOOL,{BASE}",
+        "raw_attributes": {
+            "entryUUID": [f"group-{num}".encode()],
+            "uniqueMember": [member.encode() for member in members],
+        },
+    }
+
+
+class FakeLDAPAccess:
+    def __init__(self, users, groups):
+        self.users = users
+        self.groups = groups
+
+    async def paged_search(self, filter_s, attributes=None, base=None, page_size=1000):
+        results = self.groups if "ucsschoolRole" in filter_s else self.users
+        for start in range(0, len(results), page_size):
+            yield results[start : start + page_size]
+
+
+def test_group_old_data():
+    members = [
+        f"uid=user1,cn=schueler,cn=users,ou=DEMOSCHOOL,{BASE}",
+        f"cn=nested,cn=groups,{BASE}",
+        f"uid=host$,cn=computers,{BASE}",
+        f"UID=user2,cn=schueler,cn=users,ou=DEMOSCHOOL,{BASE}",
+    ]
+    assert group_old_data({"uniqueMember": [m.encode() for m in members]}).users == [
+        members[0],
+        members[3],
+    ]
+    assert group_old_data({}).users == []
+
+
+@pytest.mark.asyncio
+async def test_old_data_rebuild(temp_dir_func):
+    path = temp_dir_func()
+    users = [_user(num) for num in range(5)]
+    groups = [_group(num, [users[num]["dn"], users[num + 1]["dn"]]) for num in range(3)]
+    db = OldDataDB(path, ListenerUserOldDataEntry)
+    existing = ListenerUserOldDataEntry(
+        schools=["DEMOSCHOOL"], record_uid="previous", source_uid="TESTID"
+    )
+    db["user-0"] = existing
+
+    rebuild_ = OldDataRebuild(FakeLDAPAccess(users, groups), path, page_size=2)
+    user_progress, group_progress = await rebuild_.run()
+    assert (user_progress.read, user_progress.written) == (5, 4)
+    assert (group_progress.read, group_progress.written) == (3, 3)
+    assert db.get("user-0") == existing
+    assert db.get("user-4") == ListenerUserOldDataEntry(
+        schools=["DEMOSCHOOL", "OTHERSCHOOL"], record_uid="record4", source_uid="TESTID"
+    )
+    assert OldDataDB(path, ListenerGroupOldDataEntry).get("group-2") == ListenerGroupOldDataEntry(
+        users=[users[2]["dn"], users[3]["dn"]]
+    )
+
+    rebuild_ = OldDataRebuild(FakeLDAPAccess(users, groups), path, overwrite=True)
+    (user_progress,) = await rebuild_.run(groups=False)
+    assert user_progress.written == 5
+    assert db.get("user-0").record_uid == "record0"
+
+
+def test_rebuild_old_data_command(temp_dir_func):
+    path = temp_dir_func()
+    with patch(
+        "ucsschool_id_connector.old_data_rebuild.LDAPAccess", lambda: FakeLDAPAccess([_user(1)], [])
+    ), patch("ucsschool_id_connector.old_data_rebuild.OLD_DATA_DB_PATH", path):
+        result = CliRunner().invoke(rebuild, ["--no-groups"])
+    assert result.exit_code == 0, result.output
+    assert "user-1" in OldDataDB(path, ListenerUserOldDataEntry)
+
+
+@pytest.mark.asyncio
+async def test_ldap_paged_search():
+    pages = [[_user(0), _user(1)], [_user(2)]]
+    cookies = [b"cookie", b""]
+    conn = MagicMock()
+
+    def search(base, filter_s, attributes=None, paged_size=None, paged_cookie=None):
+        num = 0 if paged_cookie is None else 1
+        conn.response = [dict(result, type="searchResEntry") for result in pages[num]] + [
+            {"type": "searchResRef", "uri": []}
+        ]
+        control = ucsschool_id_connector.ldap_access.PAGED_RESULTS_CONTROL
+        conn.result = {"controls": {control: {"value": {"cookie": cookies[num]}}}}
+
+    conn.search.side_effect = search
+    ldap_access = ucsschool_id_connector.ldap_access.LDAPAccess()
+    ldap_access.host_dn = "cn=host"
+    with patch("ucsschool_id_connector.ldap_access.Connection", return_value=conn), patch.object(
+        ldap_access, "machine_password", return_value="secret"
+    ):
+        res = [page async for page in ldap_access.paged_search("(uid=*)", ["entryUUID"], page_size=2)]
+    assert [[result["dn"] for result in page] for page in res] == [
+        [result["dn"] for result in page] for page in pages
+    ]
+    assert conn.search.call_args_list[1].kwargs["paged_cookie"] == b"cookie"
+    conn.unbind.assert_called_once()
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+import logging
+import sqlite3
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+import ujson
+
+import ucsschool_id_connector.durable_files
+import ucsschool_id_connector.queue_backends
+import ucsschool_id_connector.queues
+from ucsschool_id_connector.durable_files import GroupCommit
+from ucsschool_id_connector.queue_backends import (
+    OVERFLOW_DB_NAME,
+    SQLITE_DB_NAME,
+    DirectoryQueueBackend,
+    OverflowStore,
+    QueueEntry,
+    SQLiteQueueBackend,
+    export_sqlite_db,
+    scan_queue_dir,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _queue_order(udm_object_type: str) -> int:
+    return {"users/user": 0, "groups/group": 1}.get(udm_object_type, 999)
+
+
+def _backend(backend_name: str, path: Path):
+    (path / "trash").mkdir(exist_ok=True)
+    (path / "keep").mkdir(exist_ok=True)
+    if backend_name == "sqlite":
+        return SQLiteQueueBackend(path, logger, _queue_order)
+    return DirectoryQueueBackend(path, logger)
+
+
+def _listener_file(path: Path, udm_object_type: str) -> QueueEntry:
+    entry_uuid = str(uuid.uuid4())
+    path.write_text(ujson.dumps({"id": entry_uuid, "udm_object_type": udm_object_type}))
+    return QueueEntry(_queue_order(udm_object_type), udm_object_type, entry_uuid, 0.0)
+
+
+@pytest.mark.parametrize("backend_name", ("directory", "sqlite"))
+def test_backend_enqueue_peek_ack(backend_name, temp_dir_func):
+    in_queue_dir = temp_dir_func()
+    backend = _backend(backend_name, temp_dir_func())
+    entries = {}
+    for num, udm_object_type in enumerate(("groups/group", "users/user", "groups/group", "users/user")):
+        source = in_queue_dir / f"2020-01-01-00-00-00-{num:06d}_ready.json"
+        entries[source.name] = _listener_file(source, udm_object_type)
+        backend.enqueue(source, entries[source.name])
+    names = sorted(entries)
+    assert len(backend) == 4
+    assert backend.names() == names
+    assert backend.unindexed_names() == []
+    assert [name for _, name in backend.peek()] == [names[1], names[3], names[0], names[2]]
+    assert backend.peek(1) == [(entries[names[1]], names[1])]
+    assert backend.get_entry(names[0]) == entries[names[0]]
+    # changed sorting data and retry state
+    entry = entries[names[2]]._replace(queue_order=0, next_due=100.0)
+    backend.set_entry(names[2], entry)
+    assert [name for _, name in backend.peek()] == [names[1], names[2], names[3], names[0]]
+    assert [name for _, name in backend.peek(due_at=50.0)] == [names[1], names[3], names[0]]
+    assert backend.waiting(50.0) == [(entry, names[2])]
+    backend.set_entry(names[2], entries[names[2]])
+    assert backend.waiting(50.0) == []
+    version = backend.version(names[0])
+    assert version is not None
+    assert backend.version("unknown.json") is None
+
+    backend.ack(names[1])
+    assert backend.names() == [names[0], names[2], names[3]]
+    assert backend.get_entry(names[1]) is None
+    backend.move(names[0], backend.path / "trash")
+    assert (
+        ujson.loads((backend.path / "trash" / names[0]).read_text())["id"]
+        == entries[names[0]].entry_uuid
+    )
+    assert len(backend) == 2
+    with pytest.raises(FileNotFoundError):
+        backend.move(names[0], backend.path / "keep")
+    backend.close()
+
+
+def test_directory_backend_lists_directory_only_on_rescan(temp_dir_func):
+    backend = _backend("directory", temp_dir_func())
+    _listener_file(backend.path / "2020-01-01-00-00-00-000001_ready.json", "users/user")
+    (backend.path / "foo.txt").write_text("")
+    with patch("ucsschool_id_connector.queue_backends.list_queue_dir") as list_queue_dir_mock:
+        assert len(backend) == 0
+        assert backend.names() == []
+    list_queue_dir_mock.assert_not_called()
+    assert (backend.path / "foo.txt").exists()
+
+    backend.rescan()
+    assert len(backend) == 1
+    assert backend.names() == backend.unindexed_names() == ["2020-01-01-00-00-00-000001_ready.json"]
+    assert (backend.path / "trash" / "foo.txt").exists()
+    backend.ack("2020-01-01-00-00-00-000001_ready.json")
+    assert len(backend) == 0
+    assert backend.unindexed_names() == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend_name", ("directory", "sqlite"))
+async def test_backend_read(backend_name, temp_dir_func):
+    source = temp_dir_func() / "2020-01-01-00-00-00-000001_ready.json"
+    entry = _listener_file(source, "users/user")
+    backend = _backend(backend_name, temp_dir_func())
+    backend.enqueue(source, entry)
+    assert await backend.read(source.name) == source.read_text()
+    with pytest.raises(FileNotFoundError):
+        await backend.read("unknown.json")
+    backend.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend_name", ("directory", "sqlite"))
+async def test_backend_add(backend_name, temp_dir_func):
+    source = temp_dir_func() / "2020-01-01-00-00-00-000001_ready.json"
+    entry = _listener_file(source, "users/user")
+    backend = _backend(backend_name, temp_dir_func())
+    backend.add(source.name, source.read_text(), entry)
+    assert backend.names() == [source.name]
+    assert backend.peek() == [(entry, source.name)]
+    assert await backend.read(source.name) == source.read_text()
+    backend.close()
+
+
+def test_overflow_store(temp_dir_func):
+    path = temp_dir_func()
+    store = OverflowStore(path, logger)
+    assert len(store) == 0
+    assert not (path / OVERFLOW_DB_NAME).exists()
+    entry_uuids = [str(uuid.uuid4()) for _ in range(3)]
+    # the third and fifth items are newer changes of the objects of the first and fourth items
+    for num, (entry_uuid, old_data, priority) in enumerate(
+        (
+            (entry_uuids[0], {"record_uid": "old"}, 0),
+            (entry_uuids[1], None, 0),
+            (entry_uuids[0], None, 1),
+            (entry_uuids[2], {"record_uid": "first"}, 0),
+            (entry_uuids[2], {"record_uid": "second"}, 0),
+        )
+    ):
+        data = ujson.dumps({"id": entry_uuid, "udm_object_type": "users/user", "old_data": old_data})
+        entry = QueueEntry(0, "users/user", entry_uuid, 0.0, priority=priority)
+        store.spill(entry_uuid, f"2020-01-01-00-00-00-{num:06d}_ready.json", data, entry)
+    assert len(store) == 3
+    assert store.has_object(entry_uuids[0])
+    assert not store.has_object(str(uuid.uuid4()))
+    store.close()
+
+    store = OverflowStore(path, logger)
+    (key1, name1, _, _), (key2, name2, data2, entry2), (key3, name3, data3, _) = store.peek()
+    assert (key1, name1) == (entry_uuids[1], "2020-01-01-00-00-00-000001_ready.json")
+    # the replaced item moved to the end and kept the old_data of the first change
+    assert (key2, name2) == (entry_uuids[0], "2020-01-01-00-00-00-000002_ready.json")
+    assert ujson.loads(data2)["old_data"] == {"record_uid": "old"}
+    assert entry2.priority == 1
+    # two modifications with old_data: the older one is kept
+    assert (key3, name3) == (entry_uuids[2], "2020-01-01-00-00-00-000004_ready.json")
+    assert ujson.loads(data3)["old_data"] == {"record_uid": "first"}
+    assert len(store.peek(1)) == 1
+    store.remove([key1])
+    assert [key for key, *_ in store.peek()] == [key2, key3]
+    store.close()
+
+
+def test_sqlite_stores_are_synced_with_group_commit(temp_dir_func):
+    path = temp_dir_func()
+    source = temp_dir_func() / "2020-01-01-00-00-00-000001_ready.json"
+    entry = _listener_file(source, "users/user")
+    group_commit = GroupCommit(0)
+    with patch("ucsschool_id_connector.queue_backends.get_group_commit", return_value=group_commit):
+        backend = _backend("sqlite", path)
+        backend.enqueue(source, entry)
+        store = OverflowStore(path, logger)
+        store.spill(entry.entry_uuid, source.name, source.read_text(), entry)
+    # with synchronous=NORMAL the commits are only in the write-ahead logs
+    assert backend.wal_path.exists()
+    assert store.wal_path.exists()
+    with patch(
+        "ucsschool_id_connector.durable_files.fsync_paths",
+        wraps=ucsschool_id_connector.durable_files.fsync_paths,
+    ) as fsync_paths:
+        group_commit.flush()
+    files, _ = fsync_paths.call_args[0]
+    assert files == {str(backend.wal_path), str(store.wal_path)}
+    backend.close()
+    store.close()
+
+
+def test_scan_queue_dir(temp_dir_func):
+    path = temp_dir_func()
+    names = [
+        f"2020-01-01-00-00-00-{num:06d}{suffix}.json" for num in range(5) for suffix in ("", "_ready")
+    ]
+    for name in reversed(names):
+        (path / name).write_text("{}")
+    (path / "foo.txt").write_text("")
+    (path / SQLITE_DB_NAME).write_text("")
+    (path / "trash").mkdir()
+
+    paths, invalid = scan_queue_dir(path, 3)
+    assert [p.name for p in paths] == names[:3]
+    assert invalid == [path / "foo.txt"]
+    paths, _ = scan_queue_dir(path, 3, after=names[2])
+    assert [p.name for p in paths] == names[3:6]
+    paths, _ = scan_queue_dir(
+        path, 10, after=names[2], name_filter=lambda name: name.endswith("_ready.json")
+    )
+    assert [p.name for p in paths] == names[3::2]
+    assert scan_queue_dir(path, 3, after=names[-1])[0] == []
+
+
+@pytest.mark.parametrize("backend_name", ("directory", "sqlite"))
+def test_backend_due_waiting_prioritized(backend_name, temp_dir_func):
+    in_queue_dir = temp_dir_func()
+    backend = _backend(backend_name, temp_dir_func())
+    names = []
+    for num in range(4):
+        source = in_queue_dir / f"2020-01-01-00-00-00-{num:06d}_ready.json"
+        entry = _listener_file(source, "users/user")
+        if num == 1:
+            entry = entry._replace(next_due=200.0)
+        backend.enqueue(source, entry)
+        names.append(source.name)
+    # a high priority change of the object of the first item
+    source = in_queue_dir / "2020-01-01-00-00-00-000004_ready.json"
+    source.write_text("{}")
+    backend.enqueue(source, backend.get_entry(names[0])._replace(priority=1))
+    names.append(source.name)
+
+    assert [name for _, name in backend.peek(2, due_at=100.0)] == [names[0], names[2]]
+    assert [name for _, name in backend.peek(due_at=300.0)] == names
+    assert [name for _, name in backend.waiting(100.0)] == [names[1]]
+    assert backend.waiting(300.0) == []
+    assert [name for _, name in backend.prioritized()] == [names[0], names[4]]
+    backend.close()
+
+
+def test_sqlite_backend_stores_retry_state(temp_dir_func):
+    in_queue_dir = temp_dir_func()
+    path = temp_dir_func()
+    backend = _backend("sqlite", path)
+    source = in_queue_dir / "2020-01-01-00-00-00-000000_ready.json"
+    entry = _listener_file(source, "users/user")
+    backend.enqueue(source, entry)
+    retry_entry = entry._replace(attempts=2, next_due=123.0, last_error="ValueError: test")
+    backend.set_entry(source.name, retry_entry)
+    backend.close()
+    backend = _backend("sqlite", path)
+    assert backend.get_entry(source.name) == retry_entry
+    assert backend.peek() == [(retry_entry, source.name)]
+    backend.close()
+
+
+def test_sqlite_backend_adds_retry_columns(temp_dir_func):
+    path = temp_dir_func()
+    con = sqlite3.connect(str(path / ucsschool_id_connector.queue_backends.SQLITE_DB_NAME))
+    with con:
+        con.execute(
+            "CREATE TABLE items (seq INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, "
+            "queue_order INTEGER NOT NULL, udm_object_type TEXT NOT NULL, entry_uuid TEXT NOT NULL, "
+            "enqueued REAL NOT NULL, data TEXT NOT NULL)"
+        )
+        con.execute("INSERT INTO items VALUES (1, 'a.json', 0, 'users/user', 'uuid', 1.0, '{}')")
+    con.close()
+    backend = _backend("sqlite", path)
+    assert backend.get_entry("a.json") == QueueEntry(0, "users/user", "uuid", 1.0)
+    backend.close()
+
+
+def test_directory_backend_hardlinks(temp_dir_func):
+    source = temp_dir_func() / "2020-01-01-00-00-00-000001_ready.json"
+    entry = _listener_file(source, "users/user")
+    backend = _backend("directory", temp_dir_func())
+    assert backend.enqueue(source, entry) is True
+    assert (backend.path / source.name).stat().st_ino == source.stat().st_ino
+    with patch("ucsschool_id_connector.queue_backends.os.link", side_effect=OSError(18, "EXDEV")):
+        assert backend.enqueue(source, entry) is False
+    assert (backend.path / source.name).stat().st_ino != source.stat().st_ino
+
+
+def test_sqlite_backend_import_and_export(temp_dir_func):
+    path = temp_dir_func()
+    entries = {}
+    for num, udm_object_type in enumerate(("groups/group", "users/user")):
+        file_path = path / f"2020-01-01-00-00-00-{num:06d}_ready.json"
+        entries[file_path.name] = _listener_file(file_path, udm_object_type)
+    backend = _backend("sqlite", path)
+    assert backend.import_directory() == 2
+    assert not list(path.glob("*.json"))
+    assert [(entry.entry_uuid, name) for entry, name in backend.peek()] == [
+        (entries[name].entry_uuid, name) for name in sorted(entries, reverse=True)
+    ]
+    backend.close()
+
+    assert export_sqlite_db(path, logger) == 2
+    assert sorted(p.name for p in path.glob("*.json")) == sorted(entries)
+    assert not list(path.glob(f"{ucsschool_id_connector.queue_backends.SQLITE_DB_NAME}*"))
+
+
+@pytest.mark.asyncio
+async def test_out_queue_with_sqlite_backend(
+    mock_plugins, temp_dir_func, school_authority_configuration, example_user_json_path_real
+):
+    in_queue_dir = temp_dir_func()
+    source = in_queue_dir / "2020-01-01-00-00-00-000001_ready.json"
+    source.write_text(example_user_json_path_real.read_text())
+    with patch("ucsschool_id_connector.queues.get_ucrv_str", return_value="sqlite"):
+        out_queue = ucsschool_id_connector.queues.OutQueue(
+            name="test", path=temp_dir_func(), school_authority=school_authority_configuration()
+        )
+    assert isinstance(out_queue.backend, SQLiteQueueBackend)
+    in_queue = ucsschool_id_connector.queues.InQueue(path=in_queue_dir, out_queues=[out_queue])
+    obj = await in_queue.load_listener_file(source)
+    assert out_queue.enqueue_file(source, obj) is False
+    source.unlink()
+    target = out_queue.path / source.name
+    assert len(out_queue) == 1
+    assert await out_queue.sorted_queue_files() == [(0, target)]
+    out_queue.uncache_listener_object(target)
+    assert (await out_queue.load_listener_file(target)).id == obj.id
+
+    handled = []
+
+    async def fake_handle(path, obj=None):
+        handled.append(path)
+
+    out_queue.handle = fake_handle
+    assert await out_queue.handle_files([target]) == []
+    assert handled == [target]
+    assert len(out_queue) == 0
+
+    source = in_queue_dir / "2020-01-01-00-00-00-000002_ready.json"
+    source.write_text(example_user_json_path_real.read_text())
+    out_queue.enqueue_file(source, obj)
+    out_queue.discard_file(out_queue.path / source.name)
+    assert len(out_queue) == 0
+    assert (out_queue.trash_dir / source.name).read_text() == source.read_text()
+    out_queue.backend.close()
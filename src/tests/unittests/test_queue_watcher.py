@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+
+import ucsschool_id_connector.queue_watcher
+from ucsschool_id_connector.queue_watcher import InotifyUnavailable, QueueWatcher
+
+
+@pytest.mark.asyncio
+async def test_inotify_wakes_up_on_new_file(temp_dir_func):
+    temp_dir = temp_dir_func()
+    watcher = QueueWatcher(temp_dir, poll_interval=30, idle_timeout=30)
+    watcher.start()
+    try:
+        assert watcher.uses_inotify
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.1, (temp_dir / "a.json").write_text, "{}")
+        t0 = time.monotonic()
+        assert await watcher.wait() is True
+        assert time.monotonic() - t0 < 5
+    finally:
+        watcher.close()
+
+
+@pytest.mark.asyncio
+async def test_inotify_ignored_files_do_not_wake_up(temp_dir_func):
+    temp_dir = temp_dir_func()
+    watcher = QueueWatcher(
+        temp_dir, poll_interval=30, idle_timeout=0.5, ignore=lambda name: name.endswith(".tmp")
+    )
+    watcher.start()
+    try:
+        (temp_dir / "a.tmp").write_text("")
+        assert await watcher.wait() is False
+    finally:
+        watcher.close()
+
+
+@pytest.mark.asyncio
+async def test_debounce_collects_burst(temp_dir_func):
+    temp_dir = temp_dir_func()
+    watcher = QueueWatcher(temp_dir, poll_interval=30, debounce=0.3, idle_timeout=30)
+    watcher.start()
+    loop = asyncio.get_running_loop()
+    try:
+        for num in range(3):
+            loop.call_later(0.1 * (num + 1), (temp_dir / f"{num}.json").write_text, "{}")
+        assert await watcher.wait() is True
+        # woke up only after the last file was written plus the debounce window
+        assert len(list(temp_dir.iterdir())) == 3
+    finally:
+        watcher.close()
+
+
+@pytest.mark.asyncio
+async def test_polling_fallback(temp_dir_func):
+    temp_dir = temp_dir_func()
+    watcher = QueueWatcher(temp_dir, poll_interval=0.2, idle_timeout=30)
+    with patch.object(
+        ucsschool_id_connector.queue_watcher, "_load_libc", side_effect=InotifyUnavailable("test")
+    ):
+        watcher.start()
+    try:
+        assert not watcher.uses_inotify
+        (temp_dir / "a.json").write_text("{}")
+        t0 = time.monotonic()
+        assert await watcher.wait() is False
+        assert time.monotonic() - t0 < 5
+        watcher.notify()
+        assert await watcher.wait() is True
+    finally:
+        watcher.close()
@@ -26,15 +26,29 @@
 # /usr/share/common-licenses/AGPL-3; if not, see
 # <http://www.gnu.org/licenses/>.
 
+import asyncio
 import os
-from unittest.mock import Mock, patch
+import shutil
+import time
+import uuid
+from unittest.mock import AsyncMock, Mock, patch
 
+import aiohttp
+import httpx
 import pytest
+import ujson
 
+import ucsschool_id_connector.circuit_breaker
 import ucsschool_id_connector.constants
 import ucsschool_id_connector.db
+import ucsschool_id_connector.durable_files
 import ucsschool_id_connector.models
 import ucsschool_id_connector.queues
+import ucsschool_id_connector.requests
+import ucsschool_id_connector.utils
+from ucsschool.kelvin.client import ServerError as KelvinServerError
+from ucsschool_id_connector.constants import PRIORITY_HIGH, PRIORITY_NORMAL
+from ucsschool_id_connector.queue_backends import scan_queue_dir
 
 
 @pytest.mark.asyncio
@@ -139,7 +153,7 @@ async def test_preprocess_del_file_with_old_data(
 
 
 @pytest.mark.asyncio
-async def test_handle_move_files_to_trash_dir_when_server_error_are_raised(
+async def test_handle_retries_files_when_errors_are_raised(
     example_user_json_path_copy,
     temp_dir_func,
     school_authority_configuration,
@@ -151,7 +165,7 @@ async def test_handle_move_files_to_trash_dir_when_server_error_are_raised(
         path=temp_dir,
         school_authority=school_authority_configuration(),
     )
-    exception = ValueError()
+    exception = ValueError("test")
 
     def fake_filter_plugins(*args, **kwargs):
         raise exception
@@ -159,10 +173,16 @@ async def test_handle_move_files_to_trash_dir_when_server_error_are_raised(
     out_queue.logger.exception = Mock()
 
     with patch("ucsschool_id_connector.queues.filter_plugins", fake_filter_plugins):
-        await out_queue.handle(add_mod_json_path)
-        assert os.path.exists(os.path.join(out_queue.trash_dir, os.path.basename(add_mod_json_path)))
-        assert not os.path.exists(add_mod_json_path)
-        out_queue.logger.exception.assert_called_with(exception)
+        with pytest.raises(ValueError):
+            await out_queue.handle(add_mod_json_path)
+        assert await out_queue.handle_files([add_mod_json_path]) == []
+    assert add_mod_json_path.exists()
+    assert not os.path.exists(os.path.join(out_queue.trash_dir, os.path.basename(add_mod_json_path)))
+    entry = out_queue.backend.get_entry(add_mod_json_path.name)
+    assert entry.attempts == 1
+    assert entry.last_error == "ValueError: test"
+    assert entry.next_due > time.time()
+    assert await out_queue.due_queue_files() == ([], pytest.approx(10, abs=1))
 
 
 @pytest.mark.asyncio
@@ -190,3 +210,991 @@ async def test_handle_move_files_to_trash_dir_after_listener_loading_error(
     out_queue.logger.error.assert_called_with(
         "Error loading or invalid listener file %r.", add_mod_json_path.name
     )
+
+
+def _write_group_listener_file(path, entry_uuid, users=None, name="DEMOSCHOOL-1a"):
+    path.write_text(
+        ujson.dumps(
+            {
+                "dn": f"cn={name},cn=klassen,cn=schueler,cn=groups,ou=DEMOSCHOOL,dc=foo,dc=bar",
+                "id": entry_uuid,
+                "udm_object_type": "groups/group",
+                "object": {"name": name, "users": users or []},
+                "options": ["default"],
+            }
+        )
+    )
+
+
+@pytest.mark.asyncio
+async def test_out_queue_index_loads_files_only_once(
+    mock_plugins, example_user_json_path_real, temp_dir_func, school_authority_configuration
+):
+    temp_dir = temp_dir_func()
+    _write_group_listener_file(temp_dir / "2020-01-01-00-00-00-000001_ready.json", str(uuid.uuid4()))
+    shutil.copy2(example_user_json_path_real, temp_dir / "2020-01-01-00-00-00-000002_ready.json")
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir, school_authority=school_authority_configuration()
+    )
+    ori_load_listener_file = out_queue.load_listener_file
+    out_queue.load_listener_file = AsyncMock(side_effect=ori_load_listener_file)
+
+    paths = await out_queue.sorted_queue_files()
+    assert [p.name for _, p in paths] == [
+        "2020-01-01-00-00-00-000002_ready.json",  # user before group
+        "2020-01-01-00-00-00-000001_ready.json",
+    ]
+    assert out_queue.load_listener_file.await_count == 2
+    await out_queue.sorted_queue_files()
+    assert out_queue.load_listener_file.await_count == 2
+
+    out_queue.discard_file(paths[0][1])
+    assert [p.name for _, p in await out_queue.sorted_queue_files()] == [
+        "2020-01-01-00-00-00-000001_ready.json"
+    ]
+    assert out_queue.load_listener_file.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_out_queue_index_filled_on_enqueue(
+    mock_plugins, example_user_json_path_real, temp_dir_func, school_authority_configuration
+):
+    temp_dir = temp_dir_func()
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir, school_authority=school_authority_configuration()
+    )
+    obj = await out_queue.load_listener_file(example_user_json_path_real)
+    path = temp_dir / "2020-01-01-00-00-00-000001_ready.json"
+    shutil.copy2(example_user_json_path_real, path)
+    out_queue.add_to_index(path, obj)
+    out_queue.load_listener_file = AsyncMock()
+
+    assert await out_queue.sorted_queue_files() == [(0, path)]
+    out_queue.load_listener_file.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_out_queue_coalesce(
+    mock_plugins,
+    example_user_json_path_real,
+    example_user_remove_json_path_real,
+    temp_dir_func,
+    school_authority_configuration,
+):
+    temp_dir = temp_dir_func()
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir, school_authority=school_authority_configuration()
+    )
+    add_mod_obj = await out_queue.load_listener_file(example_user_json_path_real)
+    remove_obj = await out_queue.load_listener_file(example_user_remove_json_path_real)
+    assert add_mod_obj.id == remove_obj.id
+    paths = []
+    for num, (obj, record_uid) in enumerate(
+        ((add_mod_obj, "first"), (add_mod_obj, "second"), (remove_obj, "third"))
+    ):
+        obj = obj.copy(
+            update={
+                "old_data": ucsschool_id_connector.models.ListenerUserOldDataEntry(
+                    schools=["DEMOSCHOOL"], record_uid=record_uid, source_uid="TESTID"
+                )
+            }
+        )
+        path = temp_dir / f"2020-01-01-00-00-00-00000{num}_ready.json"
+        await out_queue.save_listener_file(obj, path)
+        paths.append(path)
+    _write_group_listener_file(temp_dir / "2020-01-01-00-00-00-000009_ready.json", str(uuid.uuid4()))
+    # files not added by the in-queue are found by a rescan
+    out_queue.backend.rescan()
+
+    remaining, merged_objs = await out_queue.coalesce(await out_queue.sorted_queue_files())
+
+    assert [p.name for _, p in remaining] == [
+        "2020-01-01-00-00-00-000002_ready.json",
+        "2020-01-01-00-00-00-000009_ready.json",
+    ]
+    assert not paths[0].exists()
+    assert not paths[1].exists()
+    assert list(merged_objs) == [paths[2]]
+    merged_obj = merged_objs[paths[2]]
+    # delete wins, oldest old_data is kept to find the user on the target
+    assert isinstance(merged_obj, ucsschool_id_connector.models.ListenerUserRemoveObject)
+    assert merged_obj.old_data.record_uid == "first"
+    assert [p.name for _, p in await out_queue.sorted_queue_files()] == [p.name for _, p in remaining]
+
+
+@pytest.mark.asyncio
+async def test_out_queue_coalesce_keeps_old_data_when_interrupted(
+    mock_plugins,
+    example_user_json_path_real,
+    temp_dir_func,
+    school_authority_configuration,
+):
+    temp_dir = temp_dir_func()
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir, school_authority=school_authority_configuration()
+    )
+    obj = await out_queue.load_listener_file(example_user_json_path_real)
+    paths = []
+    for num, record_uid in enumerate(("first", "second")):
+        path = temp_dir / f"2020-01-01-00-00-00-00000{num}_ready.json"
+        old_data = ucsschool_id_connector.models.ListenerUserOldDataEntry(
+            schools=["DEMOSCHOOL"], record_uid=record_uid, source_uid="TESTID"
+        )
+        await out_queue.save_listener_file(obj.copy(update={"old_data": old_data}), path)
+        paths.append(path)
+    out_queue.backend.rescan()
+
+    remaining, merged_objs = await out_queue.coalesce(await out_queue.sorted_queue_files())
+    assert [p for _, p in remaining] == [paths[1]]
+    assert merged_objs[paths[1]].old_data.record_uid == "first"
+
+    # the pass ends before the merged object is handled, e.g. by a restart
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir, school_authority=school_authority_configuration()
+    )
+    remaining, merged_objs = await out_queue.coalesce(await out_queue.sorted_queue_files())
+    assert [p for _, p in remaining] == [paths[1]]
+    assert merged_objs == {}
+    assert (await out_queue.load_listener_file(paths[1])).old_data.record_uid == "first"
+
+
+@pytest.mark.asyncio
+async def test_out_queue_workers_keep_order_per_object(temp_dir_func, school_authority_configuration):
+    temp_dir = temp_dir_func()
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir, school_authority=school_authority_configuration()
+    )
+    # fixed entryUUIDs, that are in different partitions of 4 workers
+    entry_uuids = [f"00000000-0000-0000-0000-00000000000{num}" for num in (1, 2, 4, 5)]
+    paths = []
+    for num in range(20):
+        path = temp_dir / f"2020-01-01-00-00-00-{num:06d}_ready.json"
+        path.write_text("{}")
+        out_queue.backend.set_entry(
+            path.name,
+            ucsschool_id_connector.queues.QueueEntry(0, "users/user", entry_uuids[num % 4], 0.0),
+        )
+        paths.append(path)
+    running = set()
+    max_running = 0
+    handled = []
+
+    async def fake_handle(path, obj=None):
+        nonlocal max_running
+        entry_uuid = out_queue.backend.get_entry(path.name).entry_uuid
+        assert entry_uuid not in running  # never two changes of the same object at once
+        running.add(entry_uuid)
+        max_running = max(max_running, len(running))
+        await asyncio.sleep(0.01)
+        handled.append(path)
+        running.remove(entry_uuid)
+
+    out_queue.handle = fake_handle
+    with patch("ucsschool_id_connector.queues.get_ucrv_int", return_value=4):
+        assert len(out_queue.partition(paths, out_queue.num_workers)) == 4
+        assert await out_queue.handle_files(paths) == []
+    assert max_running == 4
+    assert sorted(handled) == paths
+    for entry_uuid_num in range(4):
+        # changes of each object were handled in their original order
+        expected = paths[entry_uuid_num::4]
+        assert [p for p in handled if p in expected] == expected
+    assert not any(p.exists() for p in paths)
+
+
+@pytest.mark.asyncio
+async def test_out_queue_workers_stop_on_api_error(temp_dir_func, school_authority_configuration):
+    temp_dir = temp_dir_func()
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir, school_authority=school_authority_configuration()
+    )
+    paths = []
+    for num in range(10):
+        path = temp_dir / f"2020-01-01-00-00-00-{num:06d}_ready.json"
+        path.write_text("{}")
+        paths.append(path)
+
+    async def fake_handle(path, obj=None):
+        await asyncio.sleep(0.01)
+        if path == paths[3]:
+            raise ucsschool_id_connector.requests.APICommunicationError("test")
+
+    out_queue.handle = fake_handle
+    with patch("ucsschool_id_connector.queues.get_ucrv_int", return_value=2):
+        failed_paths = await out_queue.handle_files(paths)
+    assert failed_paths == [paths[3]]
+    assert paths[3].exists()
+    assert paths[-1].exists()
+    assert out_queue.circuit_breaker.state == ucsschool_id_connector.circuit_breaker.OPEN
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "exc",
+    [
+        httpx.ConnectError("connection refused"),
+        aiohttp.ClientConnectionError("connection reset"),
+        KelvinServerError("Internal Server Error", status=503),
+    ],
+    ids=["httpx", "aiohttp", "status_5xx"],
+)
+async def test_out_queue_plugin_transport_error_opens_circuit_breaker(
+    exc, temp_dir_func, school_authority_configuration
+):
+    temp_dir = temp_dir_func()
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir, school_authority=school_authority_configuration()
+    )
+    out_queue.circuit_breaker.record_success()
+    path = temp_dir / "2020-01-01-00-00-00-000000_ready.json"
+    _write_group_listener_file(path, str(uuid.uuid4()))
+    out_queue.backend.rescan()
+
+    async def fake_handle(path, obj=None):
+        raise exc
+
+    out_queue.handle = fake_handle
+    assert await out_queue.handle_files([path]) == [path]
+    assert out_queue.circuit_breaker.state == ucsschool_id_connector.circuit_breaker.OPEN
+    assert path.exists()
+    assert (await out_queue.index_entry(path)).attempts == 0
+
+
+@pytest.mark.asyncio
+async def test_out_queue_outage_does_not_dead_letter(temp_dir_func, school_authority_configuration):
+    temp_dir = temp_dir_func()
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir, school_authority=school_authority_configuration()
+    )
+    paths = []
+    for num in range(3):
+        path = temp_dir / f"2020-01-01-00-00-00-{num:06d}_ready.json"
+        _write_group_listener_file(path, str(uuid.uuid4()))
+        paths.append(path)
+    out_queue.backend.rescan()
+
+    async def fake_handle(path, obj=None):
+        if path == paths[0]:
+            raise httpx.ConnectError("connection refused")
+        # fails later, as the target is down
+        await asyncio.sleep(0.01)
+        raise ValueError("test")
+
+    out_queue.handle = fake_handle
+    # one file per worker
+    out_queue.partition = lambda paths, num_partitions: [[path] for path in paths]
+    with patch("ucsschool_id_connector.queues.get_ucrv_int", return_value=1):
+        for _ in range(3):
+            assert await out_queue.handle_files(paths) == [paths[0]]
+    assert list(out_queue.keep_dir.iterdir()) == []
+    for path in paths:
+        assert path.exists()
+        assert (await out_queue.index_entry(path)).attempts == 0
+
+
+@pytest.mark.asyncio
+async def test_out_queue_rejected_request_is_retried(temp_dir_func, school_authority_configuration):
+    temp_dir = temp_dir_func()
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir, school_authority=school_authority_configuration()
+    )
+    path = temp_dir / "2020-01-01-00-00-00-000000_ready.json"
+    _write_group_listener_file(path, str(uuid.uuid4()))
+    out_queue.backend.rescan()
+    out_queue.handle = AsyncMock(
+        side_effect=ucsschool_id_connector.requests.APIRequestError("bad request", status=400)
+    )
+    assert await out_queue.handle_files([path]) == []
+    assert out_queue.circuit_breaker.state != ucsschool_id_connector.circuit_breaker.OPEN
+    entry = await out_queue.index_entry(path)
+    assert entry.attempts == 1
+    assert entry.last_error == "APIRequestError: bad request"
+
+
+def _in_queue_with_out_queues(temp_dir_func, school_authority_configuration, count):
+    out_queues = []
+    for num in range(count):
+        s_a_config = school_authority_configuration(name=f"auth{num}")
+        out_queues.append(
+            ucsschool_id_connector.queues.OutQueue(
+                name=s_a_config.name, path=temp_dir_func(), school_authority=s_a_config
+            )
+        )
+    in_queue = ucsschool_id_connector.queues.InQueue(path=temp_dir_func(), out_queues=out_queues)
+    return in_queue, out_queues
+
+
+def _distribute_to(s_a_names):
+    async def _s_a_names():
+        return set(s_a_names)
+
+    return Mock(return_value=[_s_a_names()])
+
+
+@pytest.mark.asyncio
+async def test_in_queue_distribute_links_files(
+    mock_plugins, temp_dir_func, school_authority_configuration, example_user_json_path_real
+):
+    in_queue, out_queues = _in_queue_with_out_queues(temp_dir_func, school_authority_configuration, 3)
+    path = in_queue.path / "2020-01-01-00-00-00-000001_ready.json"
+    shutil.copy2(example_user_json_path_real, path)
+    with patch.object(
+        ucsschool_id_connector.queues.plugin_manager.hook,
+        "school_authorities_to_distribute_to",
+        _distribute_to([q.name for q in out_queues]),
+    ):
+        await in_queue.distribute()
+    assert not path.exists()
+    targets = [q.path / path.name for q in out_queues]
+    assert len({t.stat().st_ino for t in targets}) == 1
+    assert targets[0].stat().st_nlink == 3
+    for out_queue in out_queues:
+        assert out_queue.backend.get_entry(path.name)
+
+
+@pytest.mark.asyncio
+async def test_in_queue_distribute_copies_across_devices(
+    mock_plugins, temp_dir_func, school_authority_configuration, example_user_json_path_real
+):
+    in_queue, out_queues = _in_queue_with_out_queues(temp_dir_func, school_authority_configuration, 2)
+    path = in_queue.path / "2020-01-01-00-00-00-000001_ready.json"
+    shutil.copy2(example_user_json_path_real, path)
+    with patch.object(
+        ucsschool_id_connector.queues.plugin_manager.hook,
+        "school_authorities_to_distribute_to",
+        _distribute_to([q.name for q in out_queues]),
+    ), patch(
+        "ucsschool_id_connector.queue_backends.os.link",
+        side_effect=OSError(18, "Invalid cross-device link"),
+    ):
+        await in_queue.distribute()
+    assert not path.exists()
+    for out_queue in out_queues:
+        target = out_queue.path / path.name
+        assert target.stat().st_nlink == 1
+        assert target.read_bytes() == example_user_json_path_real.read_bytes()
+
+
+@pytest.mark.asyncio
+async def test_listener_file_parsed_once(
+    mock_plugins, temp_dir_func, school_authority_configuration, example_user_json_path_copy
+):
+    in_queue, out_queues = _in_queue_with_out_queues(temp_dir_func, school_authority_configuration, 2)
+    path = example_user_json_path_copy(in_queue.path)
+    loads = Mock(side_effect=ujson.loads)
+    with patch.object(
+        ucsschool_id_connector.queues.plugin_manager.hook,
+        "school_authorities_to_distribute_to",
+        _distribute_to([q.name for q in out_queues]),
+    ), patch("ucsschool_id_connector.queues.ujson.loads", loads):
+        new_path = await in_queue.preprocess_file(path)
+        preprocessed_obj = await in_queue.load_listener_file(new_path)
+        await in_queue.distribute()
+        for out_queue in out_queues:
+            target = out_queue.path / new_path.name
+            assert (await out_queue.sorted_queue_files()) == [(0, target)]
+            assert await out_queue.load_listener_file(target) is preprocessed_obj
+    assert loads.call_count == 1
+    assert isinstance(preprocessed_obj.user_passwords, ucsschool_id_connector.models.UserPasswords)
+
+
+@pytest.mark.asyncio
+async def test_listener_object_cache_invalidated_on_change(
+    mock_plugins, temp_dir_func, school_authority_configuration, example_user_json_path_copy
+):
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir_func(), school_authority=school_authority_configuration()
+    )
+    path = example_user_json_path_copy(out_queue.path)
+    obj1 = await out_queue.load_listener_file(path)
+    assert await out_queue.load_listener_file(path) is obj1
+    obj_dict = ujson.loads(path.read_text())
+    obj_dict["object"]["firstname"] = "Changed firstname"
+    path.write_text(ujson.dumps(obj_dict))
+    obj2 = await out_queue.load_listener_file(path)
+    assert obj2 is not obj1
+    assert obj2.object["firstname"] == "Changed firstname"
+    out_queue.discard_file(path)
+    assert str(path) not in out_queue._listener_objects
+
+
+@pytest.mark.asyncio
+async def test_in_queue_preprocess_files_concurrently_in_order(mock_plugins, temp_dir_func):
+    in_queue = ucsschool_id_connector.queues.InQueue(path=temp_dir_func())
+    entry_uuids = [str(uuid.uuid4()) for _ in range(3)]
+    paths = []
+    for num in range(12):
+        path = in_queue.path / f"2020-01-01-00-00-00-{num:06d}.json"
+        _write_group_listener_file(path, entry_uuids[num % 3])
+        paths.append(path)
+    running = set()
+    max_running = 0
+    preprocessed = []
+
+    async def fake_preprocess_object(obj, path):
+        nonlocal max_running
+        assert obj.id not in running  # never two changes of the same object at once
+        running.add(obj.id)
+        max_running = max(max_running, len(running))
+        # later files finish first
+        await asyncio.sleep(0.01 * (12 - paths.index(path)) / 12)
+        preprocessed.append(path)
+        running.remove(obj.id)
+
+    in_queue.preprocess_object = fake_preprocess_object
+    with patch("ucsschool_id_connector.queues.get_ucrv_int", return_value=3):
+        results = [(path, await res) async for path, res in in_queue.preprocess_files(paths)]
+    assert [path for path, _ in results] == paths
+    assert [obj.id for _, obj in results] == [entry_uuids[num % 3] for num in range(12)]
+    assert all(path.exists() for path in paths)  # renamed only by mark_files_ready()
+    assert max_running > 1
+    for entry_uuid_num in range(3):
+        expected = paths[entry_uuid_num::3]
+        assert [p for p in preprocessed if p in expected] == expected
+
+
+@pytest.mark.asyncio
+async def test_in_queue_preprocess_files_invalid_file(mock_plugins, temp_dir_func):
+    in_queue = ucsschool_id_connector.queues.InQueue(path=temp_dir_func())
+    paths = [in_queue.path / f"2020-01-01-00-00-00-{num:06d}.json" for num in range(3)]
+    _write_group_listener_file(paths[0], str(uuid.uuid4()))
+    paths[1].write_text("{")
+    _write_group_listener_file(paths[2], str(uuid.uuid4()))
+    in_queue.preprocess_object = AsyncMock()
+    results = []
+    async for path, res in in_queue.preprocess_files(paths):
+        try:
+            results.append(await res)
+        except ucsschool_id_connector.queues.InvalidListenerFile:
+            results.append(None)
+    assert results[1] is None
+    assert isinstance(results[0], ucsschool_id_connector.models.ListenerObject)
+    assert isinstance(results[2], ucsschool_id_connector.models.ListenerObject)
+
+
+@pytest.mark.asyncio
+async def test_in_queue_mark_files_ready_stores_data_first(mock_plugins, temp_dir_func):
+    in_queue = ucsschool_id_connector.queues.InQueue(path=temp_dir_func())
+    paths = [in_queue.path / f"2020-01-01-00-00-00-{num:06d}.json" for num in range(3)]
+    for path in paths:
+        _write_group_listener_file(path, str(uuid.uuid4()))
+    in_queue.preprocess_object = AsyncMock()
+    files = [
+        (num, path, await res)
+        async for num, (path, res) in _aenumerate(in_queue.preprocess_files(paths))
+    ]
+    files_at_pass_end = []
+
+    def preprocess_pass_end():
+        files_at_pass_end.extend(path.name for path in in_queue.path.glob("*.json"))
+        return []
+
+    with patch.object(
+        ucsschool_id_connector.queues.plugin_manager.hook, "preprocess_pass_end", preprocess_pass_end
+    ):
+        await in_queue.mark_files_ready(files)
+    assert files == []
+    assert sorted(files_at_pass_end) == [path.name for path in paths]
+    assert all(
+        not path.exists() and path.with_name(f"{path.stem}_ready.json").exists() for path in paths
+    )
+
+
+async def _aenumerate(aiterable, start=1):
+    num = start
+    async for item in aiterable:
+        yield num, item
+        num += 1
+
+
+def test_queue_counters():
+    counters = ucsschool_id_connector.queues.QueueCounters()
+    assert len(counters) == 0
+    assert counters.oldest() is None
+    counters.add("b.json", 20.0)
+    counters.add("a.json", 10.0)
+    counters.add("c.json", 30.0)
+    assert len(counters) == 3
+    assert counters.oldest() == 10.0
+    counters.remove("a.json")
+    counters.remove("unknown.json")
+    assert counters.oldest() == 20.0
+    counters.rename("b.json", "b_ready.json")
+    assert len(counters) == 2
+    assert counters.oldest() == 20.0
+    counters.remove("b_ready.json")
+    assert counters.oldest() == 30.0
+    counters.reset([("d.json", 5.0)])
+    assert len(counters) == 1
+    assert counters.oldest() == 5.0
+
+
+def test_in_queue_counters():
+    counters = ucsschool_id_connector.queues.InQueueCounters()
+    assert len(counters) == 0
+    assert counters.oldest() is None
+    counters.add("a.json", 10.0)
+    counters.add("b.json", 20.0)
+    counters.rename("a.json", "a_ready.json")
+    counters.remove("foo.txt")
+    assert len(counters) == 2
+    assert counters.oldest() == 10.0
+    counters.remove("a_ready.json")
+    assert len(counters) == 1
+    # the oldest file since the queue was last empty
+    assert counters.oldest() == 10.0
+    counters.remove("b.json")
+    assert len(counters) == 0
+    assert counters.oldest() is None
+    counters.add("c.json", 30.0)
+    assert counters.oldest() == 30.0
+    counters.reset(3, 5.0)
+    assert len(counters) == 3
+    assert counters.oldest() == 5.0
+
+
+@pytest.mark.asyncio
+async def test_in_queue_counts_found_files(temp_dir_func, school_authority_configuration):
+    in_queue, _ = _in_queue_with_out_queues(temp_dir_func, school_authority_configuration, 1)
+    for name in ("2020-01-01-00-00-00-000001_ready.json", "2020-01-01-00-00-00-000002.json"):
+        _write_group_listener_file(in_queue.path / name, str(uuid.uuid4()))
+    os.utime(in_queue.path / "2020-01-01-00-00-00-000001_ready.json", (1000.0, 1000.0))
+    in_queue.sync_counters()
+    # files that are not preprocessed yet are counted by the next pass
+    assert len(in_queue) == 1
+    assert in_queue.counters.oldest() == 1000.0
+    paths = in_queue.count_new_files(
+        in_queue.iter_queue_files(lambda name: not name.endswith("_ready.json"))
+    )
+    assert [path.name for path in paths] == ["2020-01-01-00-00-00-000002.json"]
+    assert len(in_queue) == 2
+    in_queue.discard_file(in_queue.path / "2020-01-01-00-00-00-000002.json")
+    assert len(in_queue) == 1
+
+
+@pytest.mark.asyncio
+async def test_out_queue_due_files_without_listing(
+    mock_plugins, temp_dir_func, school_authority_configuration
+):
+    in_queue, (out_queue,) = _in_queue_with_out_queues(temp_dir_func, school_authority_configuration, 1)
+    paths = []
+    for num in range(3):
+        path = in_queue.path / f"2020-01-01-00-00-00-{num:06d}_ready.json"
+        _write_group_listener_file(path, str(uuid.uuid4()))
+        out_queue.enqueue_file(path, await in_queue.load_listener_file(path))
+        paths.append(out_queue.path / path.name)
+    with patch(
+        "ucsschool_id_connector.queue_backends.os.scandir", side_effect=AssertionError("listed queue")
+    ):
+        due_paths, _ = await out_queue.due_queue_files(limit=2)
+    assert [path for *_, path in due_paths] == paths[:2]
+
+
+@pytest.mark.asyncio
+async def test_in_queue_ignores_own_save_back(mock_plugins, temp_dir_func):
+    in_queue = ucsschool_id_connector.queues.InQueue(path=temp_dir_func())
+    path = in_queue.path / "2020-01-01-00-00-00-000001.json"
+    _write_group_listener_file(path, str(uuid.uuid4()))
+    obj = await in_queue.load_listener_file(path)
+    try:
+        # creates and starts the watcher
+        await in_queue.wait_for_changes(0.1)
+        assert in_queue.watcher.uses_inotify
+        in_queue.watcher.debounce = 0
+        await in_queue.save_listener_file(obj, path)
+        assert await in_queue.wait_for_changes(0.3) is False
+        assert in_queue._own_writes == set()
+        # the same file replaced by another process wakes the queue up
+        ucsschool_id_connector.durable_files.write_file_atomic(path, path.read_text())
+        assert await in_queue.wait_for_changes(0.3) is True
+    finally:
+        in_queue.stop_watching()
+
+
+@pytest.mark.asyncio
+async def test_queue_rescans_after_lost_events(temp_dir_func, school_authority_configuration):
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir_func(), school_authority=school_authority_configuration()
+    )
+    # added by something else than the in-queue
+    _write_group_listener_file(
+        out_queue.path / "2020-01-01-00-00-00-000001_ready.json", str(uuid.uuid4())
+    )
+    out_queue.watcher = Mock(wait=AsyncMock(return_value=True), events_lost=False)
+    await out_queue.wait_for_changes()
+    assert len(out_queue) == 0
+    out_queue.watcher.events_lost = True
+    await out_queue.wait_for_changes()
+    assert len(out_queue) == 1
+    assert out_queue.watcher.events_lost is False
+
+
+@pytest.mark.asyncio
+async def test_queue_model_from_counters(
+    mock_plugins, temp_dir_func, school_authority_configuration, example_user_json_path_real
+):
+    in_queue, out_queues = _in_queue_with_out_queues(temp_dir_func, school_authority_configuration, 1)
+    out_queue = out_queues[0]
+    path = in_queue.path / "2020-01-01-00-00-00-000001_ready.json"
+    shutil.copy2(example_user_json_path_real, path)
+    obj = await in_queue.load_listener_file(path)
+    with patch("ucsschool_id_connector.queues.time.time", return_value=1000.0):
+        out_queue.enqueue_file(path, obj)
+    with patch("ucsschool_id_connector.queues.time.time", return_value=1060.0), patch(
+        "ucsschool_id_connector.queue_backends.os.scandir", side_effect=AssertionError("listed queue")
+    ):
+        queue_model = out_queue.as_queue_model()
+    assert queue_model.length == 1
+    assert queue_model.oldest_entry_age == 60
+    out_queue.ack_file(out_queue.path / path.name)
+    queue_model = out_queue.as_queue_model()
+    assert queue_model.length == 0
+    assert queue_model.oldest_entry_age == 0
+
+
+@pytest.mark.asyncio
+async def test_out_queue_check_connection_uses_circuit_breaker(
+    temp_dir_func, school_authority_configuration
+):
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir_func(), school_authority=school_authority_configuration()
+    )
+    ping_results = [False, True]
+
+    async def fake_ping():
+        return ping_results.pop(0)
+
+    ping_caller = Mock(side_effect=lambda school_authority: [fake_ping()])
+    with patch("ucsschool_id_connector.queues.filter_plugins", return_value=ping_caller), patch(
+        "ucsschool_id_connector.queues.asyncio.sleep", new_callable=AsyncMock
+    ) as sleep_mock:
+        assert not await out_queue.check_connection()
+        sleep_mock.assert_not_called()
+        assert await out_queue.check_connection()
+        sleep_mock.assert_awaited_once()
+        assert (
+            sleep_mock.call_args[0][0]
+            <= ucsschool_id_connector.constants.API_COMMUNICATION_ERROR_MIN_WAIT
+        )
+        # breaker is closed, no more pings
+        assert await out_queue.check_connection()
+    assert ping_caller.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_out_queue_retry_keeps_order_per_object(temp_dir_func, school_authority_configuration):
+    temp_dir = temp_dir_func()
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir, school_authority=school_authority_configuration()
+    )
+    entry_uuids = [str(uuid.uuid4()) for _ in range(2)]
+    paths = []
+    for num, entry_uuid in enumerate(entry_uuids * 2):
+        path = temp_dir / f"2020-01-01-00-00-00-{num:06d}_ready.json"
+        _write_group_listener_file(path, entry_uuid)
+        paths.append(path)
+    out_queue.backend.rescan()
+    await out_queue.retry_later(paths[0], ValueError("test"))
+    due_paths, retry_in = await out_queue.due_queue_files()
+    # the later change of the first object waits as well
+    assert [path for *_, path in due_paths] == [paths[1], paths[3]]
+    assert 0 < retry_in <= out_queue.retry_wait(1)
+
+
+@pytest.mark.asyncio
+async def test_out_queue_dead_letters(mock_plugins, temp_dir_func, school_authority_configuration):
+    temp_dir = temp_dir_func()
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir, school_authority=school_authority_configuration()
+    )
+    paths = []
+    for num in range(3):
+        path = temp_dir / f"2020-01-01-00-00-00-{num:06d}_ready.json"
+        _write_group_listener_file(path, str(uuid.uuid4()))
+        paths.append(path)
+    with patch("ucsschool_id_connector.queues.get_ucrv_int", return_value=2):
+        for path in paths:
+            await out_queue.retry_later(path, ValueError("test"))
+            await out_queue.retry_later(path, ValueError("again"))
+    assert len(out_queue) == 0
+    dead_letters = await out_queue.dead_letters()
+    assert [dead_letter.name for dead_letter in dead_letters] == [path.name for path in paths]
+    assert dead_letters[0].attempts == 2
+    assert dead_letters[0].last_error == "ValueError: again"
+    assert dead_letters[0].data is None
+    (dead_letter,) = await out_queue.dead_letters([paths[1].name])
+    assert dead_letter.data["udm_object_type"] == "groups/group"
+    with pytest.raises(ucsschool_id_connector.models.NoObjectError):
+        await out_queue.dead_letters(["../queue.sqlite"])
+
+    assert await out_queue.replay_dead_letters([paths[1].name]) == [paths[1].name]
+    assert [name for _, name in await out_queue.queue_items()] == [paths[1].name]
+    assert out_queue.backend.get_entry(paths[1].name).attempts == 0
+    assert len(await out_queue.dead_letters()) == 2
+    assert await out_queue.replay_dead_letters() == [paths[0].name, paths[2].name]
+    assert len(out_queue) == 3
+    assert list(out_queue.keep_dir.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_out_queue_priority_lane(mock_plugins, temp_dir_func, school_authority_configuration):
+    in_dir = temp_dir_func()
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir_func(), school_authority=school_authority_configuration()
+    )
+    entry_uuids = [str(uuid.uuid4()) for _ in range(3)]
+    priorities = [PRIORITY_NORMAL, PRIORITY_NORMAL, PRIORITY_HIGH, PRIORITY_HIGH]
+    paths = []
+    for num, (entry_uuid, priority) in enumerate(zip(entry_uuids + entry_uuids[:1], priorities)):
+        path = in_dir / f"2020-01-01-00-00-00-{num:06d}_ready.json"
+        _write_group_listener_file(path, entry_uuid)
+        out_queue.enqueue_file(path, await out_queue.load_listener_file(path), priority)
+        paths.append(out_queue.path / path.name)
+    assert out_queue.priority_pending
+
+    due_paths, _ = await out_queue.due_queue_files()
+    # all changes of the first object are sent before the later change with a high priority
+    assert [path for *_, path in due_paths] == [paths[0], paths[2], paths[3], paths[1]]
+    assert [priority for priority, *_ in due_paths] == [PRIORITY_HIGH] * 3 + [PRIORITY_NORMAL]
+
+    with patch("ucsschool_id_connector.queues.OUT_QUEUE_BATCH_SIZE", 2), patch(
+        "ucsschool_id_connector.queues.OUT_QUEUE_PRIORITY_WEIGHT", 1
+    ):
+        assert await out_queue.next_tier(due_paths) == [paths[0], paths[2]]
+        # normal priority files are not starved
+        assert await out_queue.next_tier(due_paths) == [paths[1]]
+        assert await out_queue.next_tier(due_paths) == [paths[0], paths[2]]
+
+
+def _write_user_listener_file(path, example_user_json_path, username, legal_guardians=None):
+    obj_dict = ujson.loads(example_user_json_path.read_text())
+    obj_dict["dn"] = f"uid={username},cn=schueler,cn=users,ou=DEMOSCHOOL,dc=foo,dc=bar"
+    obj_dict["id"] = str(uuid.uuid4())
+    obj_dict["object"]["username"] = username
+    obj_dict["object"]["ucsschoolLegalGuardian"] = legal_guardians or []
+    path.write_text(ujson.dumps(obj_dict))
+    return obj_dict["dn"]
+
+
+@pytest.mark.asyncio
+async def test_out_queue_next_tier_waits_for_dependencies(
+    mock_plugins, temp_dir_func, school_authority_configuration, example_user_json_path_real
+):
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir_func(), school_authority=school_authority_configuration()
+    )
+    paths = [out_queue.path / f"2020-01-01-00-00-00-{num:06d}_ready.json" for num in range(5)]
+    guardian_dn = _write_user_listener_file(paths[0], example_user_json_path_real, "guardian")
+    ward_dn = _write_user_listener_file(
+        paths[1], example_user_json_path_real, "ward", legal_guardians=[guardian_dn.upper()]
+    )
+    # the school class of the ward waits, the other school class doesn't
+    group_uuid = str(uuid.uuid4())
+    _write_group_listener_file(paths[2], group_uuid, users=[ward_dn], name="DEMOSCHOOL-1a")
+    _write_group_listener_file(paths[3], str(uuid.uuid4()), users=["uid=other"], name="DEMOSCHOOL-1b")
+    # a later change of the same school class waits as well
+    _write_group_listener_file(paths[4], group_uuid, name="DEMOSCHOOL-1a")
+    out_queue.backend.rescan()
+    due_paths, _ = await out_queue.due_queue_files()
+    assert await out_queue.next_tier(due_paths) == [paths[0], paths[3]]
+
+    out_queue.ack_file(paths[0])
+    out_queue.ack_file(paths[3])
+    due_paths, _ = await out_queue.due_queue_files()
+    assert await out_queue.next_tier(due_paths) == [paths[1]]
+
+    out_queue.ack_file(paths[1])
+    due_paths, _ = await out_queue.due_queue_files()
+    assert await out_queue.next_tier(due_paths) == [paths[2], paths[4]]
+
+
+@pytest.mark.asyncio
+async def test_out_queue_next_tier_user_removal_before_group(
+    mock_plugins, temp_dir_func, school_authority_configuration, example_user_remove_json_path_real
+):
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir_func(), school_authority=school_authority_configuration()
+    )
+    paths = [out_queue.path / f"2020-01-01-00-00-00-{num:06d}_ready.json" for num in range(2)]
+    # the group was modified before the removal of its former member, the removal is sent first
+    _write_group_listener_file(paths[0], str(uuid.uuid4()), users=["uid=other"])
+    shutil.copy2(example_user_remove_json_path_real, paths[1])
+    out_queue.backend.rescan()
+    assert await out_queue.ready_files(paths) == {paths[1]}
+    due_paths, _ = await out_queue.due_queue_files()
+    assert await out_queue.next_tier(due_paths) == [paths[1]]
+
+    out_queue.ack_file(paths[1])
+    due_paths, _ = await out_queue.due_queue_files()
+    assert await out_queue.next_tier(due_paths) == [paths[0]]
+
+
+@pytest.mark.asyncio
+async def test_out_queue_next_tier_circular_dependencies(
+    mock_plugins, temp_dir_func, school_authority_configuration, example_user_json_path_real
+):
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir_func(), school_authority=school_authority_configuration()
+    )
+    paths = [out_queue.path / f"2020-01-01-00-00-00-{num:06d}_ready.json" for num in range(2)]
+    dns = [f"uid=user{num},cn=schueler,cn=users,ou=DEMOSCHOOL,dc=foo,dc=bar" for num in range(2)]
+    _write_user_listener_file(paths[0], example_user_json_path_real, "user0", legal_guardians=[dns[1]])
+    _write_user_listener_file(paths[1], example_user_json_path_real, "user1", legal_guardians=[dns[0]])
+    out_queue.backend.rescan()
+    due_paths, _ = await out_queue.due_queue_files()
+    assert await out_queue.ready_files(paths) == set()
+    assert await out_queue.next_tier(due_paths) == paths
+
+
+@pytest.mark.asyncio
+async def test_out_queue_handle_tier_interrupted_by_priority(
+    temp_dir_func, school_authority_configuration
+):
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir_func(), school_authority=school_authority_configuration()
+    )
+    tier = [out_queue.path / f"2020-01-01-00-00-00-{num:06d}_ready.json" for num in range(3)]
+
+    async def handle_files(paths, coalesced_objs):
+        out_queue.priority_pending = True
+        return []
+
+    out_queue.handle_files = AsyncMock(side_effect=handle_files)
+    with patch("ucsschool_id_connector.queues.OUT_QUEUE_BATCH_SIZE", 2):
+        assert await out_queue.handle_tier(tier, {}) == ([], True)
+    out_queue.handle_files.assert_awaited_once_with(tier[:2], {})
+
+
+@pytest.mark.asyncio
+async def test_in_queue_distribute_uses_priority_markers(
+    mock_plugins, temp_dir_func, school_authority_configuration
+):
+    in_queue, (out_queue,) = _in_queue_with_out_queues(temp_dir_func, school_authority_configuration, 1)
+    marker_dir = temp_dir_func()
+    entry_uuids = [str(uuid.uuid4()) for _ in range(2)]
+    paths = []
+    with patch("ucsschool_id_connector.utils.PRIORITY_MARKER_DIR", marker_dir):
+        for entry_uuid in entry_uuids:
+            ucsschool_id_connector.utils.write_priority_marker(entry_uuid, PRIORITY_HIGH)
+    for num, entry_uuid in enumerate(entry_uuids):
+        path = in_queue.path / f"2020-01-01-00-00-00-{num:06d}_ready.json"
+        _write_group_listener_file(path, entry_uuid)
+        paths.append(path)
+    # the change of the second object happened before the priority was requested
+    old_mtime = (marker_dir / entry_uuids[1]).stat().st_mtime - 10
+    os.utime(paths[1], (old_mtime, old_mtime))
+
+    with patch("ucsschool_id_connector.queues.PRIORITY_MARKER_DIR", marker_dir), patch.object(
+        ucsschool_id_connector.queues.plugin_manager.hook,
+        "school_authorities_to_distribute_to",
+        Mock(side_effect=lambda **kwargs: _distribute_to([out_queue.name])()),
+    ):
+        await in_queue.distribute()
+    assert out_queue.backend.get_entry(paths[0].name).priority == PRIORITY_HIGH
+    assert out_queue.backend.get_entry(paths[1].name).priority == PRIORITY_NORMAL
+    assert out_queue.priority_pending
+    assert [p.name for p in marker_dir.iterdir()] == [entry_uuids[1]]
+
+
+@pytest.mark.asyncio
+async def test_out_queue_backpressure(mock_plugins, temp_dir_func, school_authority_configuration):
+    in_queue, (out_queue,) = _in_queue_with_out_queues(temp_dir_func, school_authority_configuration, 1)
+    entry_uuids = [str(uuid.uuid4()) for _ in range(4)]
+    names = []
+    for num, entry_uuid in enumerate(entry_uuids):
+        path = in_queue.path / f"2020-01-01-00-00-00-{num:06d}_ready.json"
+        _write_group_listener_file(path, entry_uuid)
+        names.append(path.name)
+    with patch.object(ucsschool_id_connector.queues.OutQueue, "high_watermark", 2), patch.object(
+        ucsschool_id_connector.queues.OutQueue, "low_watermark", 1
+    ), patch.object(
+        ucsschool_id_connector.queues.plugin_manager.hook,
+        "school_authorities_to_distribute_to",
+        Mock(side_effect=lambda **kwargs: _distribute_to([out_queue.name])()),
+    ):
+        await in_queue.distribute()
+        assert out_queue.backend.names() == names[:2]
+        assert [name for _, name, *_ in out_queue.overflow.peek()] == names[2:]
+        queue_model = out_queue.as_queue_model()
+        assert (queue_model.length, queue_model.overflow, queue_model.alarm) == (2, 2, True)
+        # high priority changes skip the overflow store, unless a change of the object is stored there
+        new_obj = Mock(id=str(uuid.uuid4()))
+        assert not out_queue.must_spill(new_obj, PRIORITY_HIGH)
+        assert out_queue.must_spill(Mock(id=entry_uuids[3]), PRIORITY_HIGH)
+        assert out_queue.must_spill(new_obj, PRIORITY_NORMAL)
+
+        assert out_queue.refill() == 0
+        out_queue.ack_file(out_queue.path / names[0])
+        assert out_queue.refill() == 1
+        assert out_queue.backend.names() == names[1:3]
+        assert out_queue.under_pressure()
+        out_queue.ack_file(out_queue.path / names[1])
+        out_queue.ack_file(out_queue.path / names[2])
+        assert out_queue.refill() == 1
+        assert out_queue.backend.names() == names[3:]
+        assert not out_queue.under_pressure()
+        assert out_queue.as_queue_model().alarm is False
+
+
+def test_out_queue_settings_are_kept(temp_dir_func, school_authority_configuration):
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir_func(), school_authority=school_authority_configuration()
+    )
+    with patch("ucsschool_id_connector.queues.get_ucrv_int", return_value=3) as get_ucrv_mock:
+        for _ in range(10):
+            assert out_queue.high_watermark == 3
+            assert out_queue.num_workers == 3
+        assert get_ucrv_mock.call_count == 2
+        get_ucrv_mock.return_value = 5
+        assert out_queue.num_workers == 3
+        with patch(
+            "ucsschool_id_connector.queues.time.monotonic",
+            return_value=time.monotonic() + ucsschool_id_connector.constants.OUT_QUEUE_SETTINGS_TTL + 1,
+        ):
+            assert out_queue.num_workers == 5
+    get_ucrv_mock.assert_called_with(
+        *ucsschool_id_connector.constants.UCRV_OUT_QUEUE_WORKERS, queue_name="test"
+    )
+
+
+def test_in_queue_iter_queue_files(temp_dir_func):
+    in_queue = ucsschool_id_connector.queues.InQueue(path=temp_dir_func())
+    names = [f"2020-01-01-00-00-00-{num:06d}.json" for num in range(5)]
+    for name in names[:4]:
+        (in_queue.path / name).write_text("{}")
+    (in_queue.path / "foo.txt").write_text("")
+    result = []
+    with patch("ucsschool_id_connector.queues.scan_queue_dir", wraps=scan_queue_dir) as scan_mock:
+        for path in in_queue.iter_queue_files(batch_size=2):
+            result.append(path.name)
+            if path.name == names[2]:
+                # files arriving during the iteration are included
+                (in_queue.path / names[4]).write_text("{}")
+    assert result == names
+    assert scan_mock.call_count == 3
+    assert not (in_queue.path / "foo.txt").exists()
+
+
+@pytest.mark.asyncio
+async def test_out_queue_due_queue_files_window(temp_dir_func, school_authority_configuration):
+    in_dir = temp_dir_func()
+    out_queue = ucsschool_id_connector.queues.OutQueue(
+        name="test", path=temp_dir_func(), school_authority=school_authority_configuration()
+    )
+    paths = []
+    for num in range(5):
+        path = in_dir / f"2020-01-01-00-00-00-{num:06d}_ready.json"
+        _write_group_listener_file(path, str(uuid.uuid4()))
+        obj = ucsschool_id_connector.models.ListenerGroupAddModifyObject(**ujson.loads(path.read_text()))
+        out_queue.enqueue_file(path, obj, PRIORITY_HIGH if num == 4 else PRIORITY_NORMAL)
+        paths.append(out_queue.path / path.name)
+    await out_queue.retry_later(paths[0], ValueError("test"))
+
+    due_paths, retry_in = await out_queue.due_queue_files(limit=2)
+    # high priority files are found outside of the window
+    assert [path for *_, path in due_paths] == [paths[4], paths[1], paths[2]]
+    # more files are due
+    assert retry_in == 0
+    due_paths, retry_in = await out_queue.due_queue_files(limit=5)
+    assert len(due_paths) == 4
+    assert retry_in > 0
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+import asyncio
+import email.utils
+import time
+
+import httpx
+import pytest
+
+from ucsschool_id_connector.rate_limit import RateLimiter, get_rate_limiter, parse_retry_after
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    retry_after = parse_retry_after(email.utils.formatdate(time.time() + 60, usegmt=True))
+    assert 55 < retry_after <= 60
+    assert parse_retry_after(email.utils.formatdate(time.time() - 60, usegmt=True)) == 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_token_bucket():
+    rate_limiter = RateLimiter("test", requests_per_second=10, burst=2)
+    for _ in range(2):
+        await rate_limiter.acquire()
+        rate_limiter.release(200)
+    assert 0 < rate_limiter.wait_time() <= 0.1
+    start = time.monotonic()
+    await rate_limiter.acquire()
+    assert time.monotonic() - start >= 0.05
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_max_in_flight():
+    rate_limiter = RateLimiter("test", max_in_flight=1)
+    await rate_limiter.acquire()
+    task = asyncio.create_task(rate_limiter.acquire())
+    await asyncio.sleep(0.01)
+    assert not task.done()
+    rate_limiter.release(200)
+    await asyncio.wait_for(task, 1)
+    assert rate_limiter.in_flight == 1
+
+
+def test_rate_limiter_aimd():
+    rate_limiter = RateLimiter("test", requests_per_second=8, max_in_flight=4)
+    rate_limiter.in_flight = 1
+    rate_limiter.release(429, retry_after=5)
+    assert rate_limiter.rate == 4
+    assert rate_limiter.in_flight_limit == 2
+    assert 4.9 < rate_limiter.wait_time() <= 5
+    # 503 without Retry-After is a server error, not a request to slow down
+    rate_limiter.release(503)
+    assert rate_limiter.rate == 4
+    rate_limiter.release(200)
+    assert rate_limiter.rate == 4.25
+    assert rate_limiter.in_flight_limit == 2.5
+    for _ in range(100):
+        rate_limiter.release(200)
+    assert (rate_limiter.rate, rate_limiter.in_flight_limit) == (8, 4)
+
+
+def test_get_rate_limiter(school_authority_configuration):
+    s_a_config = school_authority_configuration()
+    assert get_rate_limiter(s_a_config) is None
+    s_a_config.plugin_configs["kelvin"]["rate_limit"] = {"requests_per_second": 5}
+    rate_limiter = get_rate_limiter(s_a_config)
+    assert (rate_limiter.requests_per_second, rate_limiter.burst, rate_limiter.max_in_flight) == (
+        5,
+        5,
+        0,
+    )
+    assert get_rate_limiter(s_a_config, "kelvin") is rate_limiter
+    s_a_config.plugin_configs["kelvin"]["rate_limit"] = {"requests_per_second": 5, "max_in_flight": 2}
+    assert get_rate_limiter(s_a_config) is rate_limiter
+    assert rate_limiter.max_in_flight == 2
+    s_a_config.plugin_configs["kelvin"]["rate_limit"] = {"requests_per_second": "fast"}
+    with pytest.raises(ValueError):
+        get_rate_limiter(s_a_config)
+
+
+@pytest.mark.asyncio
+async def test_kelvin_session_rate_limited(idc_defaults, school_authority_configuration):
+    from ucsschool_id_connector_defaults.kelvin_connection import (
+        RateLimitedTransport,
+        kelvin_client_session,
+    )
+
+    s_a_config = school_authority_configuration()
+    assert "transport" not in kelvin_client_session(s_a_config, "kelvin").kwargs
+    s_a_config.plugin_configs["kelvin"]["rate_limit"] = {"requests_per_second": 10}
+    transport = kelvin_client_session(s_a_config, "kelvin").kwargs["transport"]
+    assert isinstance(transport, RateLimitedTransport)
+
+    transport.transport = httpx.MockTransport(
+        lambda request: httpx.Response(429, headers={"Retry-After": "30"})
+    )
+    async with httpx.AsyncClient(transport=transport) as client:
+        response = await client.get(s_a_config.url)
+    assert response.status_code == 429
+    assert transport.rate_limiter.rate == 5
+    assert transport.rate_limiter.in_flight == 0
+    assert transport.rate_limiter.wait_time() > 29
@@ -42,6 +42,7 @@ def test_schedule_school(temp_dir_func, ldap_access_mock):
     fake_group_object = ldap_access_mock._group
     fake_user_object = ldap_access_mock._user
     appcenter_listener_path = temp_dir_func()
+    priority_marker_dir = temp_dir_func()
 
     module_name = "schedule_school"
     path = Path(__file__).parent.parent.parent / module_name
@@ -58,12 +59,15 @@ def test_schedule_school(temp_dir_func, ldap_access_mock):
         appcenter_listener_path,
     ), patch(
         "ucsschool_id_connector.school_scheduler.LDAPAccess", ldap_access_mock
+    ), patch(
+        "ucsschool_id_connector.utils.PRIORITY_MARKER_DIR", priority_marker_dir
     ):
         spec.loader.exec_module(module)
         schedule = getattr(module, "schedule")
         runner = CliRunner()
         result = runner.invoke(schedule, ["TESTSCHOOL", "3"])
     assert result.exit_code == 0
+    assert not list(priority_marker_dir.iterdir())
 
     print("Fake APPCENTER_LISTENER_PATH contents:")
     found_user = False
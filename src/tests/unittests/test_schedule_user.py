@@ -37,10 +37,13 @@ from unittest.mock import patch
 
 from click.testing import CliRunner
 
+from ucsschool_id_connector.constants import PRIORITY_HIGH
+
 
 def test_schedule_user(temp_dir_func, ldap_access_mock):
     fake_user_object = ldap_access_mock._user
     appcenter_listener_path = temp_dir_func()
+    priority_marker_dir = temp_dir_func()
 
     module_name = "schedule_user"
     path = Path(__file__).parent.parent.parent / module_name
@@ -52,12 +55,14 @@ def test_schedule_user(temp_dir_func, ldap_access_mock):
     with patch("ucsschool_id_connector.user_scheduler.LDAPAccess", ldap_access_mock), patch(
         "ucsschool_id_connector.user_scheduler.APPCENTER_LISTENER_PATH",
         appcenter_listener_path,
-    ):
+    ), patch("ucsschool_id_connector.utils.PRIORITY_MARKER_DIR", priority_marker_dir):
         spec.loader.exec_module(module)
         schedule = getattr(module, "schedule")
         runner = CliRunner()
         result = runner.invoke(schedule, [fake_user_object.username])
     assert result.exit_code == 0
+    marker = priority_marker_dir / fake_user_object.attributes["entryUUID"][0]
+    assert marker.read_text() == str(PRIORITY_HIGH)
 
     print("Fake APPCENTER_LISTENER_PATH contents:")
     with cast(Iterator[os.DirEntry], os.scandir(appcenter_listener_path)) as dir_entries:
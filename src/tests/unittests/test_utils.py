@@ -295,3 +295,18 @@ def test_get_version():
     else:
         raise RuntimeError(f"Could not find 'pyproject.toml' in {src_path!s} or {app_path!s}.")
     assert version_from_file == get_app_version_result
+
+
+def test_get_ucrv_bool_and_int_per_queue(temp_file_func):
+    ucr_file = temp_file_func()
+    key = fake.pystr()
+    with open(ucr_file, "w") as fp:
+        fp.write(f"{key}: yes\n{key}/queue1: false\n{key}_int: 3\n{key}_int/queue1: 7\n")
+    with patch("ucsschool_id_connector.utils.UCR_DB_FILE", ucr_file):
+        assert ucsschool_id_connector.utils.get_ucrv_bool(key, False) is True
+        assert ucsschool_id_connector.utils.get_ucrv_bool(key, True, queue_name="queue1") is False
+        assert ucsschool_id_connector.utils.get_ucrv_bool(key, False, queue_name="queue2") is True
+        assert ucsschool_id_connector.utils.get_ucrv_bool(fake.pystr(), True) is True
+        assert ucsschool_id_connector.utils.get_ucrv_int(f"{key}_int", 1) == 3
+        assert ucsschool_id_connector.utils.get_ucrv_int(f"{key}_int", 1, queue_name="queue1") == 7
+        assert ucsschool_id_connector.utils.get_ucrv_int(key, 1) == 1
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+Circuit breaker guarding the communication with a school authority.
+
+While the breaker is *closed* requests are sent. A communication error opens
+it: no requests are sent until a backoff time passed. Then the breaker is
+*half-open* and a single health check (probe) decides whether it closes again
+or reopens with a doubled backoff time.
+"""
+
+import logging
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, min_wait: float, max_wait: float, logger: logging.Logger) -> None:
+        """
+        :param str name: name of the guarded resource, used in log messages
+        :param float min_wait: seconds to wait after the first failure
+        :param float max_wait: upper limit for the seconds to wait
+        :param logging.Logger logger: logger for state changes
+        """
+        self.name = name
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.logger = logger
+        self.failures = 0
+        self._opened_at = 0.0
+        # state unknown after start, probe before the first request
+        self._state = HALF_OPEN
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self.retry_in() == 0:
+            self._state = HALF_OPEN
+        return self._state
+
+    @property
+    def backoff(self) -> float:
+        """Seconds to stay open after the last failure."""
+        if not self.failures:
+            return 0.0
+        return min(self.max_wait, self.min_wait * 2 ** (self.failures - 1))
+
+    def retry_in(self) -> float:
+        """Seconds until the next probe may be sent (0 if not open)."""
+        if self._state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.backoff - time.monotonic())
+
+    def probe_due(self) -> bool:
+        """Whether a health check has to succeed before sending requests."""
+        return self.state != CLOSED
+
+    def record_success(self) -> None:
+        if self._state != CLOSED:
+            self.logger.info("Connection to %r is OK, closing circuit breaker.", self.name)
+        self._state = CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.logger.warning(
+            "Connection to %r failed (%d time(s) in a row), retrying in %.0f seconds.",
+            self.name,
+            self.failures,
+            self.backoff,
+        )
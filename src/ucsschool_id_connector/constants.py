@@ -42,6 +42,7 @@ IN_QUEUE_DIR = Path(APP_DATA_BASE_PATH, "listener")
 OLD_DATA_DB_PATH = Path(APP_DATA_BASE_PATH, "old_data_db")
 OUT_QUEUE_TOP_DIR = Path(APP_DATA_BASE_PATH, "out_queues")
 OUT_QUEUE_TRASH_DIR = Path(APP_DATA_BASE_PATH, "out_queues_trash")
+PRIORITY_MARKER_DIR = Path(APP_DATA_BASE_PATH, "priority")
 SCHOOL_AUTHORITIES_CONFIG_PATH = Path(APP_CONFIG_BASE_PATH, "school_authorities")
 SCHOOLS_TO_AUTHORITIES_MAPPING_PATH = Path(APP_CONFIG_BASE_PATH, "schools_authorities_mapping.json")
 AUTO_CHECK_INTERVAL = 60
@@ -64,9 +65,57 @@ TOKEN_URL = f"/{APP_ID}/api/token"
 UCRV_LOG_LEVEL = (f"{APP_ID}/log_level", "INFO")
 UCRV_SOURCE_UID = (f"{APP_ID}/source_uid", "TESTID")
 UCRV_TOKEN_TTL = (f"{APP_ID}/access_tokel_ttl", 60)
+UCRV_IN_QUEUE_DEBOUNCE = (f"{APP_ID}/in_queue_debounce", 100)  # ms
+UCRV_OUT_QUEUE_DEBOUNCE = (f"{APP_ID}/out_queue_debounce", 100)  # ms
+UCRV_OUT_QUEUE_BACKEND = (f"{APP_ID}/out_queue_backend", "directory")
+UCRV_OUT_QUEUE_COALESCE = (f"{APP_ID}/out_queue_coalesce", False)
+UCRV_OUT_QUEUE_WORKERS = (f"{APP_ID}/out_queue_workers", 1)
+UCRV_OUT_QUEUE_MAX_ATTEMPTS = (f"{APP_ID}/out_queue_max_attempts", 10)
+UCRV_OUT_QUEUE_RETRY_WAIT = (f"{APP_ID}/out_queue_retry_wait", 10)  # s
+UCRV_OUT_QUEUE_HIGH_WATERMARK = (f"{APP_ID}/out_queue_high_watermark", 50000)
+UCRV_OUT_QUEUE_LOW_WATERMARK = (f"{APP_ID}/out_queue_low_watermark", 25000)
+UCRV_IN_QUEUE_PREPROCESS_CONCURRENCY = (f"{APP_ID}/in_queue_preprocess_concurrency", 4)
+UCRV_FSYNC_WINDOW = (f"{APP_ID}/fsync_window", 5)  # ms
+UCRV_QUEUE_TRASH_COMPRESS_AFTER = (f"{APP_ID}/queue_trash_compress_after", 1)  # days
+UCRV_QUEUE_TRASH_RETENTION = (f"{APP_ID}/queue_trash_retention", 30)  # days
+UCRV_QUEUE_TRASH_MAX_SIZE = (f"{APP_ID}/queue_trash_max_size", 1024)  # MiB
+UCRV_QUEUE_KEEP_RETENTION = (f"{APP_ID}/queue_keep_retention", 90)  # days
+UCRV_OLD_DATA_CACHE_SIZE = (f"{APP_ID}/old_data_cache_size", 10000)
+UCRV_OLD_DATA_CACHE_TTL = (f"{APP_ID}/old_data_cache_ttl", 300)  # s
+UCRV_OLD_DATA_VACUUM_INTERVAL = (f"{APP_ID}/old_data_vacuum_interval", 7)  # days
+UCRV_LDAP_POOL_SIZE = (f"{APP_ID}/ldap_pool_size", 4)
 ADMIN_GROUP_NAME = f"{APP_ID}-admins"
 API_SCHOOL_CACHE_TTL = 600
 API_COMMUNICATION_ERROR_WAIT = 600
+API_COMMUNICATION_ERROR_MIN_WAIT = 5
+RATE_LIMIT_MIN_REQUESTS_PER_SECOND = 0.1
+IN_QUEUE_POLL_INTERVAL = 1.0
+IN_QUEUE_READY_BATCH_SIZE = 1000  # preprocessed files whose data is stored before they are marked ready
+OUT_QUEUE_POLL_INTERVAL = 5.0
+OUT_QUEUE_RETRY_MAX_WAIT = 3600
+OUT_QUEUE_SETTINGS_TTL = 10.0  # s, app settings of an out queue are read again that often
+OUT_QUEUE_BATCH_SIZE = 100
+QUEUE_SCAN_BATCH_SIZE = 1000  # files listed per directory scan, items per out queue pass
+OUT_QUEUE_PRIORITY_WEIGHT = 4  # high priority batches handled in a row, before a normal one
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 1
+PRIORITY_BY_NAME = {"normal": PRIORITY_NORMAL, "high": PRIORITY_HIGH}
+PRIORITY_MARKER_TTL = 3600
+LISTENER_OBJECT_CACHE_SIZE = 1000
+DEAD_LETTER_INFO_SUFFIX = ".error"
+TMP_FILE_MAX_AGE = 3600  # temporary files older than this are left over from a crash
+MAINTENANCE_POLL_INTERVAL = 60.0
+MAINTENANCE_RETENTION_INTERVAL = 3600.0
+MAINTENANCE_BATCH_SIZE = 500  # files handled per step of a maintenance job
+MAINTENANCE_OLD_DATA_INTERVAL = 3600.0
+MAINTENANCE_CULL_BATCH_SIZE = 100  # expired entries deleted per transaction, keeps the DB lock short
+MAINTENANCE_CULL_TIME_BUDGET = 10.0  # s per run
+KEY_VALUE_DB_BATCH_SIZE = 1000  # values written per transaction
+KEY_VALUE_DB_CHANGE_CHECK_INTERVAL = 1.0  # s, memory cache is checked for changes by others that often
+LDAP_PAGE_SIZE = 1000  # results per page of paged LDAP searches
+LDAP_POOL_CHECK_IDLE = 60.0  # s, pooled LDAP connections idle longer are checked before use
+LDAP_MAX_THREADS = 4  # concurrent LDAP queries of a process
+OLD_DATA_REBUILD_PROGRESS_INTERVAL = 5.0  # s between progress messages
 SOURCE_UID = "TESTID"
 MACHINE_PASSWORD_FILE = "/etc/machine.secret"  # nosec
 HTTP_CLIENT_TIMEOUT = 60
@@ -28,40 +28,221 @@
 # <http://www.gnu.org/licenses/>.
 
 import abc
+import re
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Generic, Type, TypeVar, Union, cast
+from typing import (
+    Any,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+)
 
 from diskcache import Cache
+from diskcache.core import DBNAME, MODE_PICKLE
+from ujson import dumps as ujson_dumps, loads as ujson_loads
 
+from .constants import KEY_VALUE_DB_BATCH_SIZE, KEY_VALUE_DB_CHANGE_CHECK_INTERVAL
 from .models import ListenerOldDataEntry
 
 NativeType = TypeVar("NativeType")
 StorageType = TypeVar("StorageType")
 ListenerOldDataEntryType = TypeVar("ListenerOldDataEntryType", bound=ListenerOldDataEntry)
+_MISSING = object()
+OLD_DATA_FORMAT_VERSION = 1
+# first RDN and parent of a DN with escaped characters in the first RDN
+_DN_RDN_AND_PARENT = re.compile(r"((?:[^\\,]|\\.)*),(.*)", re.DOTALL)
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    size: int
+    max_size: int
+
+
+def _split_dn(dn: str) -> Tuple[str, Optional[str]]:
+    """:return: tuple `(first RDN, parent DN)`, parent DN is `None` if `dn` has only one RDN"""
+    rdn, sep, parent = dn.partition(",")
+    if "\\" in rdn:
+        match = _DN_RDN_AND_PARENT.fullmatch(dn)
+        return (match.group(1), match.group(2)) if match else (dn, None)
+    return (rdn, parent) if sep else (dn, None)
+
+
+def encode_old_data(data: Dict[str, Any]) -> bytes:
+    """
+    Encode the fields of an old data entry compactly.
+
+    Lists of strings (member DNs, schools) are stored with their first RDN
+    only. Their parent DNs are stored once per entry, in a table. A number in
+    the list switches to another parent DN of the table, so consecutive
+    members of the same container cost just their RDN. The first byte is the
+    format version.
+    """
+    parents: Dict[Optional[str], int] = {None: 0}
+    fields: Dict[str, Any] = {}
+    lists: Dict[str, List[Union[int, str]]] = {}
+    for name, value in data.items():
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            fields[name] = value
+            continue
+        items: List[Union[int, str]] = []
+        current = 0
+        for item in value:
+            rdn, parent = _split_dn(item)
+            index = parents.setdefault(parent, len(parents))
+            if index != current:
+                items.append(index)
+                current = index
+            items.append(rdn)
+        lists[name] = items
+    payload = ujson_dumps({"f": fields, "l": lists, "p": list(parents)}, ensure_ascii=False)
+    return bytes((OLD_DATA_FORMAT_VERSION,)) + payload.encode()
+
+
+def decode_old_data(value: bytes) -> Dict[str, Any]:
+    """Decode the fields of an old data entry encoded by :py:func:`encode_old_data`."""
+    if not value or value[0] != OLD_DATA_FORMAT_VERSION:
+        raise ValueError(f"Unknown format of old data entry: {value[:1]!r}.")
+    payload = ujson_loads(value[1:])
+    data = payload["f"]
+    parents = payload["p"]
+    for name, items in payload["l"].items():
+        values = []
+        parent = None
+        for item in items:
+            if isinstance(item, int):
+                parent = parents[item]
+            else:
+                values.append(item if parent is None else f"{item},{parent}")
+        data[name] = values
+    return data
 
 
 class KeyValueDB(Generic[NativeType, StorageType], abc.ABC):
-    """Interface for concrete DB backend."""
+    """
+    Interface for concrete DB backend.
+
+    With a `cache_size`, recently used values are kept in memory (least
+    recently used are dropped first), so reading them again skips the DB.
+    Writes go to the DB and the memory cache. When other connections (other
+    instances or processes) changed the DB, the memory cache is dropped. That
+    is checked when a transaction begins and at most every
+    `KEY_VALUE_DB_CHANGE_CHECK_INTERVAL` seconds.
+    Values are taken from the DB again after `cache_ttl` seconds anyway.
+    Cached values are shared between readers and must not be modified in
+    place.
+
+    Inside a :py:meth:`transaction`, written values are collected and
+    committed to the DB together, in one SQLite transaction.
+    """
 
     _native_type: NativeType
     _storage_type: StorageType
 
-    def __init__(self, datebase_dir: Path):
+    def __init__(self, datebase_dir: Path, cache_size: int = 0, cache_ttl: float = 0):
+        """
+        :param Path datebase_dir: directory of the DB
+        :param int cache_size: number of values to keep in memory, `0` to
+            disable the cache
+        :param float cache_ttl: seconds a value is served from memory, `0` for
+            no limit
+        """
         if not datebase_dir.exists():
             datebase_dir.mkdir(mode=0o750, parents=True)
         self._cache = Cache(str(datebase_dir))
+        self.cache_size = max(0, cache_size)
+        self.cache_ttl = cache_ttl
+        # key -> (time of caching, value), least recently used first
+        self._lru: "OrderedDict[Any, Tuple[float, NativeType]]" = OrderedDict()
+        self._data_version = None
+        self._data_version_checked = 0.0
+        # key -> storage value, written on commit, `None` if no transaction is open
+        self._pending: Optional[Dict[Any, StorageType]] = None
+        self._transaction_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
 
     def __contains__(self, key: Any) -> bool:
+        if self._pending and key in self._pending:
+            return True
+        if self._cached(key) is not _MISSING:
+            return True
         return self._cache.__contains__(key)
 
     def __delitem__(self, key: Any) -> bool:
+        self._write_pending(key)
+        self._lru.pop(key, None)
         return self._cache.__delitem__(key)
 
     def __getitem__(self, key: Any) -> NativeType:
-        return self._storage_to_native_type(self._cache.__getitem__(key))
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
 
     def __setitem__(self, key: Any, value: NativeType) -> None:
-        return self._cache.__setitem__(key, self._native_to_storage_type(value))
+        self.set(key, value)
+
+    def _cached(self, key: Any) -> Union[Any, NativeType]:
+        """Value of `key` from the memory cache, `_MISSING` if not cached."""
+        if not self.cache_size:
+            return _MISSING
+        self._drop_changed()
+        try:
+            cached, value = self._lru[key]
+        except KeyError:
+            self.cache_misses += 1
+            return _MISSING
+        if self.cache_ttl and time.monotonic() - cached > self.cache_ttl:
+            del self._lru[key]
+            self.cache_misses += 1
+            return _MISSING
+        self._lru.move_to_end(key)
+        self.cache_hits += 1
+        return value
+
+    def _drop_changed(self, force: bool = False) -> None:
+        """
+        Empty the memory cache, if other connections committed changes to the
+        DB. Unless `force` is set, the DB is asked only if the last check is
+        older than `KEY_VALUE_DB_CHANGE_CHECK_INTERVAL`.
+        """
+        now = time.monotonic()
+        if not force and now - self._data_version_checked < KEY_VALUE_DB_CHANGE_CHECK_INTERVAL:
+            return
+        self._data_version_checked = now
+        # changes only if *other* connections committed, not with our own writes
+        # (uses the connection of diskcache, see test_db.test_diskcache_internals)
+        data_version = self._cache._con.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            self._lru.clear()
+            self._data_version = data_version
+
+    def _cache_value(self, key: Any, value: NativeType) -> None:
+        if not self.cache_size:
+            return
+        self._drop_changed()
+        self._lru[key] = (time.monotonic(), value)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.cache_size:
+            self._lru.popitem(last=False)
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.cache_hits, self.cache_misses, len(self._lru), self.cache_size)
 
     def _native_to_storage_type(self, value: NativeType) -> StorageType:
         if self._native_type is self._storage_type or self._storage_type is None:
@@ -76,34 +257,233 @@ class KeyValueDB(Generic[NativeType, StorageType], abc.ABC):
             return self._native_type(value)
 
     def close(self, *args, **kwargs) -> None:
+        if self._pending is not None:
+            self._transaction_depth = 0
+            self.commit()
+        self._lru.clear()
         return self._cache.close()
 
     def get(self, key: Any, default: Any = None, *args, **kwargs) -> Union[Any, NativeType]:
-        value = self._cache.get(key, default, *args, **kwargs)
-        if value is default:
+        if args or kwargs:
+            self._write_pending(key)
+        else:
+            value = self._cached(key)
+            if value is not _MISSING:
+                return value
+            if self._pending and key in self._pending:
+                return self._storage_to_native_type(self._pending[key])
+        value = self._cache.get(key, _MISSING, *args, **kwargs)
+        if value is _MISSING:
             return default
         else:
-            return self._storage_to_native_type(value)
+            value = self._storage_to_native_type(value)
+            if not args and not kwargs:
+                self._cache_value(key, value)
+            return value
+
+    def get_many(self, keys: Iterable[Any]) -> Dict[Any, NativeType]:
+        """
+        Get the values of `keys`, reading them from the DB in one transaction.
+
+        :return: dict with the values of the existing keys
+        :rtype: dict
+        """
+        res: Dict[Any, NativeType] = {}
+        missing = []
+        for key in keys:
+            value = (
+                self.get(key, _MISSING) if self._pending and key in self._pending else self._cached(key)
+            )
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                res[key] = value
+        if missing:
+            with self._cache.transact():
+                values = [(key, self._cache.get(key, _MISSING)) for key in missing]
+            for key, value in values:
+                if value is not _MISSING:
+                    res[key] = self._storage_to_native_type(value)
+                    self._cache_value(key, res[key])
+        return res
 
     def set(self, key: Any, value: NativeType, *args, **kwargs) -> bool:
-        return self._cache.set(key, self._native_to_storage_type(value), *args, **kwargs)
+        if args or kwargs:
+            # expiring or tagged values are written right away and always read from the DB
+            self._write_pending(key)
+            self._lru.pop(key, None)
+            return self._cache.set(key, self._native_to_storage_type(value), *args, **kwargs)
+        self.set_many({key: value})
+        return True
+
+    def set_many(self, items: Mapping[Any, NativeType]) -> None:
+        """Set the values of the keys in `items`, writing them to the DB in one transaction."""
+        stored = {key: self._native_to_storage_type(value) for key, value in items.items()}
+        if self._pending is None:
+            self._write_many(stored)
+        else:
+            self._pending.update(stored)
+            if len(self._pending) >= KEY_VALUE_DB_BATCH_SIZE:
+                self._write_many(self._pending)
+                self._pending = {}
+        for key, value in items.items():
+            self._cache_value(key, value)
+
+    def _write_many(self, items: Dict[Any, StorageType]) -> None:
+        if not items:
+            return
+        with self._cache.transact():
+            for key, value in items.items():
+                self._cache.set(key, value)
+
+    def _write_pending(self, key: Any) -> None:
+        """Commit the pending value of `key` now, e.g. before it is deleted."""
+        if self._pending and key in self._pending:
+            self._cache.set(key, self._pending.pop(key))
+
+    def begin(self) -> None:
+        """
+        Start collecting written values, until :py:meth:`commit` is called.
+        Calls can be nested, the values are written with the outermost commit.
+        """
+        self._transaction_depth += 1
+        if self._pending is None:
+            self._pending = {}
+            if self.cache_size:
+                self._drop_changed(force=True)
+
+    def commit(self) -> None:
+        """Write the values collected since :py:meth:`begin` to the DB."""
+        self._transaction_depth = max(0, self._transaction_depth - 1)
+        if self._transaction_depth or self._pending is None:
+            return
+        pending, self._pending = self._pending, None
+        self._write_many(pending)
+
+    @contextmanager
+    def transaction(self) -> Iterator["KeyValueDB"]:
+        """
+        Context manager collecting the written values and committing them to
+        the DB in one transaction when leaving it. The values are committed
+        even if the block raises an exception, as they belong to changes that
+        were already handled.
+        """
+        self.begin()
+        try:
+            yield self
+        finally:
+            self.commit()
+
+    def touch(self, key: Any, *args, **kwargs) -> bool:
+        self._write_pending(key)
+        self._lru.pop(key, None)
+        return self._cache.touch(key, *args, **kwargs)
 
-    def touch(self, *args, **kwargs) -> bool:
-        return self._cache.touch(*args, **kwargs)
+    def cull(self, limit: int = KEY_VALUE_DB_BATCH_SIZE) -> int:
+        """
+        Delete up to `limit` expired entries, in one transaction.
+
+        :return: number of deleted entries
+        """
+        # Cache.expire() has no limit, so the table is read directly (see
+        # test_db.test_diskcache_cull_internals)
+        filenames = []
+        with self._cache.transact():
+            rows = self._cache._sql(
+                "SELECT rowid, key, raw, filename FROM Cache"
+                " WHERE expire_time IS NOT NULL AND expire_time < ? ORDER BY expire_time LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+            for rowid, db_key, raw, filename in rows:
+                self._cache._sql("DELETE FROM Cache WHERE rowid = ?", (rowid,))
+                self._lru.pop(self._cache._disk.get(db_key, raw), None)
+                if filename:
+                    filenames.append(filename)
+        for filename in filenames:
+            self._cache._disk.remove(filename)
+        return len(rows)
+
+    def vacuum(self) -> None:
+        """
+        Rebuild the DB file without unused space and truncate its write-ahead
+        log. Other connections can't write until it is finished.
+        """
+        self._cache._sql("VACUUM")
+        self._cache._sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def size(self) -> int:
+        """:return: bytes used by the DB file, its write-ahead log and the files of large values"""
+        wal_path = Path(self._cache.directory, f"{DBNAME}-wal")
+        try:
+            wal_size = wal_path.stat().st_size
+        except FileNotFoundError:
+            wal_size = 0
+        return self._cache.volume() + wal_size
+
+    def __len__(self) -> int:
+        """:return: number of entries, including expired ones that were not culled yet"""
+        return len(self._cache)
 
 
 class OldDataDB(KeyValueDB):
-    """Wrapper of KeyValueDB typed to a specific ListenerOldDataEntryType subclass"""
+    """
+    Wrapper of KeyValueDB typed to a specific ListenerOldDataEntryType subclass
+
+    Entries are stored encoded by :py:func:`encode_old_data`. Entries of
+    previous versions (pickled dicts) are still read and can be converted with
+    :py:meth:`migrate`.
+    """
 
     _native_type = ListenerOldDataEntryType
-    _storage_type = dict
+    _storage_type = bytes
 
-    def __init__(self, datebase_dir: Path, data_type: Type[ListenerOldDataEntryType]):
-        super().__init__(datebase_dir)
+    def __init__(
+        self,
+        datebase_dir: Path,
+        data_type: Type[ListenerOldDataEntryType],
+        cache_size: int = 0,
+        cache_ttl: float = 0,
+    ):
+        super().__init__(datebase_dir, cache_size, cache_ttl)
         self._native_type = data_type
+        self._migrated_rowid = 0
+
+    def _native_to_storage_type(self, value: ListenerOldDataEntryType) -> bytes:
+        return encode_old_data(value.dict())
+
+    def _storage_to_native_type(self, value: Union[bytes, dict]) -> ListenerOldDataEntryType:
+        if isinstance(value, dict):
+            return self._native_type(**value)
+        # the data was validated when it was stored
+        return self._native_type.construct(**decode_old_data(value))
+
+    def migrate(self, limit: int = KEY_VALUE_DB_BATCH_SIZE) -> Tuple[int, bool]:
+        """
+        Convert up to `limit` entries stored in the previous format (pickled
+        dicts) to the current format, in one transaction. The expiration time
+        of the entries is kept. The conversion does not depend on the type of
+        the entries, so it converts the entries of all types in the DB.
 
-    def _native_to_storage_type(self, value: ListenerOldDataEntryType) -> dict:
-        return value.dict()
+        Call it repeatedly until it returns `more=False`.
 
-    def _storage_to_native_type(self, value: dict) -> ListenerOldDataEntryType:
-        return self._native_type(**value)
+        :return: tuple `(converted, more)`, `more` is `True` if there may be
+            more entries to convert
+        """
+        migrated = 0
+        with self._cache.transact():
+            rows = self._cache._sql(
+                "SELECT rowid, key, raw FROM Cache WHERE mode = ? AND rowid > ? ORDER BY rowid LIMIT ?",
+                (MODE_PICKLE, self._migrated_rowid, limit),
+            ).fetchall()
+            for rowid, db_key, raw in rows:
+                self._migrated_rowid = rowid
+                key = self._cache._disk.get(db_key, raw)
+                value, expire_time = self._cache.get(key, expire_time=True)
+                if not isinstance(value, dict):
+                    # expired (removed by the next cull) or not an old data entry
+                    continue
+                expire = None if expire_time is None else max(expire_time - time.time(), 1)
+                self._cache.set(key, encode_old_data(value), expire=expire)
+                self._lru.pop(key, None)
+                migrated += 1
+        return migrated, len(rows) == limit
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+Crash-safe writing of listener and queue files.
+
+Files are written to a temporary file next to the target, which is then
+renamed over it. Readers (and the queues after a crash) see either the old or
+the new content, but never a truncated file.
+
+Syncing every file with its own `fsync()` would limit the throughput to the
+number of disk flushes per second. A :py:class:`GroupCommit` collects the
+files and directories instead, and syncs them together once per
+`fsync_window` milliseconds (app setting), in a thread. All writers of a
+window share the same flush, and each directory is synced once per flush.
+"""
+
+import asyncio
+import itertools
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Set
+
+import aiofiles
+
+from .constants import UCRV_FSYNC_WINDOW
+from .utils import get_ucrv_int
+
+TMP_FILE_SUFFIX = ".tmp"
+
+
+def tmp_path_of(path: Path) -> Path:
+    """Path of the temporary file used to write `path`."""
+    return path.with_name(f".{path.name}{TMP_FILE_SUFFIX}")
+
+
+def is_tmp_file(name: str) -> bool:
+    return name.startswith(".") and name.endswith(TMP_FILE_SUFFIX)
+
+
+def fsync_paths(files: Iterable[str], dirs: Iterable[str]) -> None:
+    """
+    Sync the content of `files` and the entries of `dirs` to disk. Paths that
+    don't exist anymore (e.g. files already handled, or deleted queues) are
+    skipped.
+    """
+    for path, flags in itertools.chain(
+        ((path, os.O_RDONLY) for path in files),
+        ((path, os.O_RDONLY | os.O_DIRECTORY) for path in dirs),
+    ):
+        try:
+            fd = os.open(path, flags)
+        except FileNotFoundError:
+            continue
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class GroupCommit:
+    """
+    Batches the `fsync()` calls of concurrent writers.
+
+    Files and directories are registered with :py:meth:`add`. The first
+    registration after a flush starts a timer, when it expires (after
+    :py:attr:`window` seconds) everything registered until then is synced in
+    one go. :py:meth:`sync` waits for that.
+    """
+
+    def __init__(self, window: float = None) -> None:
+        """
+        :param float window: seconds to collect files before syncing them,
+            read from the app setting `fsync_window` if `None`
+        """
+        self._window = window
+        self._files: Set[str] = set()
+        self._dirs: Set[str] = set()
+        self._pending_since: Optional[float] = None
+        self._batch: Optional[asyncio.Future] = None
+        # flushes scheduled or running
+        self._tasks: Set[asyncio.Task] = set()
+        self.flushes = 0
+
+    @property
+    def window(self) -> float:
+        if self._window is not None:
+            return self._window
+        return max(0, get_ucrv_int(*UCRV_FSYNC_WINDOW)) / 1000
+
+    def __len__(self) -> int:
+        return len(self._files) + len(self._dirs)
+
+    def add(self, path: Path, data: bool = True) -> None:
+        """
+        Register the file `path` to be synced with the next flush.
+
+        :param bool data: whether the content of `path` must be synced, or only
+            the entry in its directory (e.g. after a rename)
+        """
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+        if data:
+            self._files.add(str(path))
+        self._dirs.add(str(path.parent))
+
+    def due(self) -> bool:
+        """Whether registered files have been waiting for a whole window."""
+        return self._pending_since is not None and time.monotonic() - self._pending_since >= self.window
+
+    async def sync(self, path: Path = None) -> None:
+        """
+        Wait until `path` and all files registered before are synced to disk.
+
+        :raises OSError: if syncing failed
+        """
+        if path:
+            self.add(path)
+        if self._pending_since is None:
+            return
+        loop = asyncio.get_running_loop()
+        if self._batch is None or self._batch.get_loop() is not loop:
+            self._batch = loop.create_future()
+            task = loop.create_task(self._flush_later(self._batch, set(self._tasks)))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        await asyncio.shield(self._batch)
+
+    async def _flush_later(self, batch: asyncio.Future, running: Set[asyncio.Task]) -> None:
+        # Only one flush runs at a time. Files registered meanwhile are
+        # collected for the next one, so they are batched even if the window
+        # is shorter than a flush takes.
+        if running:
+            await asyncio.wait(running)
+        wait = self.window - (time.monotonic() - (self._pending_since or time.monotonic()))
+        if wait > 0:
+            await asyncio.sleep(wait)
+        files, dirs = self._take()
+        if self._batch is batch:
+            self._batch = None
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, fsync_paths, files, dirs)
+        except OSError as exc:
+            batch.set_exception(exc)
+            # retrieved by the waiters, if any
+            batch.exception()
+        else:
+            batch.set_result(None)
+
+    def flush(self) -> None:
+        """Sync all registered files right now, blocking."""
+        fsync_paths(*self._take())
+
+    def _take(self):
+        files, dirs = self._files, self._dirs
+        self._files, self._dirs = set(), set()
+        self._pending_since = None
+        self.flushes += 1
+        return files, dirs
+
+
+_group_commit: Optional[GroupCommit] = None
+
+
+def get_group_commit() -> GroupCommit:
+    """The :py:class:`GroupCommit` shared by all queues and plugins of the process."""
+    global _group_commit
+    if _group_commit is None:
+        _group_commit = GroupCommit()
+    return _group_commit
+
+
+def write_file_atomic(path: Path, data: str) -> None:
+    """Replace the content of `path` with `data` atomically."""
+    tmp_path = tmp_path_of(path)
+    try:
+        tmp_path.write_text(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+async def write_file_atomic_async(path: Path, data: str, group_commit: GroupCommit = None) -> None:
+    """
+    Replace the content of `path` with `data` atomically.
+
+    If `group_commit` is set, `data` is synced to disk (with the other files
+    of the current window) before it replaces the old content, and the rename
+    is synced with the next flush.
+    """
+    tmp_path = tmp_path_of(path)
+    try:
+        async with aiofiles.open(tmp_path, "w") as fp:
+            await fp.write(data)
+        if group_commit is not None:
+            await group_commit.sync(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    if group_commit is not None:
+        group_commit.add(path, data=False)
+
+
+def copy_file_atomic(source: Path, target: Path) -> None:
+    """Copy `source` (with its metadata) to `target` atomically."""
+    tmp_path = tmp_path_of(target)
+    try:
+        shutil.copy2(str(source), str(tmp_path))
+        os.replace(tmp_path, target)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
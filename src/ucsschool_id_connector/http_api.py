@@ -65,6 +65,9 @@ from .constants import (
 from .ldap_access import LDAPAccess
 from .models import (
     AllQueues,
+    DeadLetter,
+    DeadLetterReplay,
+    MaintenanceModel,
     QueueModel,
     RPCCommand,
     RPCRequest,
@@ -137,6 +140,56 @@ async def read_queue(
     return QueueModel(**res["result"])
 
 
+@router.get("/queues/{name}/dead_letters", response_model=List[DeadLetter], tags=["queues"])
+async def read_dead_letters(
+    name: str,
+    current_user: User = Depends(get_current_active_user),
+    logger: logging.Logger = Depends(get_logger),
+) -> List[DeadLetter]:
+    res = await query_service(cmd="get_dead_letters", name=name)
+    if res.get("errors"):
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail=res["errors"])
+    return [DeadLetter(**r) for r in res["result"]]
+
+
+@router.get("/queues/{name}/dead_letters/{item}", response_model=DeadLetter, tags=["queues"])
+async def read_dead_letter(
+    name: str,
+    item: str,
+    current_user: User = Depends(get_current_active_user),
+    logger: logging.Logger = Depends(get_logger),
+) -> DeadLetter:
+    res = await query_service(cmd="get_dead_letters", name=name, items=[item])
+    if res.get("errors"):
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail=res["errors"])
+    return DeadLetter(**res["result"][0])
+
+
+@router.post("/queues/{name}/dead_letters/replay", response_model=List[str], tags=["queues"])
+async def replay_dead_letters(
+    name: str,
+    replay: DeadLetterReplay,
+    current_user: User = Depends(get_current_active_user),
+    logger: logging.Logger = Depends(get_logger),
+) -> List[str]:
+    logger.info("User %r replaying dead letters of queue %r...", current_user.username, name)
+    res = await query_service(cmd="replay_dead_letters", name=name, items=replay.items)
+    if res.get("errors"):
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail=res["errors"])
+    return res["result"]
+
+
+@router.get("/maintenance", response_model=MaintenanceModel, tags=["queues"])
+async def read_maintenance(
+    current_user: User = Depends(get_current_active_user),
+    logger: logging.Logger = Depends(get_logger),
+) -> MaintenanceModel:
+    res = await query_service(cmd="get_maintenance")
+    if res.get("errors"):
+        raise HTTPException(status_code=HTTP_500_INTERNAL_SERVER_ERROR, detail=res["errors"])
+    return MaintenanceModel(**res["result"])
+
+
 @router.get("/school_authorities", tags=["school_authorities"])
 async def read_school_authorities(
     current_user: User = Depends(get_current_active_user),
@@ -215,6 +268,7 @@ async def query_service(
         SchoolAuthorityConfiguration, SchoolAuthorityConfigurationPatchDocument
     ] = None,
     school_to_authority_mapping: School2SchoolAuthorityMapping = None,
+    items: List[str] = None,
 ) -> Dict[str, Any]:
     request_kwargs = {"cmd": RPCCommand(cmd)}
     if name is not None:
@@ -223,6 +277,8 @@ async def query_service(
         request_kwargs["school_authority"] = school_authority.dict_secrets_as_str()
     if school_to_authority_mapping is not None:
         request_kwargs["school_to_authority_mapping"] = school_to_authority_mapping.dict()
+    if items is not None:
+        request_kwargs["items"] = items
     request = RPCRequest(**request_kwargs)
     # logger.debug("Querying queue daemon: %r", request.dict())
     socket = zmq_context.socket(zmq.REQ)
@@ -27,22 +27,191 @@
 # /usr/share/common-licenses/AGPL-3; if not, see
 # <http://www.gnu.org/licenses/>.
 
+import asyncio
+import functools
 import os
+import threading
+import time
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
 
 import aiofiles
 import lazy_object_proxy
 from ldap3 import AUTO_BIND_TLS_BEFORE_BIND, SIMPLE, Connection, Entry, Server
-from ldap3.core.exceptions import LDAPBindError, LDAPExceptionError
+from ldap3.core.exceptions import LDAPBindError, LDAPCommunicationError, LDAPExceptionError
 from ldap3.utils.conv import escape_filter_chars
 
-from .constants import ADMIN_GROUP_NAME, LOG_FILE_PATH_HTTP, MACHINE_PASSWORD_FILE
+from .constants import (
+    ADMIN_GROUP_NAME,
+    LDAP_MAX_THREADS,
+    LDAP_PAGE_SIZE,
+    LDAP_POOL_CHECK_IDLE,
+    LOG_FILE_PATH_HTTP,
+    MACHINE_PASSWORD_FILE,
+    UCRV_LDAP_POOL_SIZE,
+)
 from .models import Group, User, UserPasswords
-from .utils import ConsoleAndFileLogging
+from .utils import ConsoleAndFileLogging, get_ucrv_int
 
 MachinePWCache = namedtuple("MachinePWCache", ["mtime", "password"])
+PAGED_RESULTS_CONTROL = "1.2.840.113556.1.4.319"
+T = TypeVar("T")
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=LDAP_MAX_THREADS, thread_name_prefix="ldap")
+        return _executor
+
+
+async def run_in_ldap_thread(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run the blocking ldap3 operations in `func` in a thread, so they don't
+    block the event loop. At most `LDAP_MAX_THREADS` run at the same time,
+    further calls wait for a free thread.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def _unbind(conn: Connection) -> None:
+    try:
+        conn.unbind()
+    except LDAPExceptionError:
+        pass
+
+
+class LDAPConnectionPool:
+    """
+    Bound connections to an LDAP server for one bind DN, reused by the
+    queries instead of connecting, starting TLS and binding every time.
+    Only used for the binds with the machine account of the host.
+
+    A connection is used by one query at a time, so they can be used in
+    threads. If all pooled connections are in use, an additional connection
+    is opened and closed after use, so a query never waits for another. Up
+    to `size` idle connections are kept. Connections that were idle for
+    `LDAP_POOL_CHECK_IDLE` seconds are checked before they are used.
+    """
+
+    def __init__(self, server: Server, bind_dn: str, size: int = None) -> None:
+        self.server = server
+        self.bind_dn = bind_dn
+        self.size = max(0, get_ucrv_int(*UCRV_LDAP_POOL_SIZE) if size is None else size)
+        self.connects = 0
+        # (connection, time of release), most recently used last
+        self._idle: List[Tuple[Connection, float]] = []
+        self._bind_pw: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(host={self.server.host!r}, bind_dn={self.bind_dn!r})"
+
+    def _connect(self, bind_pw: str) -> Connection:
+        self.connects += 1
+        return Connection(
+            self.server,
+            user=self.bind_dn,
+            password=bind_pw,
+            auto_bind=AUTO_BIND_TLS_BEFORE_BIND,
+            authentication=SIMPLE,
+            read_only=True,
+        )
+
+    @staticmethod
+    def healthy(conn: Connection, idle: float) -> bool:
+        if conn.closed or not conn.bound:
+            return False
+        if idle < LDAP_POOL_CHECK_IDLE:
+            return True
+        # the server or a firewall may have closed the connection meanwhile
+        try:
+            return conn.extend.standard.who_am_i() is not None
+        except LDAPExceptionError:
+            return False
+
+    def acquire(self, bind_pw: str) -> Connection:
+        """Get a bound connection, :py:meth:`release` it after use."""
+        while True:
+            stale: List[Tuple[Connection, float]] = []
+            with self._lock:
+                if bind_pw != self._bind_pw:
+                    # password changed, e.g. machine password rotation
+                    stale, self._idle = self._idle, []
+                    self._bind_pw = bind_pw
+                conn, released = self._idle.pop() if self._idle else (None, 0.0)
+            for stale_conn, _ in stale:
+                _unbind(stale_conn)
+            if conn is None:
+                return self._connect(bind_pw)
+            if self.healthy(conn, time.monotonic() - released):
+                return conn
+            _unbind(conn)
+
+    def release(self, conn: Connection) -> None:
+        with self._lock:
+            if len(self._idle) < self.size and conn.bound and conn.password == self._bind_pw:
+                self._idle.append((conn, time.monotonic()))
+                return
+        _unbind(conn)
+
+    @contextmanager
+    def connection(self, bind_pw: str) -> Iterator[Connection]:
+        """
+        Context manager for a bound connection. After a connection error the
+        connection is closed instead of returned to the pool. After other
+        errors (including cancellation) it is returned to the pool.
+        """
+        conn = self.acquire(bind_pw)
+        try:
+            yield conn
+        except LDAPCommunicationError:
+            _unbind(conn)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            _unbind(conn)
+
+
+_connection_pools: Dict[Tuple[str, int, str], LDAPConnectionPool] = {}
+_connection_pools_lock = threading.Lock()
+
+
+def get_connection_pool(server: Server, bind_dn: str) -> LDAPConnectionPool:
+    """
+    Get the connection pool for `bind_dn` on `server`. Pools are shared by
+    all :py:class:`LDAPAccess` instances of the process.
+    """
+    key = (server.host, server.port, bind_dn)
+    with _connection_pools_lock:
+        try:
+            return _connection_pools[key]
+        except KeyError:
+            pool = _connection_pools[key] = LDAPConnectionPool(server, bind_dn)
+            return pool
+
+
+def close_connection_pools() -> None:
+    with _connection_pools_lock:
+        pools = list(_connection_pools.values())
+        _connection_pools.clear()
+    for pool in pools:
+        pool.close()
 
 
 class LDAPAccess:
@@ -120,6 +289,25 @@ class LDAPAccess:
         bind_dn = bind_dn or str(self.host_dn)
         bind_pw = bind_pw or await self.machine_password()
         try:
+            return await run_in_ldap_thread(self._search, filter_s, attributes, base, bind_dn, bind_pw)
+        except LDAPExceptionError as exc:
+            if isinstance(exc, LDAPBindError) and not raise_on_bind_error:
+                return []
+            self.logger.exception(
+                "When connecting to %r with bind_dn %r: %s",
+                self.server.host,
+                bind_dn,
+                exc,
+            )
+            raise
+
+    def _search(
+        self, filter_s: str, attributes: Optional[List[str]], base: str, bind_dn: str, bind_pw: str
+    ) -> List[Entry]:
+        if bind_dn != str(self.host_dn):
+            # Only the machine account binds are pooled. Other accounts, like the
+            # users logging in to the HTTP API, are authenticated by a bind for
+            # every query, and their passwords are not kept.
             with Connection(
                 self.server,
                 user=bind_dn,
@@ -129,9 +317,50 @@ class LDAPAccess:
                 read_only=True,
             ) as conn:
                 conn.search(base, filter_s, attributes=attributes)
+            return conn.entries
+        pool = get_connection_pool(self.server, bind_dn)
+        try:
+            with pool.connection(bind_pw) as conn:
+                conn.search(base, filter_s, attributes=attributes)
+                return conn.entries
+        except LDAPCommunicationError as exc:
+            # the server may have closed a pooled connection, retry once with a new connection
+            self.logger.warning("Connection to %r failed, reconnecting: %s", self.server.host, exc)
+        with pool.connection(bind_pw) as conn:
+            conn.search(base, filter_s, attributes=attributes)
+            return conn.entries
+
+    async def paged_search(
+        self,
+        filter_s: str,
+        attributes: List[str] = None,
+        base: str = None,
+        page_size: int = LDAP_PAGE_SIZE,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Search with the paged results control and yield the results page by
+        page, for result sets too large for :py:meth:`search`.
+
+        The LDAP operations run in an LDAP thread. The next page is read while
+        the caller handles the current one.
+
+        :return: async iterator of lists of ldap3 response dicts, with the
+            keys `dn`, `attributes` and `raw_attributes`
+        """
+        base = base or self.ldap_base
+        bind_dn = str(self.host_dn)
+        bind_pw = await self.machine_password()
+
+        def read_page(cookie: Optional[bytes]):
+            conn.search(base, filter_s, attributes=attributes, paged_size=page_size, paged_cookie=cookie)
+            page = [result for result in conn.response if result["type"] == "searchResEntry"]
+            control = conn.result.get("controls", {}).get(PAGED_RESULTS_CONTROL, {})
+            return page, control.get("value", {}).get("cookie")
+
+        pool = get_connection_pool(self.server, bind_dn)
+        try:
+            conn = await run_in_ldap_thread(pool.acquire, bind_pw)
         except LDAPExceptionError as exc:
-            if isinstance(exc, LDAPBindError) and not raise_on_bind_error:
-                return []
             self.logger.exception(
                 "When connecting to %r with bind_dn %r: %s",
                 self.server.host,
@@ -139,7 +368,33 @@ class LDAPAccess:
                 exc,
             )
             raise
-        return conn.entries
+        next_page = asyncio.ensure_future(run_in_ldap_thread(read_page, None))
+        failed = False
+        try:
+            while next_page:
+                try:
+                    page, cookie = await next_page
+                except LDAPCommunicationError:
+                    failed = True
+                    raise
+                next_page = (
+                    asyncio.ensure_future(run_in_ldap_thread(read_page, cookie)) if cookie else None
+                )
+                yield page
+        finally:
+            if next_page:
+                # the thread can't be interrupted, the connection is used until it finishes
+                await asyncio.wait([next_page])
+                if not next_page.cancelled() and next_page.exception():
+                    # the caller stopped early, nobody else retrieves the error of the prefetched page
+                    failed = failed or isinstance(next_page.exception(), LDAPCommunicationError)
+            if next_page and next_page.cancelled():
+                # the thread may still use the connection, leave it to the garbage collector
+                pass
+            elif failed:
+                _unbind(conn)
+            else:
+                pool.release(conn)
 
     async def get_dn_of_user(self, username: str) -> str:
         filter_s = f"(uid={escape_filter_chars(username)})"
@@ -0,0 +1,478 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+Background maintenance of the queues and databases.
+
+The :py:class:`Maintenance` task of the service runs :py:class:`MaintenanceJob`
+instances periodically. Jobs work in small steps in a thread, so they never
+block the event loop, and report their state for the RPC command
+`get_maintenance`.
+"""
+
+import abc
+import asyncio
+import datetime
+import os
+import tarfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from .constants import (
+    LOG_FILE_PATH_QUEUES,
+    MAINTENANCE_BATCH_SIZE,
+    MAINTENANCE_CULL_BATCH_SIZE,
+    MAINTENANCE_CULL_TIME_BUDGET,
+    MAINTENANCE_OLD_DATA_INTERVAL,
+    MAINTENANCE_POLL_INTERVAL,
+    MAINTENANCE_RETENTION_INTERVAL,
+    OLD_DATA_DB_PATH,
+    UCRV_OLD_DATA_VACUUM_INTERVAL,
+    UCRV_QUEUE_KEEP_RETENTION,
+    UCRV_QUEUE_TRASH_COMPRESS_AFTER,
+    UCRV_QUEUE_TRASH_MAX_SIZE,
+    UCRV_QUEUE_TRASH_RETENTION,
+)
+from .db import OldDataDB
+from .durable_files import is_tmp_file, tmp_path_of
+from .models import ListenerOldDataEntry, MaintenanceModel, OldDataDBStats, RetentionStats
+from .queues import FileQueue, InQueue
+from .utils import ConsoleAndFileLogging, get_ucrv_int
+
+ARCHIVE_SUFFIX = ".tar.xz"
+DAY = 86400
+
+
+class DirectoryEntry(NamedTuple):
+    mtime: float
+    size: int
+    path: Path
+
+    @property
+    def is_archive(self) -> bool:
+        return self.path.name.endswith(ARCHIVE_SUFFIX)
+
+
+def scan_directory(path: Path) -> List[DirectoryEntry]:
+    """Files in `path`, oldest first. Files being written are left out."""
+    entries = []
+    with os.scandir(path) as dir_entries:
+        for dir_entry in dir_entries:
+            if not dir_entry.is_file(follow_symlinks=False) or is_tmp_file(dir_entry.name):
+                continue
+            try:
+                stat = dir_entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append(DirectoryEntry(stat.st_mtime, stat.st_size, Path(dir_entry.path)))
+    entries.sort()
+    return entries
+
+
+def directory_usage(path: Path) -> Tuple[int, int, int]:
+    """
+    :return: number of uncompressed files, number of archives and bytes used
+        in `path`
+    :rtype: tuple(int, int, int)
+    """
+    entries = scan_directory(path)
+    archives = sum(1 for entry in entries if entry.is_archive)
+    return len(entries) - archives, archives, sum(entry.size for entry in entries)
+
+
+def write_archive(path: Path, day: str, members: List[DirectoryEntry]) -> DirectoryEntry:
+    """
+    Move the files `members` into a new archive `<day>.tar.xz` (or
+    `<day>.<n>.tar.xz`, if it exists already) in `path`. The archive gets the
+    modification time of its newest member, so it expires with it.
+    """
+    target = path / f"{day}{ARCHIVE_SUFFIX}"
+    num = 0
+    while target.exists():
+        num += 1
+        target = path / f"{day}.{num}{ARCHIVE_SUFFIX}"
+    tmp_path = tmp_path_of(target)
+    try:
+        with tarfile.open(tmp_path, "w:xz") as tar:
+            for member in members:
+                tar.add(str(member.path), arcname=member.path.name)
+        mtime = max(member.mtime for member in members)
+        os.utime(tmp_path, (mtime, mtime))
+        os.replace(tmp_path, target)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    for member in members:
+        member.path.unlink(missing_ok=True)
+    return DirectoryEntry(mtime, target.stat().st_size, target)
+
+
+def compact_directory(
+    path: Path,
+    compress_before: Optional[float],
+    expire_before: Optional[float],
+    max_size: int,
+    limit: int = MAINTENANCE_BATCH_SIZE,
+) -> Iterator[Tuple[int, int]]:
+    """
+    Apply a retention policy to the files in `path`:
+
+    * files and archives modified before `expire_before` are deleted,
+    * files modified before `compress_before` are moved into an archive per
+      day (see :py:func:`write_archive`),
+    * if `path` uses more than `max_size` bytes, the oldest files and archives
+      are deleted.
+
+    The directory is scanned once. The work is done in steps: the generator
+    pauses after every `limit` compressed or deleted files.
+
+    :param float compress_before: timestamp, `None` to not compress files
+    :param float expire_before: timestamp, `None` to not expire files
+    :param int max_size: size budget in bytes, `0` for no budget
+    :param int limit: maximum number of files to compress or delete per step
+    :return: iterator of the numbers of compressed and deleted files and
+        archives per step
+    :rtype: iterator(tuple(int, int))
+    """
+    entries = scan_directory(path)
+    budget = limit
+    expired = compressed = 0
+    remaining: List[DirectoryEntry] = []
+    for entry in entries:
+        if expire_before is not None and entry.mtime < expire_before:
+            entry.path.unlink(missing_ok=True)
+            expired += 1
+            budget -= 1
+            if not budget:
+                yield compressed, expired
+                budget, compressed, expired = limit, 0, 0
+        else:
+            remaining.append(entry)
+    if compress_before is not None:
+        by_day: Dict[str, List[DirectoryEntry]] = {}
+        for entry in remaining:
+            if not entry.is_archive and entry.mtime < compress_before:
+                day = datetime.date.fromtimestamp(entry.mtime).isoformat()
+                by_day.setdefault(day, []).append(entry)
+        archived: Set[Path] = set()
+        archives: List[DirectoryEntry] = []
+        for day, members in sorted(by_day.items()):
+            while members:
+                batch, members = members[:budget], members[budget:]
+                archives.append(write_archive(path, day, batch))
+                archived.update(member.path for member in batch)
+                compressed += len(batch)
+                budget -= len(batch)
+                if not budget:
+                    yield compressed, expired
+                    budget, compressed, expired = limit, 0, 0
+        remaining = sorted([entry for entry in remaining if entry.path not in archived] + archives)
+    if max_size:
+        size = sum(entry.size for entry in remaining)
+        for entry in remaining:
+            if size <= max_size:
+                break
+            entry.path.unlink(missing_ok=True)
+            size -= entry.size
+            expired += 1
+            budget -= 1
+            if not budget:
+                yield compressed, expired
+                budget, compressed, expired = limit, 0, 0
+    if compressed or expired:
+        yield compressed, expired
+
+
+class MaintenanceJob(abc.ABC):
+    interval: float
+    """seconds between two runs"""
+
+    def __init__(self) -> None:
+        self.last_run: Optional[float] = None
+        self.logger = ConsoleAndFileLogging.get_logger(self.__class__.__name__, LOG_FILE_PATH_QUEUES)
+
+    def due(self, now: float) -> bool:
+        return self.last_run is None or now - self.last_run >= self.interval
+
+    @abc.abstractmethod
+    async def run(self) -> None:
+        """Do the work, in steps that don't block the event loop."""
+
+    @abc.abstractmethod
+    def update_model(self, model: MaintenanceModel) -> None:
+        """Add the state of the job to `model`."""
+
+
+class QueueRetention(MaintenanceJob):
+    """
+    Compresses and expires the files in the `trash` and `keep` directories of
+    the queues.
+
+    Discarded files in `trash` are moved into daily archives after
+    `queue_trash_compress_after` days and deleted after `queue_trash_retention`
+    days, or earlier if the directory exceeds `queue_trash_max_size` MiB. Dead
+    letters in `keep` are not compressed, so they can still be replayed, they
+    are deleted after `queue_keep_retention` days. A value of `0` disables the
+    respective rule. All settings can be set per queue.
+    """
+
+    interval = MAINTENANCE_RETENTION_INTERVAL
+
+    def __init__(self, queues: Callable[[], Iterable[FileQueue]]) -> None:
+        """
+        :param queues: function returning the current queues
+        """
+        super(QueueRetention, self).__init__()
+        self.queues = queues
+        self.stats: Dict[Tuple[str, str], RetentionStats] = {}
+
+    @staticmethod
+    def policies(queue: FileQueue) -> List[Tuple[Path, Optional[float], Optional[float], int]]:
+        """
+        :return: list of `(directory, compress_before, expire_before,
+            max_size)` tuples, see :py:func:`compact_directory`
+        """
+
+        def days_ago(ucrv: Tuple[str, int]) -> Optional[float]:
+            days = get_ucrv_int(*ucrv, queue_name=queue.name)
+            return now - days * DAY if days > 0 else None
+
+        now = time.time()
+        max_size = max(0, get_ucrv_int(*UCRV_QUEUE_TRASH_MAX_SIZE, queue_name=queue.name)) * 2**20
+        return [
+            (
+                queue.trash_dir,
+                days_ago(UCRV_QUEUE_TRASH_COMPRESS_AFTER),
+                days_ago(UCRV_QUEUE_TRASH_RETENTION),
+                max_size,
+            ),
+            (queue.keep_dir, None, days_ago(UCRV_QUEUE_KEEP_RETENTION), 0),
+        ]
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stats: Dict[Tuple[str, str], RetentionStats] = {}
+        for queue in list(self.queues()):
+            for directory, compress_before, expire_before, max_size in self.policies(queue):
+                key = (queue.name, directory.name)
+                dir_stats = self.stats.get(key) or RetentionStats(
+                    queue=queue.name, directory=directory.name
+                )
+                compressed = expired = 0
+                steps = compact_directory(directory, compress_before, expire_before, max_size)
+                try:
+                    # one step at a time in a thread, the generator keeps the directory listing
+                    while True:
+                        step = await loop.run_in_executor(None, next, steps, None)
+                        if step is None:
+                            break
+                        compressed += step[0]
+                        expired += step[1]
+                    usage = await loop.run_in_executor(None, directory_usage, directory)
+                except FileNotFoundError:
+                    # queue was deleted meanwhile
+                    continue
+                dir_stats.files, dir_stats.archives, dir_stats.size = usage
+                dir_stats.compressed += compressed
+                dir_stats.expired += expired
+                dir_stats.last_run = datetime.datetime.now()
+                stats[key] = dir_stats
+                if compressed or expired:
+                    self.logger.info(
+                        "Compressed %d and deleted %d files in %s.", compressed, expired, directory
+                    )
+        self.stats = stats
+
+    def update_model(self, model: MaintenanceModel) -> None:
+        model.retention = [self.stats[key] for key in sorted(self.stats)]
+
+
+class OldDataMigration(MaintenanceJob):
+    """
+    Converts the entries of the old data DB stored by previous versions to
+    the current format, see :py:meth:`OldDataDB.migrate`. Entries of the
+    previous format are still read, so the conversion runs in the background.
+    """
+
+    interval = MAINTENANCE_RETENTION_INTERVAL
+
+    def __init__(self, db_path: Path = None) -> None:
+        super(OldDataMigration, self).__init__()
+        self.db_path = db_path or OLD_DATA_DB_PATH
+        self.done = False
+        self.migrated = 0
+
+    def due(self, now: float) -> bool:
+        return not self.done and super(OldDataMigration, self).due(now)
+
+    def migrate(self) -> int:
+        # the DB connections belong to the thread, so open and close the DB in it
+        db = OldDataDB(self.db_path, ListenerOldDataEntry)
+        migrated = 0
+        try:
+            more = True
+            while more:
+                step, more = db.migrate(MAINTENANCE_BATCH_SIZE)
+                migrated += step
+        finally:
+            db.close()
+        return migrated
+
+    async def run(self) -> None:
+        if self.db_path.exists():
+            self.migrated += await asyncio.get_running_loop().run_in_executor(None, self.migrate)
+        self.done = True
+        if self.migrated:
+            self.logger.info(
+                "Converted %d entries of the old data DB to the current format.", self.migrated
+            )
+
+    def update_model(self, model: MaintenanceModel) -> None:
+        """The conversion runs only once, it has no state to report."""
+
+
+class OldDataDBMaintenance(MaintenanceJob):
+    """
+    Keeps the old data DB small: deletes expired entries (of removed objects)
+    and rebuilds the DB file every `old_data_vacuum_interval` days (`0`
+    disables it).
+
+    Expired entries are deleted in small transactions, so the DB is never
+    locked for long, and for at most `MAINTENANCE_CULL_TIME_BUDGET` seconds
+    per run. The rebuild locks the DB until it is finished, so it runs only
+    when the in queue is empty, and pauses the preprocessing meanwhile.
+    """
+
+    interval = MAINTENANCE_OLD_DATA_INTERVAL
+    vacuum_marker = "last_vacuum"
+
+    def __init__(self, in_queue: InQueue, db_path: Path = None) -> None:
+        super(OldDataDBMaintenance, self).__init__()
+        self.in_queue = in_queue
+        self.db_path = db_path or OLD_DATA_DB_PATH
+        self.stats: Optional[OldDataDBStats] = None
+
+    def last_vacuum(self) -> Optional[float]:
+        try:
+            return (self.db_path / self.vacuum_marker).stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def vacuum_due(self) -> bool:
+        days = get_ucrv_int(*UCRV_OLD_DATA_VACUUM_INTERVAL)
+        last_vacuum = self.last_vacuum()
+        return days > 0 and (last_vacuum is None or time.time() - last_vacuum >= days * DAY)
+
+    def cull(self) -> Tuple[int, int, int]:
+        """:return: tuple `(culled, entries, size)`"""
+        # the DB connections belong to the thread, so open and close the DB in it
+        db = OldDataDB(self.db_path, ListenerOldDataEntry)
+        culled = 0
+        try:
+            deadline = time.monotonic() + MAINTENANCE_CULL_TIME_BUDGET
+            while time.monotonic() < deadline:
+                step = db.cull(MAINTENANCE_CULL_BATCH_SIZE)
+                culled += step
+                if step < MAINTENANCE_CULL_BATCH_SIZE:
+                    break
+            return culled, len(db), db.size()
+        finally:
+            db.close()
+
+    def vacuum(self) -> int:
+        """:return: size of the DB after the vacuum"""
+        db = OldDataDB(self.db_path, ListenerOldDataEntry)
+        try:
+            db.vacuum()
+            (self.db_path / self.vacuum_marker).touch()
+            return db.size()
+        finally:
+            db.close()
+
+    async def run(self) -> None:
+        if not self.db_path.exists():
+            return
+        loop = asyncio.get_running_loop()
+        stats = self.stats or OldDataDBStats()
+        culled, stats.entries, stats.size = await loop.run_in_executor(None, self.cull)
+        stats.culled += culled
+        if culled:
+            self.logger.info("Deleted %d expired entries of the old data DB.", culled)
+        if self.vacuum_due() and not len(self.in_queue):
+            async with self.in_queue.preprocess_lock:
+                if not len(self.in_queue):
+                    size = stats.size
+                    t0 = time.monotonic()
+                    stats.size = await loop.run_in_executor(None, self.vacuum)
+                    self.logger.info(
+                        "Rebuilt the old data DB in %.1f s, size: %d -> %d bytes.",
+                        time.monotonic() - t0,
+                        size,
+                        stats.size,
+                    )
+        last_vacuum = self.last_vacuum()
+        stats.last_vacuum = last_vacuum and datetime.datetime.fromtimestamp(last_vacuum)
+        stats.last_run = datetime.datetime.now()
+        self.stats = stats
+
+    def update_model(self, model: MaintenanceModel) -> None:
+        model.old_data = self.stats
+
+
+class Maintenance:
+    """Runs the maintenance jobs when they are due."""
+
+    def __init__(self, jobs: List[MaintenanceJob]) -> None:
+        self.jobs = jobs
+        self.logger = ConsoleAndFileLogging.get_logger(self.__class__.__name__, LOG_FILE_PATH_QUEUES)
+
+    async def run(self) -> None:
+        self.logger.info(
+            "Running maintenance jobs: %s", ", ".join(type(job).__name__ for job in self.jobs)
+        )
+        while True:
+            await self.run_due_jobs()
+            await asyncio.sleep(MAINTENANCE_POLL_INTERVAL)
+
+    async def run_due_jobs(self) -> None:
+        for job in self.jobs:
+            if not job.due(time.monotonic()):
+                continue
+            try:
+                await job.run()
+            except Exception as exc:
+                self.logger.exception("Maintenance job %s failed: %s", type(job).__name__, exc)
+            job.last_run = time.monotonic()
+
+    def as_model(self) -> MaintenanceModel:
+        model = MaintenanceModel()
+        for job in self.jobs:
+            job.update_model(model)
+        return model
@@ -29,6 +29,7 @@
 
 import abc
 import base64
+import datetime
 import logging
 import re
 from enum import Enum
@@ -466,7 +467,13 @@ class QueueModel(BaseModel):
     name: str
     head: str
     length: int
+    oldest_entry_age: int = 0
+    """seconds since the oldest item was added to the queue"""
     school_authority: str = ""
+    overflow: int = 0
+    """items spilled to the overflow store, not included in `length`"""
+    alarm: bool = False
+    """the queue reached its high watermark, or items wait in the overflow store"""
 
 
 class AllQueues(BaseModel):
@@ -474,6 +481,59 @@ class AllQueues(BaseModel):
     out_queues: List[QueueModel]
 
 
+class DeadLetter(BaseModel):
+    """An item of an out queue that could not be handled (stored in its `keep` directory)."""
+
+    name: str
+    queue: str
+    attempts: int = 0
+    last_error: str = ""
+    failed: datetime.datetime = None
+    data: Dict[str, Any] = None
+    """content of the listener file, only set when requesting single items"""
+
+
+class RetentionStats(BaseModel):
+    """State of the `trash` or `keep` directory of a queue."""
+
+    queue: str
+    directory: str
+    files: int = 0
+    """uncompressed files"""
+    archives: int = 0
+    """daily archives of compressed files"""
+    size: int = 0
+    """bytes used by files and archives"""
+    compressed: int = 0
+    """files moved into archives since the start of the service"""
+    expired: int = 0
+    """files and archives deleted since the start of the service"""
+    last_run: datetime.datetime = None
+
+
+class OldDataDBStats(BaseModel):
+    """State of the DB with the previous data of users and groups."""
+
+    entries: int = 0
+    """entries, including expired entries that were not culled yet"""
+    size: int = 0
+    """bytes used by the DB file, its write-ahead log and the files of large values"""
+    culled: int = 0
+    """expired entries deleted since the start of the service"""
+    last_vacuum: datetime.datetime = None
+    last_run: datetime.datetime = None
+
+
+class MaintenanceModel(BaseModel):
+    retention: List[RetentionStats] = []
+    old_data: OldDataDBStats = None
+
+
+class DeadLetterReplay(BaseModel):
+    items: List[str] = []
+    """names of the dead letters to put back into the queue, all if empty"""
+
+
 class RPCCommand(str, Enum):
     get_queue = "get_queue"
     get_queues = "get_queues"
@@ -484,6 +544,9 @@ class RPCCommand(str, Enum):
     delete_school_authority = "delete_school_authority"
     patch_school_authority = "patch_school_authority"
     put_school_to_authority_mapping = "put_school_to_authority_mapping"
+    get_dead_letters = "get_dead_letters"
+    replay_dead_letters = "replay_dead_letters"
+    get_maintenance = "get_maintenance"
 
 
 RPCCommandsRequiredArgs = {
@@ -493,6 +556,8 @@ RPCCommandsRequiredArgs = {
     RPCCommand.delete_school_authority: ("name",),
     RPCCommand.patch_school_authority: ("name", "school_authority"),
     RPCCommand.put_school_to_authority_mapping: ("school_to_authority_mapping",),
+    RPCCommand.get_dead_letters: ("name",),
+    RPCCommand.replay_dead_letters: ("name",),
 }
 
 
@@ -501,6 +566,7 @@ class RPCRequest(BaseModel):
     name: str = ""
     school_authority: Dict[str, Any] = {}
     school_to_authority_mapping: Dict[str, Any] = {}
+    items: List[str] = []
 
     @validator("name", "school_authority", always=True, whole=True)
     def required_args_present(cls, value, values, config, field, **kwargs):
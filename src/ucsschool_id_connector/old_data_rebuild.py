@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+Rebuild the DB with the previous data of users and groups ("old data") from
+LDAP.
+
+The listener object plugin stores the old data of every object it
+preprocesses. Removing an object from the school authorities requires it.
+When the DB was lost or the connector was installed after the objects were
+created, :py:class:`OldDataRebuild` creates the same entries from the
+current state of the objects in LDAP.
+"""
+
+import asyncio
+import time
+from contextlib import aclosing
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Type
+
+from .constants import LDAP_PAGE_SIZE, OLD_DATA_DB_PATH, OLD_DATA_REBUILD_PROGRESS_INTERVAL
+from .db import OldDataDB
+from .ldap_access import LDAPAccess
+from .models import ListenerGroupOldDataEntry, ListenerOldDataEntry, ListenerUserOldDataEntry
+from .utils import ConsoleAndFileLogging
+
+USER_FILTER = (
+    "(|"
+    "(objectClass=ucsschoolStaff)"
+    "(objectClass=ucsschoolStudent)"
+    "(objectClass=ucsschoolTeacher)"
+    "(objectClass=ucsschoolLegalGuardian)"
+    ")"
+)
+USER_ATTRIBUTES = ["entryUUID", "ucsschoolSchool", "ucsschoolRecordUID", "ucsschoolSourceUID"]
+GROUP_FILTER = "(|(ucsschoolRole=school_class:school:*)(ucsschoolRole=workgroup:school:*))"
+GROUP_ATTRIBUTES = ["entryUUID", "uniqueMember"]
+
+
+def _values(raw_attributes: Dict[str, List[bytes]], name: str) -> List[str]:
+    return [value.decode("utf-8") for value in raw_attributes.get(name, [])]
+
+
+def user_old_data(raw_attributes: Dict[str, List[bytes]]) -> ListenerUserOldDataEntry:
+    """Old data entry of a user, as `ListenerUserObjectHandlerImpl.save_old_data()` stores it."""
+    record_uids = _values(raw_attributes, "ucsschoolRecordUID")
+    source_uids = _values(raw_attributes, "ucsschoolSourceUID")
+    return ListenerUserOldDataEntry(
+        schools=_values(raw_attributes, "ucsschoolSchool"),
+        record_uid=record_uids[0] if record_uids else None,
+        source_uid=source_uids[0] if source_uids else None,
+    )
+
+
+def group_old_data(raw_attributes: Dict[str, List[bytes]]) -> ListenerGroupOldDataEntry:
+    """
+    Old data entry of a group, as `ListenerGroupObjectHandlerImpl.save_old_data()`
+    stores it: the members that UDM lists in the `users` property, that is
+    without nested groups and computers (their `uid` ends with `$`).
+    """
+    return ListenerGroupOldDataEntry(
+        users=[
+            dn
+            for dn in _values(raw_attributes, "uniqueMember")
+            if dn[:4].lower() == "uid=" and not dn.split(",", 1)[0].endswith("$")
+        ]
+    )
+
+
+class RebuildProgress:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.read = 0
+        self.written = 0
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+    @property
+    def rate(self) -> float:
+        """objects read per second"""
+        return self.read / max((self.finished or time.monotonic()) - self.started, 1e-6)
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.read} read, {self.written} written, {self.rate:.0f} objects/s"
+
+
+class OldDataRebuild:
+    """
+    Reads all school users and school groups from LDAP with paged searches,
+    users and groups concurrently, and writes their old data entries to the
+    DB, one transaction per page.
+
+    Existing entries are kept unless `overwrite` is set: they hold the data
+    the school authorities last received, which may differ from LDAP while
+    changes are still queued.
+    """
+
+    def __init__(
+        self,
+        ldap_access: LDAPAccess = None,
+        db_path: Path = None,
+        overwrite: bool = False,
+        page_size: int = LDAP_PAGE_SIZE,
+    ) -> None:
+        self.ldap_access = ldap_access or LDAPAccess()
+        self.db_path = db_path or OLD_DATA_DB_PATH
+        self.overwrite = overwrite
+        self.page_size = page_size
+        self.logger = ConsoleAndFileLogging.get_logger(self.__class__.__name__)
+        self.progress: List[RebuildProgress] = []
+        self._last_log = 0.0
+
+    def log_progress(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if force or now - self._last_log >= OLD_DATA_REBUILD_PROGRESS_INTERVAL:
+            self._last_log = now
+            self.logger.info("%s", ", ".join(str(progress) for progress in self.progress))
+
+    async def rebuild_objects(
+        self,
+        name: str,
+        filter_s: str,
+        attributes: List[str],
+        entry_type: Type[ListenerOldDataEntry],
+        old_data: Callable[[Dict[str, List[bytes]]], ListenerOldDataEntry],
+    ) -> RebuildProgress:
+        progress = RebuildProgress(name)
+        self.progress.append(progress)
+        db = OldDataDB(self.db_path, entry_type)
+        try:
+            pages = self.ldap_access.paged_search(filter_s, attributes, page_size=self.page_size)
+            async with aclosing(pages):
+                async for page in pages:
+                    entries: Dict[str, Any] = {}
+                    for result in page:
+                        raw_attributes = result["raw_attributes"]
+                        entry_uuid = raw_attributes["entryUUID"][0].decode("ascii")
+                        entries[entry_uuid] = old_data(raw_attributes)
+                    if not self.overwrite:
+                        for key in db.get_many(entries):
+                            del entries[key]
+                    db.set_many(entries)
+                    progress.read += len(page)
+                    progress.written += len(entries)
+                    self.log_progress()
+                    # let the other search continue
+                    await asyncio.sleep(0)
+        finally:
+            db.close()
+        progress.finished = time.monotonic()
+        return progress
+
+    async def run(self, users: bool = True, groups: bool = True) -> List[RebuildProgress]:
+        """
+        :param bool users: rebuild the entries of users
+        :param bool groups: rebuild the entries of groups
+        :return: progress of users and groups
+        """
+        jobs = []
+        if users:
+            jobs.append(
+                self.rebuild_objects(
+                    "Users", USER_FILTER, USER_ATTRIBUTES, ListenerUserOldDataEntry, user_old_data
+                )
+            )
+        if groups:
+            jobs.append(
+                self.rebuild_objects(
+                    "Groups", GROUP_FILTER, GROUP_ATTRIBUTES, ListenerGroupOldDataEntry, group_old_data
+                )
+            )
+        self.progress = []
+        self._last_log = time.monotonic()
+        res = await asyncio.gather(*jobs)
+        self.log_progress(force=True)
+        return res
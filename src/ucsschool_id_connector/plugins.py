@@ -134,6 +134,25 @@ class Preprocessing:
         connections.
         """
 
+    @hook_spec
+    async def preprocess_pass_start(self) -> None:
+        """
+        Called before the in queue preprocesses a batch of files.
+
+        Use it to collect the data stored by the following
+        `preprocess_*_object()` calls and write it together in
+        `preprocess_pass_end()`.
+        """
+
+    @hook_spec
+    async def preprocess_pass_end(self) -> None:
+        """
+        Called after the in queue preprocessed a batch of files, also if the
+        preprocessing failed. Store the data collected since
+        `preprocess_pass_start()`. The files of the batch are marked ready for
+        distribution only after this returned.
+        """
+
     @hook_spec
     async def preprocess_add_mod_object(self, obj: ListenerAddModifyObject) -> bool:
         """
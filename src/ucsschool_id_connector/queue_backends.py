@@ -0,0 +1,776 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+Storage backends of the out queues.
+
+:py:class:`DirectoryQueueBackend` stores one JSON file per item in the queue
+directory. :py:class:`SQLiteQueueBackend` stores the items in an SQLite
+database (in WAL mode) in the queue directory, which scales to hundreds of
+thousands of queued items. Both move discarded and kept items as JSON files
+to the `trash` and `keep` subdirectories.
+
+The retry state of items is stored with their sorting data. The directory
+backend keeps it only in memory, so after a restart failed items are retried
+right away.
+
+:py:class:`OverflowStore` holds the items the in-queue spills while an out
+queue is above its high watermark.
+"""
+
+import abc
+import bisect
+import heapq
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, cast
+
+import aiofiles
+import ujson
+
+from .constants import TMP_FILE_MAX_AGE
+from .durable_files import copy_file_atomic, get_group_commit, is_tmp_file, write_file_atomic
+
+SQLITE_DB_NAME = "queue.sqlite"
+OVERFLOW_DB_NAME = "overflow.sqlite"
+BACKEND_DIRECTORY = "directory"
+BACKEND_SQLITE = "sqlite"
+
+
+def wal_path_of(db_path: Path) -> Path:
+    """
+    Path of the write-ahead log of the SQLite database `db_path`. With
+    `synchronous=NORMAL` commits are only written to it, so it is synced with
+    the :py:class:`GroupCommit` of the queue files.
+    """
+    return db_path.with_name(f"{db_path.name}-wal")
+
+
+class QueueEntry(NamedTuple):
+    """
+    Data about a file in an out queue, required to sort it without loading it,
+    and its retry state.
+    """
+
+    queue_order: int
+    udm_object_type: str
+    entry_uuid: str
+    enqueued: float
+    attempts: int = 0
+    """number of failed attempts to handle the item"""
+    next_due: float = 0.0
+    """timestamp before which the item must not be handled again"""
+    last_error: str = ""
+    priority: int = 0
+    """items with a higher priority are handled first"""
+
+
+def iter_queue_dir(path: Path, invalid: List[Path] = None) -> Iterator[os.DirEntry]:
+    """
+    Iterate over the JSON files in queue directory `path`, unsorted.
+
+    :param Path path: queue directory
+    :param list invalid: if set, other files and directories that don't
+        belong into the queue are appended to it
+    :return: iterator of directory entries
+    """
+    with cast(Iterator[os.DirEntry], os.scandir(path)) as dir_entries:
+        for entry in dir_entries:
+            if entry.is_dir() and entry.name in ("keep", "trash"):
+                continue
+            if entry.name.startswith((SQLITE_DB_NAME, OVERFLOW_DB_NAME)):
+                continue
+            if is_tmp_file(entry.name) and _is_recent(entry):
+                # being written
+                continue
+            if not entry.is_file() or not entry.name.lower().endswith(".json"):
+                if invalid is not None:
+                    invalid.append(Path(entry.path))
+                continue
+            yield entry
+
+
+def _is_recent(entry: os.DirEntry) -> bool:
+    try:
+        return entry.stat().st_mtime > time.time() - TMP_FILE_MAX_AGE
+    except FileNotFoundError:
+        return True
+
+
+def list_queue_dir(path: Path) -> Tuple[List[Path], List[Path]]:
+    """
+    List the JSON files in queue directory `path`.
+
+    :param Path path: queue directory
+    :return: tuple with the list of JSON files sorted by filename and the list
+        of other files and directories that don't belong into the queue
+    :rtype: tuple(list(Path), list(Path))
+    """
+    invalid: List[Path] = []
+    res = sorted(Path(entry.path) for entry in iter_queue_dir(path, invalid))
+    return res, invalid
+
+
+def scan_queue_dir(
+    path: Path, limit: int, after: str = "", name_filter: Callable[[str], bool] = None
+) -> Tuple[List[Path], List[Path]]:
+    """
+    Like :py:func:`list_queue_dir`, but only the `limit` JSON files with the
+    smallest names after `after`. The directory is read with a heap of at
+    most `limit` names, so the memory usage doesn't depend on the number of
+    files in the directory.
+
+    :param Path path: queue directory
+    :param int limit: maximum number of files to return
+    :param str after: cursor, only files with a larger name are returned
+    :param callable name_filter: if set, only files for whose name it
+        returns `True` are returned
+    :return: tuple with the list of JSON files sorted by filename and the list
+        of other files and directories that don't belong into the queue
+    :rtype: tuple(list(Path), list(Path))
+    """
+    invalid: List[Path] = []
+    names = (
+        entry.name
+        for entry in iter_queue_dir(path, invalid)
+        if entry.name > after and (name_filter is None or name_filter(entry.name))
+    )
+    return [path / name for name in heapq.nsmallest(limit, names)], invalid
+
+
+class QueueBackend(abc.ABC):
+    """
+    Storage of the items of one out queue.
+
+    Items are identified by the name of the listener file they were created
+    from. Their content is never modified after being enqueued. They are
+    removed with :py:meth:`ack` after being handled, or moved to the `trash`
+    or `keep` directory with :py:meth:`move`.
+    """
+
+    name: str
+
+    def __init__(self, path: Path, logger: logging.Logger) -> None:
+        self.path = path
+        self.logger = logger
+        self.trash_dir = path / "trash"
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """Number of items in the queue."""
+
+    @abc.abstractmethod
+    def names(self) -> List[str]:
+        """Names of all items in the queue, sorted."""
+
+    @abc.abstractmethod
+    def enqueue(self, source: Path, entry: QueueEntry) -> bool:
+        """
+        Add the listener file `source` to the queue. An item with the same name
+        is replaced.
+
+        :param Path source: listener file in the in-queue
+        :param QueueEntry entry: sorting data of the item
+        :return: whether the file was hardlinked instead of copied
+        :rtype: bool
+        """
+
+    @abc.abstractmethod
+    def add(self, name: str, data: str, entry: QueueEntry) -> None:
+        """
+        Add an item with content `data` to the queue (e.g. from the overflow
+        store). An item with the same name is replaced.
+        """
+
+    @abc.abstractmethod
+    async def read(self, name: str) -> str:
+        """
+        :raises FileNotFoundError: if there is no item `name`
+        """
+
+    @abc.abstractmethod
+    def version(self, name: str) -> Optional[Tuple[int, int]]:
+        """Value that changes if item `name` is replaced, `None` if it doesn't exist."""
+
+    @abc.abstractmethod
+    def enqueued_times(self) -> List[Tuple[str, float]]:
+        """`(name, enqueued)` tuples of all items in the queue."""
+
+    @abc.abstractmethod
+    def get_entry(self, name: str) -> Optional[QueueEntry]:
+        """Sorting data of item `name`, `None` if unknown."""
+
+    @abc.abstractmethod
+    def set_entry(self, name: str, entry: QueueEntry) -> None:
+        """Store sorting data of item `name`."""
+
+    @abc.abstractmethod
+    def unindexed_names(self) -> List[str]:
+        """Names of items without sorting data (e.g. from before a restart)."""
+
+    @abc.abstractmethod
+    def peek(self, limit: int = None, due_at: float = None) -> List[Tuple[QueueEntry, str]]:
+        """
+        The first `limit` items with sorting data, ordered by UDM object type
+        and name.
+
+        :param int limit: maximum number of items to return, all if `None`
+        :param float due_at: if set, only items that are not waiting for a
+            retry at this timestamp
+        :return: list of `(entry, name)` tuples
+        :rtype: list(tuple(QueueEntry, str))
+        """
+
+    @abc.abstractmethod
+    def waiting(self, now: float) -> List[Tuple[QueueEntry, str]]:
+        """Items waiting for a retry at timestamp `now`, as `(entry, name)` tuples."""
+
+    @abc.abstractmethod
+    def prioritized(self) -> List[Tuple[QueueEntry, str]]:
+        """
+        All items of the objects that have items with a priority above
+        normal, as `(entry, name)` tuples ordered by UDM object type and name.
+        """
+
+    @abc.abstractmethod
+    def ack(self, name: str) -> None:
+        """Remove item `name` after it was handled."""
+
+    @abc.abstractmethod
+    def move(self, name: str, target_dir: Path) -> None:
+        """
+        Remove item `name` from the queue and store it as JSON file in
+        `target_dir`.
+
+        :raises FileNotFoundError: if there is no item `name`
+        :raises OSError: if the file could not be written
+        """
+
+    def rescan(self) -> None:
+        """
+        Read the items from the storage, at startup and when changes by other
+        processes may have been missed.
+        """
+
+    def close(self) -> None:
+        pass
+
+
+class DirectoryQueueBackend(QueueBackend):
+    """
+    One JSON file per item in the queue directory (the default).
+
+    The names of the items are kept in memory, sorted by UDM object type and
+    name, so :py:meth:`peek` reads only the first items. The directory is
+    only listed by :py:meth:`rescan`.
+    """
+
+    name = BACKEND_DIRECTORY
+
+    def __init__(self, path: Path, logger: logging.Logger) -> None:
+        super().__init__(path, logger)
+        # filename -> QueueEntry, so files must be loaded only once to be sorted
+        self._index: Dict[str, QueueEntry] = {}
+        # (queue_order, filename) of the files in the index, sorted
+        self._order: List[Tuple[int, str]] = []
+        # files in the index with a retry state or a priority above normal
+        self._waiting: Set[str] = set()
+        self._prioritized: Set[str] = set()
+        # files found by rescan() that have no sorting data yet
+        self._unindexed: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._index) + len(self._unindexed)
+
+    def names(self) -> List[str]:
+        return sorted([*self._index, *self._unindexed])
+
+    def rescan(self) -> None:
+        """List the queue directory. Non-JSON files are moved to the trash."""
+        paths, invalid = list_queue_dir(self.path)
+        for path in invalid:
+            self.logger.warning("Non-JSON file found in queue %r: %r.", self.path.name, path.name)
+            try:
+                self.move(path.name, self.trash_dir)
+            except OSError:
+                pass
+        names = {path.name for path in paths}
+        for name in [name for name in self._index if name not in names]:
+            # file was removed by something else than this queue
+            self._forget(name)
+        self._unindexed = names.difference(self._index)
+
+    def enqueue(self, source: Path, entry: QueueEntry) -> bool:
+        """
+        Hardlink `source` into the queue directory, so that the listener file
+        is not written again for every school authority. Falls back to copying
+        if the out queue is on another filesystem or the filesystem does not
+        support hardlinks.
+
+        Files in the out queues must never be modified in place, as they may
+        share their content with the files in other out queues. They are only
+        moved or unlinked.
+        """
+        target = self.path / source.name
+        try:
+            target.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            os.link(source, target)
+            linked = True
+        except OSError:
+            # EXDEV (other filesystem), EPERM/EMLINK (no or no more hardlinks)
+            copy_file_atomic(source, target)
+            linked = False
+        get_group_commit().add(target)
+        self.set_entry(source.name, entry)
+        return linked
+
+    def add(self, name: str, data: str, entry: QueueEntry) -> None:
+        write_file_atomic(self.path / name, data)
+        get_group_commit().add(self.path / name)
+        self.set_entry(name, entry)
+
+    async def read(self, name: str) -> str:
+        async with aiofiles.open(self.path / name, "r") as fp:
+            return await fp.read()
+
+    def version(self, name: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = (self.path / name).stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def enqueued_times(self) -> List[Tuple[str, float]]:
+        res = [(name, entry.enqueued) for name, entry in self._index.items()]
+        for name in self._unindexed:
+            try:
+                res.append((name, (self.path / name).stat().st_mtime))
+            except FileNotFoundError:
+                pass
+        return res
+
+    def get_entry(self, name: str) -> Optional[QueueEntry]:
+        return self._index.get(name)
+
+    def set_entry(self, name: str, entry: QueueEntry) -> None:
+        old_entry = self._index.get(name)
+        if old_entry is None or old_entry.queue_order != entry.queue_order:
+            if old_entry is not None:
+                self._remove_order(old_entry.queue_order, name)
+            bisect.insort(self._order, (entry.queue_order, name))
+        self._index[name] = entry
+        self._unindexed.discard(name)
+        if entry.next_due:
+            self._waiting.add(name)
+        else:
+            self._waiting.discard(name)
+        if entry.priority > 0:
+            self._prioritized.add(name)
+        else:
+            self._prioritized.discard(name)
+
+    def unindexed_names(self) -> List[str]:
+        return sorted(self._unindexed)
+
+    def peek(self, limit: int = None, due_at: float = None) -> List[Tuple[QueueEntry, str]]:
+        res = []
+        for _, name in self._order:
+            if limit is not None and len(res) >= limit:
+                break
+            entry = self._index[name]
+            if due_at is None or entry.next_due <= due_at:
+                res.append((entry, name))
+        return res
+
+    def waiting(self, now: float) -> List[Tuple[QueueEntry, str]]:
+        items = ((self._index[name], name) for name in self._waiting)
+        return [(entry, name) for entry, name in items if entry.next_due > now]
+
+    def prioritized(self) -> List[Tuple[QueueEntry, str]]:
+        entry_uuids = {self._index[name].entry_uuid for name in self._prioritized}
+        if not entry_uuids:
+            return []
+        # only while high priority items are queued
+        items = ((self._index[name], name) for _, name in self._order)
+        return [(entry, name) for entry, name in items if entry.entry_uuid in entry_uuids]
+
+    def ack(self, name: str) -> None:
+        self._forget(name)
+        try:
+            (self.path / name).unlink()
+        except FileNotFoundError:
+            pass
+
+    def move(self, name: str, target_dir: Path) -> None:
+        self._forget(name)
+        # Bug in shutil.move(): https://bugs.python.org/issue32689
+        shutil.move(str(self.path / name), str(target_dir))
+
+    def _forget(self, name: str) -> None:
+        entry = self._index.pop(name, None)
+        if entry is not None:
+            self._remove_order(entry.queue_order, name)
+        self._unindexed.discard(name)
+        self._waiting.discard(name)
+        self._prioritized.discard(name)
+
+    def _remove_order(self, queue_order: int, name: str) -> None:
+        pos = bisect.bisect_left(self._order, (queue_order, name))
+        if pos < len(self._order) and self._order[pos] == (queue_order, name):
+            del self._order[pos]
+
+
+class SQLiteQueueBackend(QueueBackend):
+    """
+    Items are stored in the SQLite database `queue.sqlite` in the queue
+    directory. Each change is a single transaction. The database runs in WAL
+    mode, so readers (e.g. the RPC server) don't block the queue task. Added
+    items are synced to disk with the next flush of the :py:class:`GroupCommit`,
+    like the files of the directory backend.
+    """
+
+    name = BACKEND_SQLITE
+    _entry_columns = (
+        "queue_order, udm_object_type, entry_uuid, enqueued, attempts, next_due, last_error, priority"
+    )
+    _added_columns = (
+        ("attempts", "INTEGER NOT NULL DEFAULT 0"),
+        ("next_due", "REAL NOT NULL DEFAULT 0"),
+        ("last_error", "TEXT NOT NULL DEFAULT ''"),
+        ("priority", "INTEGER NOT NULL DEFAULT 0"),
+    )
+
+    def __init__(self, path: Path, logger: logging.Logger, queue_order: Callable[[str], int]) -> None:
+        super().__init__(path, logger)
+        self.db_path = path / SQLITE_DB_NAME
+        self.wal_path = wal_path_of(self.db_path)
+        self.queue_order = queue_order
+        self._con = sqlite3.connect(str(self.db_path))
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        with self._con:
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "name TEXT NOT NULL UNIQUE, "
+                "queue_order INTEGER NOT NULL, "
+                "udm_object_type TEXT NOT NULL, "
+                "entry_uuid TEXT NOT NULL, "
+                "enqueued REAL NOT NULL, "
+                "data TEXT NOT NULL)"
+            )
+            columns = {row[1] for row in self._con.execute("PRAGMA table_info(items)")}
+            # columns added after the table was introduced, also adds them to existing databases
+            for column, definition in self._added_columns:
+                if column not in columns:
+                    self._con.execute(f"ALTER TABLE items ADD COLUMN {column} {definition}")
+            self._con.execute("CREATE INDEX IF NOT EXISTS items_order ON items (queue_order, name)")
+            self._con.execute("CREATE INDEX IF NOT EXISTS items_next_due ON items (next_due)")
+            self._con.execute(
+                "CREATE INDEX IF NOT EXISTS items_priority ON items (priority, entry_uuid)"
+            )
+            self._con.execute("CREATE INDEX IF NOT EXISTS items_entry_uuid ON items (entry_uuid)")
+
+    def __len__(self) -> int:
+        return self._con.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def names(self) -> List[str]:
+        return [row[0] for row in self._con.execute("SELECT name FROM items ORDER BY name")]
+
+    def _insert(self, name: str, data: str, entry: QueueEntry) -> None:
+        # REPLACE deletes the old row, so the item gets a new `seq` (version)
+        self._con.execute(
+            f"INSERT OR REPLACE INTO items (name, data, {self._entry_columns}) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (name, data, *entry),
+        )
+
+    def enqueue(self, source: Path, entry: QueueEntry) -> bool:
+        data = source.read_text()
+        with self._con:
+            self._insert(source.name, data, entry)
+        get_group_commit().add(self.wal_path)
+        return False
+
+    def add(self, name: str, data: str, entry: QueueEntry) -> None:
+        with self._con:
+            self._insert(name, data, entry)
+        get_group_commit().add(self.wal_path)
+
+    async def read(self, name: str) -> str:
+        row = self._con.execute("SELECT data FROM items WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"No item {name!r} in {self.db_path!s}.")
+        return row[0]
+
+    def version(self, name: str) -> Optional[Tuple[int, int]]:
+        row = self._con.execute("SELECT seq, length(data) FROM items WHERE name = ?", (name,)).fetchone()
+        return tuple(row) if row else None
+
+    def enqueued_times(self) -> List[Tuple[str, float]]:
+        return [tuple(row) for row in self._con.execute("SELECT name, enqueued FROM items")]
+
+    def get_entry(self, name: str) -> Optional[QueueEntry]:
+        row = self._con.execute(
+            f"SELECT {self._entry_columns} FROM items WHERE name = ?", (name,)
+        ).fetchone()
+        return QueueEntry(*row) if row else None
+
+    def set_entry(self, name: str, entry: QueueEntry) -> None:
+        with self._con:
+            self._con.execute(
+                "UPDATE items SET queue_order = ?, udm_object_type = ?, entry_uuid = ?, enqueued = ?, "
+                "attempts = ?, next_due = ?, last_error = ?, priority = ? WHERE name = ?",
+                (*entry, name),
+            )
+
+    def unindexed_names(self) -> List[str]:
+        # sorting data is stored with each item
+        return []
+
+    def peek(self, limit: int = None, due_at: float = None) -> List[Tuple[QueueEntry, str]]:
+        rows = self._con.execute(
+            f"SELECT {self._entry_columns}, name FROM items WHERE next_due <= ? "
+            "ORDER BY queue_order, name LIMIT ?",
+            (float("inf") if due_at is None else due_at, -1 if limit is None else limit),
+        )
+        return [(QueueEntry(*row[:-1]), row[-1]) for row in rows]
+
+    def waiting(self, now: float) -> List[Tuple[QueueEntry, str]]:
+        rows = self._con.execute(
+            f"SELECT {self._entry_columns}, name FROM items WHERE next_due > ?", (now,)
+        )
+        return [(QueueEntry(*row[:-1]), row[-1]) for row in rows]
+
+    def prioritized(self) -> List[Tuple[QueueEntry, str]]:
+        rows = self._con.execute(
+            f"SELECT {self._entry_columns}, name FROM items WHERE entry_uuid IN "
+            "(SELECT entry_uuid FROM items WHERE priority > 0) ORDER BY queue_order, name"
+        )
+        return [(QueueEntry(*row[:-1]), row[-1]) for row in rows]
+
+    def ack(self, name: str) -> None:
+        with self._con:
+            self._con.execute("DELETE FROM items WHERE name = ?", (name,))
+
+    def move(self, name: str, target_dir: Path) -> None:
+        row = self._con.execute("SELECT data FROM items WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"No item {name!r} in {self.db_path!s}.")
+        write_file_atomic(target_dir / name, row[0])
+        get_group_commit().add(target_dir / name)
+        self.ack(name)
+
+    def entry_from_json(self, data: str, enqueued: float) -> QueueEntry:
+        """Sorting data of a listener file, without loading it through the plugins."""
+        try:
+            obj_dict = ujson.loads(data)
+            udm_object_type = str(obj_dict.get("udm_object_type") or "")
+            entry_uuid = str(obj_dict.get("id") or "")
+        except (AttributeError, ValueError):
+            # will be discarded when handled
+            udm_object_type = entry_uuid = ""
+        return QueueEntry(self.queue_order(udm_object_type), udm_object_type, entry_uuid, enqueued)
+
+    def import_directory(self, batch_size: int = 1000) -> int:
+        """
+        Move the JSON files in the queue directory (queued before switching
+        to this backend) into the database.
+
+        :param int batch_size: number of files to import per transaction
+        :return: number of imported files
+        :rtype: int
+        """
+        paths, _ = list_queue_dir(self.path)
+        for start in range(0, len(paths), batch_size):
+            batch = paths[start : start + batch_size]
+            with self._con:
+                for path in batch:
+                    data = path.read_text()
+                    self._insert(path.name, data, self.entry_from_json(data, path.stat().st_mtime))
+            get_group_commit().add(self.wal_path)
+            get_group_commit().flush()
+            for path in batch:
+                path.unlink()
+        if paths:
+            self.logger.info("Imported %d files from %s into %s.", len(paths), self.path, self.db_path)
+        return len(paths)
+
+    def close(self) -> None:
+        self._con.close()
+
+
+class OverflowStore:
+    """
+    Items the in-queue spilled while the out queue was above its high
+    watermark, stored in the SQLite database `overflow.sqlite` in the queue
+    directory. The database is only created when the first item is spilled.
+
+    Items are stored under a key. An item with the key of a stored item
+    replaces it, but gets the `old_data` of the replaced item if that has
+    some, like :py:meth:`OutQueue.coalesce` keeps the oldest `old_data`. With
+    the entryUUID as key the store grows with the number of changed objects
+    instead of the number of changes.
+    """
+
+    _entry_columns = SQLiteQueueBackend._entry_columns
+
+    def __init__(self, path: Path, logger: logging.Logger) -> None:
+        self.db_path = path / OVERFLOW_DB_NAME
+        self.wal_path = wal_path_of(self.db_path)
+        self.logger = logger
+        self._con: Optional[sqlite3.Connection] = None
+        if self.db_path.exists():
+            self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._con is None:
+            self._con = sqlite3.connect(str(self.db_path))
+            self._con.execute("PRAGMA journal_mode=WAL")
+            self._con.execute("PRAGMA synchronous=NORMAL")
+            with self._con:
+                self._con.execute(
+                    "CREATE TABLE IF NOT EXISTS overflow ("
+                    "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                    "key TEXT NOT NULL UNIQUE, "
+                    "name TEXT NOT NULL, "
+                    "queue_order INTEGER NOT NULL, "
+                    "udm_object_type TEXT NOT NULL, "
+                    "entry_uuid TEXT NOT NULL, "
+                    "enqueued REAL NOT NULL, "
+                    "attempts INTEGER NOT NULL, "
+                    "next_due REAL NOT NULL, "
+                    "last_error TEXT NOT NULL, "
+                    "priority INTEGER NOT NULL, "
+                    "data TEXT NOT NULL)"
+                )
+                self._con.execute("CREATE INDEX IF NOT EXISTS overflow_uuid ON overflow (entry_uuid)")
+        return self._con
+
+    def __len__(self) -> int:
+        if self._con is None:
+            return 0
+        return self._con.execute("SELECT COUNT(*) FROM overflow").fetchone()[0]
+
+    def spill(self, key: str, name: str, data: str, entry: QueueEntry) -> None:
+        """
+        Store the item `name` with content `data` under `key`. It is moved
+        behind all other stored items, and synced to disk with the next flush
+        of the :py:class:`GroupCommit`, before the in-queue removes its file.
+        """
+        con = self._connect()
+        with con:
+            row = con.execute("SELECT data, priority FROM overflow WHERE key = ?", (key,)).fetchone()
+            if row:
+                old_data = ujson.loads(row[0]).get("old_data")
+                if old_data:
+                    # the object may have been renamed or moved since, keep the older state
+                    obj_dict = ujson.loads(data)
+                    if obj_dict.get("old_data") != old_data:
+                        obj_dict["old_data"] = old_data
+                        data = ujson.dumps(obj_dict)
+                entry = entry._replace(priority=max(entry.priority, row[1]))
+                con.execute("DELETE FROM overflow WHERE key = ?", (key,))
+            con.execute(
+                f"INSERT INTO overflow (key, name, data, {self._entry_columns}) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, name, data, *entry),
+            )
+        get_group_commit().add(self.wal_path)
+
+    def has_object(self, entry_uuid: str) -> bool:
+        """Whether an item of the object with `entry_uuid` is stored."""
+        if self._con is None:
+            return False
+        row = self._con.execute(
+            "SELECT 1 FROM overflow WHERE entry_uuid = ? LIMIT 1", (entry_uuid,)
+        ).fetchone()
+        return row is not None
+
+    def peek(self, limit: int = None) -> List[Tuple[str, str, str, QueueEntry]]:
+        """
+        The first `limit` items, in the order they were spilled.
+
+        :param int limit: maximum number of items to return, all if `None`
+        :return: list of `(key, name, data, entry)` tuples
+        :rtype: list(tuple(str, str, str, QueueEntry))
+        """
+        if self._con is None:
+            return []
+        rows = self._con.execute(
+            f"SELECT key, name, data, {self._entry_columns} FROM overflow ORDER BY seq LIMIT ?",
+            (-1 if limit is None else limit,),
+        )
+        return [(row[0], row[1], row[2], QueueEntry(*row[3:])) for row in rows]
+
+    def remove(self, keys: List[str]) -> None:
+        if self._con is None:
+            return
+        with self._con:
+            self._con.executemany("DELETE FROM overflow WHERE key = ?", [(key,) for key in keys])
+
+    def close(self) -> None:
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+
+
+def export_sqlite_db(path: Path, logger: logging.Logger) -> int:
+    """
+    Write the items in the SQLite database of the queue directory `path` as
+    JSON files back into the directory (after switching to the directory
+    backend). Removes the database afterwards.
+
+    :return: number of exported items
+    :rtype: int
+    """
+    db_path = path / SQLITE_DB_NAME
+    if not db_path.exists():
+        return 0
+    backend = SQLiteQueueBackend(path, logger, queue_order=lambda _: 999)
+    try:
+        names = backend.names()
+        for name in names:
+            backend.move(name, path)
+    finally:
+        backend.close()
+    # the exported files must be on disk before the database is gone
+    get_group_commit().flush()
+    for db_file in path.glob(f"{SQLITE_DB_NAME}*"):
+        db_file.unlink()
+    if names:
+        logger.info("Exported %d items from %s into %s.", len(names), db_path, path)
+    return len(names)
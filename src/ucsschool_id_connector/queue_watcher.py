@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+Wake up queue tasks when files arrive in their directories.
+
+On Linux inotify is used through ``ctypes``, so no additional dependency is
+required. If inotify is not available, :py:class:`QueueWatcher` falls back to
+polling the directory in a fixed interval.
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+from pathlib import Path
+from typing import Callable, Optional
+
+import lazy_object_proxy
+
+from .constants import LOG_FILE_PATH_QUEUES
+from .utils import ConsoleAndFileLogging
+
+logger: logging.Logger = lazy_object_proxy.Proxy(
+    lambda: ConsoleAndFileLogging.get_logger(__name__, LOG_FILE_PATH_QUEUES)
+)
+
+# from /usr/include/linux/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_ONLYDIR
+
+
+class InotifyUnavailable(Exception):
+    pass
+
+
+def _load_libc() -> ctypes.CDLL:
+    libc_name = ctypes.util.find_library("c")
+    if not libc_name:
+        raise InotifyUnavailable("C library not found.")
+    libc = ctypes.CDLL(libc_name, use_errno=True)
+    if not hasattr(libc, "inotify_init1") or not hasattr(libc, "inotify_add_watch"):
+        raise InotifyUnavailable("C library has no inotify support.")
+    return libc
+
+
+class QueueWatcher:
+    """
+    Wait for files to be created in or moved into a queue directory.
+
+    :py:meth:`wait` returns when a file event was received (or in the polling
+    fallback after `poll_interval` seconds). After the first event it keeps
+    waiting until no further event arrived for `debounce` seconds (but at
+    most ``10 * debounce`` seconds), so that a burst of files (e.g. a user and
+    the groups it is member of) is handled as one batch.
+
+    :param Path path: directory to watch
+    :param float poll_interval: seconds between directory scans, if inotify is
+        not available
+    :param float debounce: seconds without new events before waking up
+    :param float idle_timeout: with inotify: wake up after this many seconds
+        even without events, as a safety net
+    :param ignore: optional callable, returns `True` for file names that
+        should not wake up the waiting task
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        poll_interval: float,
+        debounce: float = 0.0,
+        idle_timeout: float = 60.0,
+        ignore: Callable[[str], bool] = None,
+    ):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.idle_timeout = idle_timeout
+        self.ignore = ignore
+        self._event: Optional[asyncio.Event] = None
+        self._fd: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # set when inotify events were lost, reset by the queue after it rescanned its directory
+        self.events_lost = False
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._fd is not None
+
+    def start(self) -> None:
+        """
+        Start watching the directory. Must be called from within a running
+        event loop. Falls back to polling if inotify cannot be used.
+        """
+        if self._event is not None:
+            return
+        self._event = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        try:
+            self._fd = self._inotify_setup()
+        except (InotifyUnavailable, OSError) as exc:
+            logger.warning(
+                "Cannot watch %s with inotify, polling every %.1f seconds instead: %s",
+                self.path,
+                self.poll_interval,
+                exc,
+            )
+            self._fd = None
+            return
+        self._loop.add_reader(self._fd, self._read_events)
+        logger.debug("Watching %s with inotify.", self.path)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            try:
+                self._loop.remove_reader(self._fd)
+            except (RuntimeError, ValueError):
+                # event loop already closed
+                pass
+            os.close(self._fd)
+            self._fd = None
+        self._event = None
+        self._loop = None
+
+    def _inotify_setup(self) -> int:
+        libc = _load_libc()
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        wd = libc.inotify_add_watch(fd, os.fsencode(str(self.path)), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, f"{os.strerror(errno)}: {self.path!s}")
+        return fd
+
+    def _read_events(self) -> None:
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        except OSError as exc:
+            logger.error("Reading inotify events for %s: %s", self.path, exc)
+            self._event.set()
+            return
+        offset = 0
+        while offset + IN_EVENT_HEADER.size <= len(data):
+            _wd, mask, _cookie, length = IN_EVENT_HEADER.unpack_from(data, offset)
+            offset += IN_EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & (IN_Q_OVERFLOW | IN_DELETE_SELF | IN_IGNORED):
+                # events were lost or the directory is gone: let the queue rescan
+                self.events_lost = True
+                self._event.set()
+            elif name and not (self.ignore and self.ignore(name)):
+                self._event.set()
+
+    def notify(self) -> None:
+        """Wake up the waiting task (e.g. when a file was added from within this process)."""
+        if self._event is not None:
+            self._event.set()
+
+    async def _wait_for_event(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._event.clear()
+        return True
+
+    async def wait(self) -> bool:
+        """
+        Wait until files arrived in the watched directory.
+
+        :return: whether an event was received (`False` if woken up by the
+            polling interval or the idle timeout)
+        :rtype: bool
+        """
+        self.start()
+        if not self.uses_inotify:
+            if not await self._wait_for_event(self.poll_interval):
+                return False
+        elif not await self._wait_for_event(self.idle_timeout):
+            return False
+        if self.debounce > 0:
+            max_delay = 10 * self.debounce
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            while loop.time() - start < max_delay:
+                if not await self._wait_for_event(self.debounce):
+                    break
+        return True
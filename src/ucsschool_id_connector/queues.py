@@ -29,36 +29,105 @@
 
 import asyncio
 import datetime
+import heapq
+import itertools
 import os
 import shutil
+import time
+import zlib
+from collections import OrderedDict, deque
+from contextlib import aclosing
 from pathlib import Path
-from typing import AsyncIterator, Coroutine, Dict, Iterator, List, Optional, Set, TypeVar, cast
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+    cast,
+)
 
 import aiofiles
 import ujson
 from aiojobs._job import Job
 from aiojobs._scheduler import Scheduler
 
+from .circuit_breaker import CircuitBreaker
 from .config_storage import ConfigurationStorage
 from .constants import (
+    API_COMMUNICATION_ERROR_MIN_WAIT,
     API_COMMUNICATION_ERROR_WAIT,
+    AUTO_CHECK_INTERVAL,
+    DEAD_LETTER_INFO_SUFFIX,
     IN_QUEUE_DIR,
+    IN_QUEUE_POLL_INTERVAL,
+    IN_QUEUE_READY_BATCH_SIZE,
+    LISTENER_OBJECT_CACHE_SIZE,
     LOG_FILE_PATH_QUEUES,
+    OUT_QUEUE_BATCH_SIZE,
+    OUT_QUEUE_POLL_INTERVAL,
+    OUT_QUEUE_PRIORITY_WEIGHT,
+    OUT_QUEUE_RETRY_MAX_WAIT,
+    OUT_QUEUE_SETTINGS_TTL,
     OUT_QUEUE_TOP_DIR,
     OUT_QUEUE_TRASH_DIR,
+    PRIORITY_MARKER_DIR,
+    PRIORITY_MARKER_TTL,
+    PRIORITY_NORMAL,
+    QUEUE_SCAN_BATCH_SIZE,
+    UCRV_IN_QUEUE_DEBOUNCE,
+    UCRV_IN_QUEUE_PREPROCESS_CONCURRENCY,
+    UCRV_OUT_QUEUE_BACKEND,
+    UCRV_OUT_QUEUE_COALESCE,
+    UCRV_OUT_QUEUE_DEBOUNCE,
+    UCRV_OUT_QUEUE_HIGH_WATERMARK,
+    UCRV_OUT_QUEUE_LOW_WATERMARK,
+    UCRV_OUT_QUEUE_MAX_ATTEMPTS,
+    UCRV_OUT_QUEUE_RETRY_WAIT,
+    UCRV_OUT_QUEUE_WORKERS,
 )
+from .durable_files import get_group_commit, write_file_atomic
 from .models import (
+    DeadLetter,
     ListenerAddModifyObject,
+    ListenerGroupAddModifyObject,
     ListenerObject,
     ListenerRemoveObject,
+    ListenerUserAddModifyObject,
+    NoObjectError,
     QueueModel,
     SchoolAuthorityConfiguration,
 )
 from .plugins import filter_plugins, plugin_manager
-from .requests import APICommunicationError, ServerError
-from .utils import ConsoleAndFileLogging
+from .queue_backends import (
+    BACKEND_SQLITE,
+    DirectoryQueueBackend,
+    OverflowStore,
+    QueueBackend,
+    QueueEntry,
+    SQLiteQueueBackend,
+    export_sqlite_db,
+    iter_queue_dir,
+    list_queue_dir,
+    scan_queue_dir,
+)
+from .queue_watcher import QueueWatcher
+from .requests import APICommunicationError, APIRequestError, ServerError, is_communication_error
+from .utils import ConsoleAndFileLogging, get_ucrv_bool, get_ucrv_int, get_ucrv_str
 
 FileQueueTV = TypeVar("FileQueueTV", bound="FileQueue")
+# tuples from OutQueue.sorted_queue_files() or OutQueue.due_queue_files(), ending with the path
+QueueItem = TypeVar("QueueItem", bound=Tuple[Any, ...])
 
 
 class InvalidListenerFile(Exception):
@@ -73,6 +142,89 @@ class ListenerSavingError(Exception):
     pass
 
 
+class QueueCounters:
+    """
+    Number and age of the items in a queue. Updated when items are added and
+    removed, so status requests don't have to list the queue directory.
+    """
+
+    def __init__(self) -> None:
+        self._enqueued: Dict[str, float] = {}
+        # (enqueued, name), removed items are dropped when they reach the top
+        self._heap: List[Tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._enqueued)
+
+    def add(self, name: str, enqueued: float = None) -> None:
+        enqueued = enqueued or time.time()
+        self._enqueued[name] = enqueued
+        heapq.heappush(self._heap, (enqueued, name))
+
+    def remove(self, name: str) -> None:
+        self._enqueued.pop(name, None)
+
+    def rename(self, name: str, new_name: str) -> None:
+        enqueued = self._enqueued.pop(name, None)
+        if enqueued is not None:
+            self.add(new_name, enqueued)
+
+    def reset(self, items: Iterable[Tuple[str, float]]) -> None:
+        """Replace the counted items with `(name, enqueued)` tuples, e.g. after listing the queue."""
+        self._enqueued = dict(items)
+        self._heap = [(enqueued, name) for name, enqueued in self._enqueued.items()]
+        heapq.heapify(self._heap)
+
+    def oldest(self) -> Optional[float]:
+        """Timestamp of the oldest item, `None` if the queue is empty."""
+        while self._heap:
+            enqueued, name = self._heap[0]
+            if self._enqueued.get(name) == enqueued:
+                return enqueued
+            heapq.heappop(self._heap)
+        return None
+
+
+class InQueueCounters:
+    """
+    Number and age of the files in the in-queue, in constant memory. The
+    listener adds files from another process, so they are counted when a
+    preprocessing pass finds them (see :py:meth:`InQueue.count_new_files`).
+    The age is that of the oldest file since the queue was last empty.
+    """
+
+    def __init__(self) -> None:
+        self._length = 0
+        self._oldest: Optional[float] = None
+
+    def __len__(self) -> int:
+        return self._length
+
+    def add(self, name: str, enqueued: float = None) -> None:
+        if not self._length:
+            self._oldest = enqueued or time.time()
+        self._length += 1
+
+    def remove(self, name: str) -> None:
+        if not name.lower().endswith(".json"):
+            # discarded invalid files were never counted
+            return
+        self._length = max(0, self._length - 1)
+        if not self._length:
+            self._oldest = None
+
+    def rename(self, name: str, new_name: str) -> None:
+        pass
+
+    def reset(self, length: int, oldest: Optional[float]) -> None:
+        self._length = length
+        self._oldest = oldest if length else None
+
+    def oldest(self) -> Optional[float]:
+        """Timestamp of the oldest file, `None` if the queue is empty."""
+        return self._oldest
+
+
 class FileQueue:
     name: str
     path: Path
@@ -81,6 +233,10 @@ class FileQueue:
     school_authority: SchoolAuthorityConfiguration = None
     school_authority_mapping: Dict[str, str] = {}
     task: Job = None
+    poll_interval = IN_QUEUE_POLL_INTERVAL
+    debounce_ucrv = UCRV_IN_QUEUE_DEBOUNCE
+    listener_object_cache_size = LISTENER_OBJECT_CACHE_SIZE
+    counters_class = QueueCounters
 
     def __init__(self, name: str = None, path: Path = None) -> None:
         self.name = name or self.name
@@ -89,6 +245,14 @@ class FileQueue:
             raise TypeError("Arguments 'name' and 'path' are required.")
         self.trash_dir = self.path / "trash"
         self.keep_dir = self.path / "keep"
+        self.watcher: Optional[QueueWatcher] = None
+        # names of files this process replaces in the queue directory, their events are ignored
+        self._own_writes: Set[str] = set()
+        self.counters = self.counters_class()
+        # path -> ((st_mtime_ns, st_size), obj), least recently used first
+        self._listener_objects: "OrderedDict[str, Tuple[Tuple[int, int], ListenerObject]]" = (
+            OrderedDict()
+        )
         self._deleted = False
         self.logger = ConsoleAndFileLogging.get_logger(
             f"{self.__class__.__name__}({self.name})", LOG_FILE_PATH_QUEUES
@@ -108,7 +272,7 @@ class FileQueue:
             pass
 
     def __len__(self) -> int:
-        return len(list(self.queue_files()))
+        return len(self.counters)
 
     def __repr__(self):
         return f"{self.__class__.__name__}(name={self.name!r})"
@@ -121,19 +285,39 @@ class FileQueue:
         :return: list of paths
         :rtype: list[Path]
         """
-        res = []
-        with cast(Iterator[os.DirEntry], os.scandir(path or self.path)) as dir_entries:
-            for entry in dir_entries:
-                if entry.is_dir() and entry.name in ("keep", "trash"):
-                    continue
-                if not entry.is_file() or not entry.name.lower().endswith(".json"):
-                    self.logger.warning("Non-JSON file found in queue %r: %r.", self.name, entry.name)
-                    self.discard_file(Path(entry.path))
-                    continue
-                res.append(Path(entry.path))
-        res.sort()
+        res, invalid = list_queue_dir(path or self.path)
+        self.discard_invalid_files(invalid)
         return res
 
+    def iter_queue_files(
+        self, name_filter: Callable[[str], bool] = None, batch_size: int = QUEUE_SCAN_BATCH_SIZE
+    ) -> Iterator[Path]:
+        """
+        Iterate over the JSON files in :py:attr:`self.path`, sorted by
+        filename. The directory is scanned for the next `batch_size` files
+        when the previous ones have been consumed, so memory usage doesn't
+        depend on the length of the queue. Files added during the iteration
+        are included, if their name is larger than that of the last file.
+
+        :param callable name_filter: if set, only files for whose name it
+            returns `True` are returned
+        :param int batch_size: number of files to list per directory scan
+        :return: iterator of paths
+        """
+        after = ""
+        while True:
+            batch, invalid = scan_queue_dir(self.path, batch_size, after, name_filter)
+            self.discard_invalid_files(invalid)
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            after = batch[-1].name
+
+    def discard_invalid_files(self, paths: List[Path]) -> None:
+        for invalid_path in paths:
+            self.logger.warning("Non-JSON file found in queue %r: %r.", self.name, invalid_path.name)
+            self.discard_file(invalid_path)
+
     @classmethod
     async def load_school_authority_mapping(cls) -> Dict[str, str]:
         """May raise SchoolMappingLoadingError."""
@@ -142,11 +326,23 @@ class FileQueue:
         cls.school_authority_mapping.update({k.lower(): v for k, v in mapping_obj.mapping.items()})
         return cls.school_authority_mapping
 
+    def sync_counters(self) -> None:
+        """Reset :py:attr:`counters` to the files in the queue directory."""
+        items = []
+        for entry in iter_queue_dir(self.path):
+            try:
+                items.append((entry.name, entry.stat().st_mtime))
+            except FileNotFoundError:
+                pass
+        self.counters.reset(items)
+
     def as_queue_model(self):
+        oldest = self.counters.oldest()
         return QueueModel(
             name=self.name,
             head=self.head,
             length=len(self),
+            oldest_entry_age=max(0, int(time.time() - oldest)) if oldest else 0,
             school_authority=self.school_authority.name if self.school_authority else "",
         )
 
@@ -170,6 +366,58 @@ class FileQueue:
             await self.task.close()
         else:
             self.logger.info("No task running for me.")
+        self.stop_watching()
+
+    def ignore_file_event(self, name: str) -> bool:
+        """Whether a file appearing in the queue directory should *not* wake up the queue task."""
+        if name in self._own_writes:
+            self._own_writes.discard(name)
+            return True
+        return not name.lower().endswith(".json")
+
+    async def wait_for_changes(self, timeout: float = None) -> bool:
+        """
+        Sleep until new files arrive in the queue directory.
+
+        Uses inotify if available, else polls every
+        :py:attr:`poll_interval` seconds. If inotify events were lost, the
+        counters are synchronized with the queue directory.
+
+        :param float timeout: wake up after this many seconds at the latest
+        :return: whether new files were detected (`False` on timeout)
+        :rtype: bool
+        """
+        if self.watcher is None:
+            self.watcher = QueueWatcher(
+                self.path,
+                poll_interval=self.poll_interval,
+                debounce=get_ucrv_int(*self.debounce_ucrv) / 1000,
+                idle_timeout=AUTO_CHECK_INTERVAL,
+                ignore=self.ignore_file_event,
+            )
+        if timeout is None:
+            changed = await self.watcher.wait()
+        else:
+            try:
+                changed = await asyncio.wait_for(self.watcher.wait(), timeout)
+            except asyncio.TimeoutError:
+                changed = False
+        if self.watcher and self.watcher.events_lost:
+            self.logger.warning("Missed changes in queue directory %s, rescanning it.", self.path)
+            self.watcher.events_lost = False
+            self._own_writes.clear()
+            self.sync_counters()
+        return changed
+
+    def notify_new_files(self) -> None:
+        """Wake up the queue task, used when files are added from within this process."""
+        if self.watcher:
+            self.watcher.notify()
+
+    def stop_watching(self) -> None:
+        if self.watcher:
+            self.watcher.close()
+            self.watcher = None
 
     async def delete_queue(self):
         try:
@@ -182,40 +430,96 @@ class FileQueue:
         target_dir = OUT_QUEUE_TRASH_DIR / f"{timestamp}.{self.path.name}"
         # Bug in shutil.move(): https://bugs.python.org/issue32689
         shutil.move(str(self.path), str(target_dir))
+        self.stop_watching()
         self._deleted = True
         self.logger.info("Moved directory %s to %s.", self.path, target_dir)
 
     def discard_file(self, path: Path) -> None:
+        self.uncache_listener_object(path)
+        self.counters.remove(path.name)
         self.logger.info("Moving %s to trash...", path.name)
         try:
-            # Bug in shutil.move(): https://bugs.python.org/issue32689
-            shutil.move(str(path), str(self.trash_dir))
+            self.move_file(path, self.trash_dir)
         except FileNotFoundError:
             pass
         except (IOError, OSError) as exc:
             self.logger.error("Moving the file to trash: %s", exc)
             try:
-                path.unlink()
+                self.remove_file(path)
             except (IOError, OSError, FileNotFoundError) as exc:
                 self.logger.error("Deleting the file: %s", exc)
 
     def keep_file(self, path: Path) -> None:
+        self.uncache_listener_object(path)
+        self.counters.remove(path.name)
         self.logger.info("Moving %s to 'keep' directory...", path.name)
         try:
-            shutil.move(str(path), str(self.keep_dir))
+            self.move_file(path, self.keep_dir)
         except (FileNotFoundError, IOError, OSError) as exc:
             self.logger.error("Moving the file to 'keep' directory: %s", exc)
 
+    def move_file(self, path: Path, target_dir: Path) -> None:
+        # Bug in shutil.move(): https://bugs.python.org/issue32689
+        shutil.move(str(path), str(target_dir))
+
+    def remove_file(self, path: Path) -> None:
+        path.unlink()
+
+    def file_version(self, path: Path) -> Optional[Tuple[int, int]]:
+        """Value that changes when the file at `path` is replaced or modified."""
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    async def read_listener_file(self, path: Path) -> str:
+        async with aiofiles.open(path, "r") as fp:
+            return await fp.read()
+
+    def cache_listener_object(self, path: Path, obj: ListenerObject) -> None:
+        """
+        Remember the object parsed from (or saved to) `path`, so that
+        :py:meth:`load_listener_file` does not have to parse the file again.
+        The entry is valid as long as :py:meth:`file_version` does not change.
+
+        Cached objects are shared, they must not be modified after being
+        handed to an out queue.
+        """
+        version = self.file_version(path)
+        if version is None:
+            return
+        key = str(path)
+        self._listener_objects[key] = (version, obj)
+        self._listener_objects.move_to_end(key)
+        while len(self._listener_objects) > self.listener_object_cache_size:
+            self._listener_objects.popitem(last=False)
+
+    def uncache_listener_object(self, path: Path) -> None:
+        self._listener_objects.pop(str(path), None)
+
     async def load_listener_file(self, path: Path) -> ListenerObject:
+        key = str(path)
+        version = self.file_version(path)
+        try:
+            cached_version, obj = self._listener_objects[key]
+        except KeyError:
+            pass
+        else:
+            if version is not None and version == cached_version:
+                self._listener_objects.move_to_end(key)
+                return obj
+            del self._listener_objects[key]
         try:
-            async with aiofiles.open(path, "r") as fp:
-                obj_dict = ujson.loads(await fp.read())
+            obj_dict = ujson.loads(await self.read_listener_file(path))
         except (IOError, OSError, ValueError) as exc:
             self.logger.error("Loading %s: %s", path, exc)
             raise ListenerLoadingError(f"Loading {path.name} -> {exc}")
         listener_objects = plugin_manager.hook.get_listener_object(obj_dict=obj_dict)
         for obj in listener_objects:
             if obj:
+                if version is not None:
+                    self.cache_listener_object(path, obj)
                 return obj
         else:
             raise ListenerLoadingError(
@@ -224,6 +528,9 @@ class FileQueue:
             )
 
     async def save_listener_file(self, obj: ListenerObject, path: Path) -> None:
+        if self.watcher and self.watcher.uses_inotify and path.parent == self.path:
+            # the file is replaced by renaming a temporary file, don't wake up for that
+            self._own_writes.add(path.name)
         try:
             hook_coros = plugin_manager.hook.save_listener_object(obj=obj, path=path)
             success = False
@@ -236,8 +543,10 @@ class FileQueue:
                 else:
                     success |= await coro
             if not success:
+                self._own_writes.discard(path.name)
                 raise ListenerSavingError(f"No 'save_listener_object' hook saved {obj!r}.")
         except (OSError, ValueError) as exc:
+            self._own_writes.discard(path.name)
             self.logger.exception("Saving obj to %s: %s\nobj=%r", path.name, exc, obj.dict())
             raise ListenerSavingError(f"{path.name} -> {exc}")
 
@@ -251,6 +560,7 @@ class FileQueue:
 class InQueue(FileQueue):
     name = "InQueue"
     path = IN_QUEUE_DIR
+    counters_class = InQueueCounters
 
     def __init__(
         self,
@@ -262,25 +572,85 @@ class InQueue(FileQueue):
         self.logger.name = self.name
         self.out_queues = out_queues or []
         self._old_out_queues = {q.name for q in self.out_queues}
+        # held during a preprocessing pass, maintenance holds it to pause preprocessing
+        self.preprocess_lock = asyncio.Lock()
 
     @property
     def school_authority_names(self) -> List[str]:
         return [q.school_authority.name for q in self.out_queues]
 
+    def ignore_file_event(self, name: str) -> bool:
+        # files renamed by preprocess_file() are distributed in the same pass
+        return super(InQueue, self).ignore_file_event(name) or name.endswith("_ready.json")
+
+    def sync_counters(self) -> None:
+        """
+        Count the preprocessed files in the queue directory, at startup and
+        when changes were missed. The other files are counted by
+        :py:meth:`count_new_files` when the next pass finds them.
+        """
+        length = 0
+        oldest_name = ""
+        for entry in iter_queue_dir(self.path):
+            if entry.name.endswith("_ready.json"):
+                length += 1
+                if not oldest_name or entry.name < oldest_name:
+                    oldest_name = entry.name
+        oldest = None
+        if oldest_name:
+            try:
+                oldest = (self.path / oldest_name).stat().st_mtime
+            except FileNotFoundError:
+                pass
+        self.counters.reset(length, oldest)
+
+    def count_new_files(self, paths: Iterable[Path]) -> Iterator[Path]:
+        """Count the files of `paths`, the files a preprocessing pass found."""
+        for path in paths:
+            enqueued = None
+            if not len(self.counters):
+                try:
+                    enqueued = path.stat().st_mtime
+                except FileNotFoundError:
+                    pass
+            self.counters.add(path.name, enqueued)
+            yield path
+
     async def preprocess_file(self, path: Path) -> Path:
         """
         Purging invalid files, storing and retrieving UUIDs and password
-        hashes.
+        hashes. The file is preprocessed as a batch of its own.
 
         :param Path path: path of listener file to analyze
         :return: new path if file was precessed successfully
         :raises InvalidListenerFile: if file contains invalid/incomplete data
         """
+        obj = await self.load_file_to_preprocess(path)
+        await asyncio.gather(*plugin_manager.hook.preprocess_pass_start())
         try:
-            obj = await self.load_listener_file(path)
+            await self.preprocess_object(obj, path)
+        finally:
+            await asyncio.gather(*plugin_manager.hook.preprocess_pass_end())
+        return self.mark_file_ready(path, obj)
+
+    async def load_file_to_preprocess(self, path: Path) -> ListenerObject:
+        """
+        :raises InvalidListenerFile: if file contains invalid/incomplete data
+        """
+        # always start with a freshly parsed object, the hooks modify it
+        self.uncache_listener_object(path)
+        try:
+            return await self.load_listener_file(path)
         except ListenerLoadingError as exc:
             raise InvalidListenerFile(str(exc))
 
+    async def preprocess_object(self, obj: ListenerObject, path: Path) -> None:
+        """
+        Run the preprocessing hooks on `obj` and save it back to `path` if
+        they modified it.
+
+        :raises InvalidListenerFile: if `obj` could not be saved
+        """
         changed = False
         if isinstance(obj, ListenerAddModifyObject):
             result_coros: List[Coroutine] = plugin_manager.hook.preprocess_add_mod_object(obj=obj)
@@ -298,12 +668,104 @@ class InQueue(FileQueue):
             except ListenerSavingError as exc:
                 raise InvalidListenerFile(str(exc))
 
+    def mark_file_ready(self, path: Path, obj: ListenerObject) -> Path:
+        """Rename preprocessed file to `*_ready.json`, so it will be distributed."""
         *dirs, name = path.parts
         name = name.rsplit(".", 1)[0]
         new_path = Path(*dirs, f"{name}_ready.json")
         path.rename(new_path)
+        self.counters.rename(path.name, new_path.name)
+        # distribute() will use the preprocessed object instead of loading the file again
+        self.uncache_listener_object(path)
+        self.cache_listener_object(new_path, obj)
         return new_path
 
+    @property
+    def preprocess_concurrency(self) -> int:
+        return max(1, get_ucrv_int(*UCRV_IN_QUEUE_PREPROCESS_CONCURRENCY))
+
+    async def preprocess_files(
+        self, paths: Iterable[Path]
+    ) -> AsyncIterator[Tuple[Path, Awaitable[ListenerObject]]]:
+        """
+        Preprocess up to :py:attr:`preprocess_concurrency` files concurrently.
+
+        Files of the same object (entryUUID) are preprocessed one after
+        another, as the hooks store and retrieve data of previous changes.
+        The results are yielded in the order of `paths`. The files are not
+        renamed, see :py:meth:`mark_files_ready`.
+
+        :param paths: listener files, sorted by filename
+        :return: async iterator of tuples `(path, awaitable)`, awaiting the
+            awaitable returns the preprocessed object or raises the
+            preprocessing error
+        """
+        concurrency = self.preprocess_concurrency
+        semaphore = asyncio.Semaphore(concurrency)
+        last_task_of_object: Dict[str, asyncio.Task] = {}
+        # (path, preprocessing task or error, entryUUID)
+        pending: Deque[Tuple[Path, Union[asyncio.Task, InvalidListenerFile], str]] = deque()
+
+        async def _preprocess(
+            path: Path, obj: ListenerObject, previous: Optional[asyncio.Task]
+        ) -> ListenerObject:
+            if previous:
+                await asyncio.wait([previous])
+            async with semaphore:
+                await self.preprocess_object(obj, path)
+            return obj
+
+        async def _result(task: Union[asyncio.Task, InvalidListenerFile]) -> ListenerObject:
+            if isinstance(task, InvalidListenerFile):
+                raise task
+            return await task
+
+        def _next() -> Tuple[Path, Awaitable[ListenerObject]]:
+            path, task, entry_uuid = pending.popleft()
+            if last_task_of_object.get(entry_uuid) is task:
+                # no later file of the object is pending, keep memory usage bounded
+                del last_task_of_object[entry_uuid]
+            return path, _result(task)
+
+        try:
+            for path in paths:
+                try:
+                    obj = await self.load_file_to_preprocess(path)
+                except InvalidListenerFile as exc:
+                    pending.append((path, exc, ""))
+                else:
+                    task = asyncio.ensure_future(_preprocess(path, obj, last_task_of_object.get(obj.id)))
+                    last_task_of_object[obj.id] = task
+                    pending.append((path, task, obj.id))
+                while len(pending) > 2 * concurrency:
+                    yield _next()
+            while pending:
+                yield _next()
+        finally:
+            for _, task, _ in pending:
+                if isinstance(task, asyncio.Task):
+                    task.cancel()
+
+    async def mark_files_ready(self, files: List[Tuple[int, Path, ListenerObject]]) -> None:
+        """
+        End a batch of preprocessed `files` (and empty the list): the data the
+        preprocessing hooks collected is stored first, then the files are
+        renamed to `*_ready.json`. So no file is distributed before its data
+        is stored, even after a crash.
+
+        :param list files: tuples `(num, path, obj)`, `num` is the position of
+            the file in the pass
+        """
+        await asyncio.gather(*plugin_manager.hook.preprocess_pass_end())
+        try:
+            for num, path, obj in files:
+                new_path = self.mark_file_ready(path, obj)
+                self.logger.info(
+                    "(%d/%d) %s preprocessed -> %s.", num, len(self), path.name, new_path.name
+                )
+        finally:
+            files.clear()
+
     async def distribute_loop(self) -> None:
         """
         Main loop of in queue task: only preprocessing of JSON files. The
@@ -317,71 +779,83 @@ class InQueue(FileQueue):
             )
         else:
             self.logger.warning("No out queues configured!")
+        self.sync_counters()
         while True:
-            queue_files = [p for p in self.queue_files() if not p.name.endswith("_ready.json")]
-            for num, path in enumerate(
-                queue_files,
-                start=1,
-            ):
+            queue_files = self.count_new_files(
+                self.iter_queue_files(lambda name: not name.endswith("_ready.json"))
+            )
+            num = 0
+            # preprocessed files, marked ready when the data of their batch is stored
+            finished: List[Tuple[int, Path, ListenerObject]] = []
+            async with self.preprocess_lock:
+                await asyncio.gather(*plugin_manager.hook.preprocess_pass_start())
                 try:
-                    new_path = await self.preprocess_file(path)
-                    self.logger.info(
-                        "(%d/%d) %s preprocessed -> %s.",
-                        num,
-                        len(queue_files),
-                        path.name,
-                        new_path.name,
-                    )
-                except InvalidListenerFile as exc:
-                    self.logger.info(
-                        "(%d/%d) Discarding invalid file %r: %s",
-                        num,
-                        len(queue_files),
-                        path.name,
-                        exc,
-                    )
-                    self.discard_file(path)
-                    continue
-                except ListenerSavingError as exc:
-                    self.logger.error(
-                        "(%d/%d) Could not save file %r: %s",
-                        num,
-                        len(queue_files),
-                        path.name,
-                        exc,
-                    )
-                    self.discard_file(path)
-                    continue
-                except Exception as exc:
-                    self.logger.exception(
-                        "During preprocessing of file (%d/%d) %r: %s",
-                        num,
-                        len(queue_files),
-                        path.name,
-                        exc,
-                    )
-                    raise InvalidListenerFile("Error during preprocessing.") from exc
+                    async with aclosing(self.preprocess_files(queue_files)) as preprocessed_files:
+                        async for path, preprocessed in preprocessed_files:
+                            num += 1
+                            try:
+                                obj = await preprocessed
+                            except InvalidListenerFile as exc:
+                                self.logger.info(
+                                    "(%d/%d) Discarding invalid file %r: %s",
+                                    num,
+                                    len(self),
+                                    path.name,
+                                    exc,
+                                )
+                                self.discard_file(path)
+                                continue
+                            except ListenerSavingError as exc:
+                                self.logger.error(
+                                    "(%d/%d) Could not save file %r: %s",
+                                    num,
+                                    len(self),
+                                    path.name,
+                                    exc,
+                                )
+                                self.discard_file(path)
+                                continue
+                            except Exception as exc:
+                                self.logger.exception(
+                                    "During preprocessing of file (%d/%d) %r: %s",
+                                    num,
+                                    len(self),
+                                    path.name,
+                                    exc,
+                                )
+                                raise InvalidListenerFile("Error during preprocessing.") from exc
+                            finished.append((num, path, obj))
+                            if len(finished) >= IN_QUEUE_READY_BATCH_SIZE:
+                                await self.mark_files_ready(finished)
+                                await asyncio.gather(*plugin_manager.hook.preprocess_pass_start())
+                finally:
+                    await self.mark_files_ready(finished)
             self.log_queue_changes()
             if self.out_queues:
                 # Distribute only if out queues exist. Prevents deleting queue
                 # files without consumers (out queues).
                 await self.distribute()
 
-            await asyncio.sleep(1)
+            await self.wait_for_changes()
             self._signal_alive()
 
-    async def distribute(self, queue_paths: List[Path] = None) -> None:  # noqa: C901
+    async def distribute(self, queue_paths: Iterable[Path] = None) -> None:  # noqa: C901
         """
-        Search for JSON files, extract school authorities and copy files to
-        the respective out queues.
+        Search for JSON files, extract school authorities and link (or copy)
+        files to the respective out queues.
 
-        :param list(Path) queue_paths: optional list of paths to look in for
-            JSON files
+        :param queue_paths: optional paths to look in for JSON files
         :return: None
         """
-        queue_paths = queue_paths or [p for p in self.queue_files() if p.name.endswith("_ready.json")]
+        queue_paths = queue_paths or self.iter_queue_files(lambda name: name.endswith("_ready.json"))
         s_a_name_to_out_queue = dict((q.school_authority.name, q) for q in self.out_queues)
+        priority_markers = self.priority_markers()
+        group_commit = get_group_commit()
+        # files are removed once their copies in the out queues are synced to disk
+        distributed: List[Path] = []
         for path in queue_paths:
+            if distributed and group_commit.due():
+                await self.remove_distributed_files(distributed)
             self.head = path.name
             try:
                 obj = await self.load_listener_file(path)
@@ -409,7 +883,7 @@ class InQueue(FileQueue):
                 s_a_names,
                 obj,
             )
-            # copy listener file to out queues for affected school authorities
+            # link listener file to out queues for affected school authorities
             if not s_a_names:
                 self.logger.info(
                     "Ignoring object without current or previous school authority "
@@ -419,6 +893,7 @@ class InQueue(FileQueue):
                 )
                 self.discard_file(path)
                 continue
+            priority = self.object_priority(path, obj, priority_markers)
             for s_a_name in s_a_names:
                 try:
                     out_queue = s_a_name_to_out_queue[s_a_name]
@@ -430,18 +905,83 @@ class InQueue(FileQueue):
                         obj.id,
                     )
                     continue
-                shutil.copy2(str(path), str(out_queue.path))
+                if out_queue.must_spill(obj, priority):
+                    out_queue.spill(path, obj, priority)
+                    self.logger.info(
+                        "Spilled %r to the overflow store of out queue %r.", path.name, out_queue.name
+                    )
+                    continue
+                linked = out_queue.enqueue_file(path, obj, priority)
                 self.logger.info(
-                    "Copied %r to out queue %r (%s).",
+                    "%s %r to out queue %r (%s).",
+                    "Linked" if linked else "Copied",
                     path.name,
                     out_queue.name,
                     "active" if out_queue.school_authority.active else "deactivated",
                 )
+            if priority != PRIORITY_NORMAL:
+                del priority_markers[obj.id]
+                (PRIORITY_MARKER_DIR / obj.id).unlink(missing_ok=True)
+            self.uncache_listener_object(path)
+            self.counters.remove(path.name)
+            distributed.append(path)
+        await self.remove_distributed_files(distributed)
+        self.head = ""
+
+    @staticmethod
+    async def remove_distributed_files(paths: List[Path]) -> None:
+        """
+        Remove the distributed files `paths` (and empty the list), after
+        waiting for their copies in the out queues to be synced to disk.
+        """
+        await get_group_commit().sync()
+        for path in paths:
             try:
                 path.unlink()
             except FileNotFoundError:
                 pass
-        self.head = ""
+        paths.clear()
+
+    def priority_markers(self) -> Dict[str, Tuple[int, float]]:
+        """
+        Priorities requested for objects (e.g. by `schedule_user`) with
+        :py:func:`ucsschool_id_connector.utils.write_priority_marker`. Expired
+        markers are removed.
+
+        :return: dict entryUUID -> (priority, time of the request)
+        :rtype: dict
+        """
+        markers: Dict[str, Tuple[int, float]] = {}
+        try:
+            dir_entries = cast(Iterator[os.DirEntry], os.scandir(PRIORITY_MARKER_DIR))
+        except FileNotFoundError:
+            return markers
+        now = time.time()
+        with dir_entries:
+            for entry in dir_entries:
+                try:
+                    requested = entry.stat().st_mtime
+                    if requested + PRIORITY_MARKER_TTL < now:
+                        os.unlink(entry.path)
+                        continue
+                    markers[entry.name] = (int(Path(entry.path).read_text()), requested)
+                except (OSError, ValueError):
+                    continue
+        return markers
+
+    @staticmethod
+    def object_priority(path: Path, obj: ListenerObject, markers: Dict[str, Tuple[int, float]]) -> int:
+        """
+        Priority of the change of `obj` in `path`. Changes created before the
+        priority was requested keep the normal priority.
+        """
+        try:
+            priority, requested = markers[obj.id]
+            if path.stat().st_mtime < requested:
+                return PRIORITY_NORMAL
+        except (KeyError, OSError):
+            return PRIORITY_NORMAL
+        return priority
 
     def log_queue_changes(self) -> None:
         current_queues = {q.name for q in self.out_queues}
@@ -456,6 +996,8 @@ class InQueue(FileQueue):
 
 class OutQueue(FileQueue):
     queue_sort_order = ("users/user", "groups/group")
+    poll_interval = OUT_QUEUE_POLL_INTERVAL
+    debounce_ucrv = UCRV_OUT_QUEUE_DEBOUNCE
 
     def __init__(
         self,
@@ -465,96 +1007,836 @@ class OutQueue(FileQueue):
     ) -> None:
         super(OutQueue, self).__init__(name, path)
         self.school_authority = school_authority
+        # UCR variable -> value of this queue, see setting()
+        self._settings: Dict[str, Union[bool, int, str]] = {}
+        self._settings_read = 0.0
+        self.backend = self.create_backend()
+        self.sync_counters()
+        self.circuit_breaker = CircuitBreaker(
+            self.name, API_COMMUNICATION_ERROR_MIN_WAIT, API_COMMUNICATION_ERROR_WAIT, self.logger
+        )
+        # set when high priority files arrive, to interrupt the handling of normal priority files
+        self.priority_pending = False
+        self._priority_streak = 0
+        self.overflow = OverflowStore(self.path, self.logger)
+        # set while the in-queue spills files to the overflow store
+        self._pressure = len(self.overflow) > 0
         # TODO: project specific handler class? GroupHandler?:
 
-    async def udm_object_queue_order(self, path: Path) -> int:
+    def create_backend(self) -> QueueBackend:
         """
-        Return index of UDM object type in `self.queue_sort_order`, for use as
-        `key` argument in `list.sort()`.
+        Create the storage backend configured with the app setting
+        `out_queue_backend`. Items stored by the other backend are migrated.
+        """
+        if get_ucrv_str(*UCRV_OUT_QUEUE_BACKEND, queue_name=self.name) == BACKEND_SQLITE:
+            backend = SQLiteQueueBackend(self.path, self.logger, self.object_type_queue_order)
+            backend.import_directory()
+            return backend
+        export_sqlite_db(self.path, self.logger)
+        return DirectoryQueueBackend(self.path, self.logger)
+
+    def setting(
+        self, get_ucrv: Callable[..., Union[bool, int, str]], ucrv: Tuple[str, Any]
+    ) -> Union[bool, int, str]:
+        """
+        App setting `ucrv` of this queue, read with `get_ucrv` (e.g.
+        :py:func:`get_ucrv_int`). The values are kept for
+        `OUT_QUEUE_SETTINGS_TTL` seconds, as they are needed for every item.
+        """
+        now = time.monotonic()
+        if now - self._settings_read > OUT_QUEUE_SETTINGS_TTL:
+            self._settings.clear()
+            self._settings_read = now
+        try:
+            return self._settings[ucrv[0]]
+        except KeyError:
+            value = self._settings[ucrv[0]] = get_ucrv(*ucrv, queue_name=self.name)
+            return value
+
+    def sync_counters(self) -> None:
+        """Read the items of the backend, at startup and when changes were missed."""
+        self.backend.rescan()
+        self.counters.reset(self.backend.enqueued_times())
+
+    def as_queue_model(self) -> QueueModel:
+        model = super(OutQueue, self).as_queue_model()
+        model.overflow = len(self.overflow)
+        high_watermark = self.high_watermark
+        model.alarm = model.overflow > 0 or bool(high_watermark and model.length >= high_watermark)
+        return model
+
+    @property
+    def high_watermark(self) -> int:
+        return max(0, self.setting(get_ucrv_int, UCRV_OUT_QUEUE_HIGH_WATERMARK))
+
+    @property
+    def low_watermark(self) -> int:
+        low_watermark = self.setting(get_ucrv_int, UCRV_OUT_QUEUE_LOW_WATERMARK)
+        return max(0, min(low_watermark, self.high_watermark))
+
+    def under_pressure(self) -> bool:
+        """
+        Whether the in-queue spills new files to the overflow store instead
+        of adding them to the queue. Starts when the queue reaches its high
+        watermark, ends when :py:meth:`refill` moved all spilled files back
+        into the queue.
+        """
+        if not self._pressure:
+            high_watermark = self.high_watermark
+            if high_watermark and len(self) >= high_watermark:
+                self._pressure = True
+                self.logger.warning(
+                    "Out queue %r reached its high watermark (%d items), spilling new items to %s.",
+                    self.name,
+                    high_watermark,
+                    self.overflow.db_path,
+                )
+        return self._pressure
+
+    def must_spill(self, obj: ListenerObject, priority: int = PRIORITY_NORMAL) -> bool:
+        """
+        Whether the in-queue must spill the change of `obj` to the overflow
+        store. High priority changes are only spilled if a change of the same
+        object is stored there already, to keep the order of its changes.
+        """
+        if not self.under_pressure():
+            return False
+        return priority == PRIORITY_NORMAL or self.overflow.has_object(obj.id)
+
+    def spill(self, path: Path, obj: ListenerObject, priority: int = PRIORITY_NORMAL) -> None:
+        """
+        Store the listener file `path` of the in-queue and its already loaded
+        object `obj` in the overflow store. If coalescing is enabled, a
+        spilled change of the same object is replaced (see
+        :py:meth:`coalesce`).
         """
-        obj = await self.load_listener_file(path)
+        key = obj.id if self.coalesce_enabled and obj.id else path.name
+        self.overflow.spill(key, path.name, path.read_text(), self.queue_entry(obj, priority=priority))
+        self.notify_new_files()
+
+    def refill(self) -> int:
+        """
+        Move spilled files back into the queue, once it is below its low
+        watermark. At most as many files are moved as fit below the high
+        watermark. The pressure is lifted when the overflow store is empty.
+
+        :return: number of moved files
+        :rtype: int
+        """
+        if not self._pressure:
+            return 0
+        length = len(self)
+        high_watermark = self.high_watermark
+        if high_watermark and length > self.low_watermark:
+            return 0
+        items = self.overflow.peek(max(0, high_watermark - length) if high_watermark else None)
+        for _, name, data, entry in items:
+            self.backend.add(name, data, entry)
+            self.counters.add(name, entry.enqueued)
+        if items:
+            # the items must be on disk in the queue before they are removed from the overflow store
+            get_group_commit().flush()
+        self.overflow.remove([key for key, *_ in items])
+        if items:
+            self.logger.info("Moved %d items from the overflow store into the queue.", len(items))
+        if not len(self.overflow):
+            self._pressure = False
+            self.logger.info("Out queue %r is below its low watermark again.", self.name)
+        return len(items)
+
+    def queue_files(self, path: Path = None) -> List[Path]:
+        if path and path != self.path:
+            return super(OutQueue, self).queue_files(path)
+        return [self.path / name for name in self.backend.names()]
+
+    def _in_backend(self, path: Path) -> bool:
+        return path.parent == self.path
+
+    def move_file(self, path: Path, target_dir: Path) -> None:
+        if self._in_backend(path):
+            self.backend.move(path.name, target_dir)
+        else:
+            super(OutQueue, self).move_file(path, target_dir)
+
+    def remove_file(self, path: Path) -> None:
+        if self._in_backend(path):
+            self.backend.ack(path.name)
+        else:
+            super(OutQueue, self).remove_file(path)
+
+    def file_version(self, path: Path) -> Optional[Tuple[int, int]]:
+        if self._in_backend(path):
+            return self.backend.version(path.name)
+        return super(OutQueue, self).file_version(path)
+
+    async def read_listener_file(self, path: Path) -> str:
+        if self._in_backend(path):
+            return await self.backend.read(path.name)
+        return await super(OutQueue, self).read_listener_file(path)
+
+    def enqueue_file(self, path: Path, obj: ListenerObject, priority: int = PRIORITY_NORMAL) -> bool:
+        """
+        Add the listener file `path` of the in-queue and its already loaded
+        object `obj` to the queue.
+
+        :param int priority: files with a higher priority are handled first
+        :return: whether the file was hardlinked instead of copied
+        :rtype: bool
+        """
+        target = self.path / path.name
+        entry = self.queue_entry(obj, priority=priority)
+        if priority > PRIORITY_NORMAL:
+            self.priority_pending = True
+        linked = self.backend.enqueue(path, entry)
+        self.counters.add(path.name, entry.enqueued)
+        self.cache_listener_object(target, obj)
+        self.notify_new_files()
+        return linked
+
+    def ack_file(self, path: Path) -> None:
+        """Remove a successfully handled file from the queue."""
+        self.uncache_listener_object(path)
+        self.counters.remove(path.name)
+        self.backend.ack(path.name)
+
+    async def delete_queue(self):
+        self.backend.close()
+        self.overflow.close()
+        await super(OutQueue, self).delete_queue()
+
+    @classmethod
+    def object_type_queue_order_of(cls, udm_object_type: str) -> int:
+        """Return index of UDM object type in `cls.queue_sort_order`."""
         try:
-            return self.queue_sort_order.index(obj.udm_object_type)
+            return cls.queue_sort_order.index(udm_object_type)
         except ValueError:
             return 999  # object type not in self.queue_sort_order
 
+    def object_type_queue_order(self, udm_object_type: str) -> int:
+        """Return index of UDM object type in `self.queue_sort_order`."""
+        return self.object_type_queue_order_of(udm_object_type)
+
+    def queue_entry(
+        self, obj: ListenerObject, enqueued: float = None, priority: int = PRIORITY_NORMAL
+    ) -> QueueEntry:
+        return QueueEntry(
+            queue_order=self.object_type_queue_order(obj.udm_object_type),
+            udm_object_type=obj.udm_object_type,
+            entry_uuid=obj.id,
+            enqueued=enqueued or time.time(),
+            priority=priority,
+        )
+
+    def add_to_index(self, path: Path, obj: ListenerObject, enqueued: float = None) -> QueueEntry:
+        """
+        Store the data required for sorting `path`, so the out queue doesn't
+        have to load it again.
+        """
+        entry = self.queue_entry(obj, enqueued)
+        self.backend.set_entry(path.name, entry)
+        return entry
+
+    async def index_entry(self, path: Path) -> QueueEntry:
+        """
+        Get sorting data of `path` from the index. Files not added through
+        :py:meth:`enqueue_file` (e.g. those that were already in the queue at
+        startup) are loaded once.
+        """
+        entry = self.backend.get_entry(path.name)
+        if entry:
+            return entry
+        try:
+            enqueued = path.stat().st_mtime
+        except OSError:
+            enqueued = time.time()
+        try:
+            obj = await self.load_listener_file(path)
+        except ListenerLoadingError:
+            # sorted last, handle() will discard it
+            entry = QueueEntry(999, "", "", enqueued)
+            self.backend.set_entry(path.name, entry)
+            return entry
+        return self.add_to_index(path, obj, enqueued)
+
+    async def udm_object_queue_order(self, path: Path) -> int:
+        """
+        Return index of UDM object type in `self.queue_sort_order`, for use as
+        `key` argument in `list.sort()`.
+        """
+        return (await self.index_entry(path)).queue_order
+
+    async def queue_items(self, limit: int = None, due_at: float = None) -> List[Tuple[QueueEntry, str]]:
+        """
+        List of `(entry, name)` tuples of the items in the queue, sorted by UDM
+        object type and filename.
+
+        :param int limit: maximum number of items to return, all if `None`
+        :param float due_at: if set, only items that are not waiting for a
+            retry at this timestamp
+        """
+        for name in self.backend.unindexed_names():
+            await self.index_entry(self.path / name)
+        items = self.backend.peek(limit, due_at)
+        if limit is None and due_at is None:
+            self.counters.reset((name, entry.enqueued) for entry, name in items)
+        return items
+
+    async def sorted_queue_files(self) -> List[Tuple[int, Path]]:
+        """
+        List of `(queue_order, path)` tuples of all JSON files in the queue,
+        sorted by UDM object type and filename.
+        """
+        return [(entry.queue_order, self.path / name) for entry, name in await self.queue_items()]
+
+    async def due_queue_files(
+        self, limit: int = QUEUE_SCAN_BATCH_SIZE
+    ) -> Tuple[List[Tuple[int, int, Path]], Optional[float]]:
+        """
+        Like :py:meth:`sorted_queue_files`, but without the files waiting for
+        a retry, and sorted by priority first. Files of the same objects
+        queued after waiting files are left out as well, and all files of an
+        object get the highest priority of its files, so changes of an object
+        are never reordered.
+
+        Only the first `limit` due files are returned, plus the files of
+        objects with a high priority. They are read from the sorted index of
+        the backend instead of listing the queue directory, so a pass takes
+        the same time, whatever the length of the queue.
+
+        :param int limit: maximum number of due files of normal priority
+        :return: the `(priority, queue_order, path)` tuples of the files to
+            handle now, and the seconds until the next retry is due (`None` if
+            no file is waiting, `0` if more files are due than returned)
+        :rtype: tuple(list, float)
+        """
+        now = time.time()
+        next_due: Optional[float] = None
+        window = await self.queue_items(limit, due_at=now)
+        if len(window) >= limit:
+            next_due = now
+        items = {name: entry for entry, name in window}
+        # waiting files are needed to hold back later files of their objects
+        for entry, name in itertools.chain(self.backend.waiting(now), self.backend.prioritized()):
+            items.setdefault(name, entry)
+        waiting_objects: Set[str] = set()
+        due_items: List[Tuple[QueueEntry, str]] = []
+        object_priorities: Dict[str, int] = {}
+        for name, entry in sorted(items.items(), key=lambda item: (item[1].queue_order, item[0])):
+            if entry.next_due > now:
+                next_due = entry.next_due if next_due is None else min(next_due, entry.next_due)
+                waiting_objects.add(entry.entry_uuid or name)
+            elif entry.entry_uuid not in waiting_objects:
+                due_items.append((entry, name))
+                if entry.priority > object_priorities.get(entry.entry_uuid, PRIORITY_NORMAL):
+                    object_priorities[entry.entry_uuid] = entry.priority
+        res = [
+            (
+                object_priorities.get(entry.entry_uuid, PRIORITY_NORMAL),
+                entry.queue_order,
+                self.path / name,
+            )
+            for entry, name in due_items
+        ]
+        # stable sort, keeps the order of UDM object type and filename within each priority
+        res.sort(key=lambda item: -item[0])
+        return res, None if next_due is None else next_due - now
+
+    @staticmethod
+    def object_dependencies(obj: ListenerObject, removed_users: Set[str] = frozenset()) -> Set[str]:
+        """
+        DNs (lower case) of the users whose pending changes must be sent to
+        the school authority before the change of `obj`: the members of a
+        group and the legal guardians of a user. Removals of users are sent
+        before all changes of groups, as the groups may still reference them.
+
+        :param set removed_users: DNs (lower case) of users with pending removals
+        """
+        if isinstance(obj, ListenerGroupAddModifyObject):
+            dns = {dn.lower() for dn in obj.users} | removed_users
+        elif obj.udm_object_type == "groups/group":
+            dns = set(removed_users)
+        elif isinstance(obj, ListenerUserAddModifyObject):
+            dns = {dn.lower() for dn in obj.legal_guardians}
+        else:
+            return set()
+        return dns - {obj.dn.lower()}
+
+    async def ready_files(
+        self, paths: List[Path], coalesced_objs: Dict[Path, ListenerObject] = None
+    ) -> Set[Path]:
+        """
+        The files of `paths` that don't wait for changes of other objects in
+        `paths` (see :py:meth:`object_dependencies`). Later files of an object
+        with a waiting file wait as well, so its changes are never reordered.
+        """
+        coalesced_objs = coalesced_objs or {}
+        objs: Dict[Path, Optional[ListenerObject]] = {}
+        pending_users: Set[str] = set()
+        removed_users: Set[str] = set()
+        for path in paths:
+            obj = coalesced_objs.get(path)
+            if obj is None:
+                try:
+                    obj = await self.load_listener_file(path)
+                except ListenerLoadingError:
+                    # handle() will discard it
+                    obj = None
+            objs[path] = obj
+            if obj is not None and obj.udm_object_type == "users/user":
+                pending_users.add(obj.dn.lower())
+                if isinstance(obj, ListenerRemoveObject):
+                    removed_users.add(obj.dn.lower())
+        ready: Set[Path] = set()
+        waiting_objects: Set[str] = set()
+        for path, obj in objs.items():
+            if obj is not None and (
+                obj.id in waiting_objects or self.object_dependencies(obj, removed_users) & pending_users
+            ):
+                waiting_objects.add(obj.id)
+            else:
+                ready.add(path)
+        return ready
+
+    async def next_tier(
+        self, paths: List[Tuple[int, int, Path]], coalesced_objs: Dict[Path, ListenerObject] = None
+    ) -> List[Path]:
+        """
+        Select the files to handle next from the output of
+        :py:meth:`due_queue_files`: the files with the leading priority, that
+        are not waiting for pending changes of other objects (see
+        :py:meth:`ready_files`). A group waits only for its members and for
+        removed users, a user only for its legal guardians, everything else is
+        handled right away.
+
+        If all files of the leading priority are waiting (for files of another
+        priority or in a circle), the ready files of all priorities are
+        selected, or all files of the leading priority if none is ready.
+
+        High priority files are handled in batches of at most
+        `OUT_QUEUE_BATCH_SIZE` files. After `OUT_QUEUE_PRIORITY_WEIGHT` such
+        batches in a row, normal priority files are handled, so they are never
+        starved.
+        """
+        if not paths:
+            return []
+        lane = paths
+        if (
+            paths[0][0] > PRIORITY_NORMAL
+            and self._priority_streak >= OUT_QUEUE_PRIORITY_WEIGHT
+            and paths[-1][0] == PRIORITY_NORMAL
+        ):
+            lane = [item for item in paths if item[0] == PRIORITY_NORMAL]
+        priority = lane[0][0]
+        candidates = [path for item_priority, _, path in lane if item_priority == priority]
+        ready = await self.ready_files([path for *_, path in paths], coalesced_objs)
+        tier = (
+            [path for path in candidates if path in ready]
+            or [path for *_, path in paths if path in ready]
+            or candidates
+        )
+        if priority > PRIORITY_NORMAL:
+            self._priority_streak += 1
+            tier = tier[:OUT_QUEUE_BATCH_SIZE]
+        else:
+            self._priority_streak = 0
+        return tier
+
+    async def handle_tier(
+        self, tier: List[Path], coalesced_objs: Dict[Path, ListenerObject]
+    ) -> Tuple[List[Path], bool]:
+        """
+        Handle `tier` (see :py:meth:`next_tier`) in batches of
+        `OUT_QUEUE_BATCH_SIZE` files. Stops after the current batch if high
+        priority files arrived meanwhile.
+
+        :return: files that failed because of API communication errors (see
+            :py:meth:`handle_files`), and whether files of `tier` were left
+            unhandled
+        :rtype: tuple(list(Path), bool)
+        """
+        for start in range(0, len(tier), OUT_QUEUE_BATCH_SIZE):
+            if start and self.priority_pending:
+                return [], True
+            failed_paths = await self.handle_files(
+                tier[start : start + OUT_QUEUE_BATCH_SIZE], coalesced_objs
+            )
+            if failed_paths:
+                return failed_paths, True
+        return [], False
+
+    @property
+    def coalesce_enabled(self) -> bool:
+        return self.setting(get_ucrv_bool, UCRV_OUT_QUEUE_COALESCE)
+
+    async def coalesce(
+        self, paths: List[QueueItem]
+    ) -> Tuple[List[QueueItem], Dict[Path, ListenerObject]]:
+        """
+        Collapse pending changes of the same object (entryUUID) to the newest
+        one.
+
+        Only the newest file of each object stays in the queue. Its object
+        gets the `old_data` of the oldest change that has some, so the object
+        can still be found on the target system (e.g. by its previous
+        `record_uid`). As the newest state wins, a delete supersedes earlier
+        add/modify changes. The merged object is stored in the newest file
+        before the superseded files are removed from the queue, so the oldest
+        `old_data` is kept if the newest file is not handled in this pass.
+
+        :param list paths: output of :py:meth:`sorted_queue_files` or
+            :py:meth:`due_queue_files`
+        :return: the remaining tuples of `paths` and a dict with the (merged)
+            objects to handle for the paths of coalesced files
+        :rtype: tuple(list, dict)
+        """
+        paths_by_uuid: Dict[str, List[Path]] = {}
+        for *_, path in paths:
+            entry = self.backend.get_entry(path.name)
+            if entry and entry.entry_uuid:
+                paths_by_uuid.setdefault(entry.entry_uuid, []).append(path)
+        superseded: Set[Path] = set()
+        merged_objs: Dict[Path, ListenerObject] = {}
+        for entry_uuid, obj_paths in paths_by_uuid.items():
+            if len(obj_paths) < 2:
+                continue
+            obj_paths.sort()
+            try:
+                newest_obj = await self.load_listener_file(obj_paths[-1])
+                old_data = None
+                for path in obj_paths[:-1]:
+                    old_data = getattr(await self.load_listener_file(path), "old_data", None)
+                    if old_data:
+                        break
+            except ListenerLoadingError:
+                # let handle() deal with the invalid file
+                continue
+            if old_data:
+                try:
+                    await self.copy_old_data(path, obj_paths[-1])
+                except (OSError, ValueError) as exc:
+                    self.logger.error(
+                        "Storing old_data of %r in %r: %s", path.name, obj_paths[-1].name, exc
+                    )
+                    continue
+                newest_obj = newest_obj.copy(update={"old_data": old_data})
+            merged_objs[obj_paths[-1]] = newest_obj
+            superseded.update(obj_paths[:-1])
+            self.logger.info(
+                "Coalesced %d changes of %r (%s) into %r.",
+                len(obj_paths),
+                newest_obj,
+                entry_uuid,
+                obj_paths[-1].name,
+            )
+        if superseded:
+            await get_group_commit().sync()
+        for path in superseded:
+            self.ack_file(path)
+        remaining = [item for item in paths if item[-1] not in superseded]
+        return remaining, merged_objs
+
+    async def copy_old_data(self, source: Path, path: Path) -> None:
+        """
+        Replace the `old_data` in queue file `path` with the one of queue file
+        `source`. The item is replaced atomically, its sorting data is kept.
+
+        :raises OSError: if a file could not be read or written
+        :raises ValueError: if a file could not be decoded
+        """
+        old_data = ujson.loads(await self.read_listener_file(source)).get("old_data")
+        obj_dict = ujson.loads(await self.read_listener_file(path))
+        if obj_dict.get("old_data") == old_data:
+            return
+        obj_dict["old_data"] = old_data
+        self.uncache_listener_object(path)
+        self.backend.add(
+            path.name, ujson.dumps(obj_dict, sort_keys=True, indent=4), self.backend.get_entry(path.name)
+        )
+
     async def scan(self) -> None:  # noqa: C901
         self.logger.info("Handling out queue %r (%s)...", self.name, self.path)
         while True:
-            try:
-                self.logger.info(self.school_authority.plugins)
-                # in case of a communication error with the target API, sleep and retry
-                school_authority_ping_caller = filter_plugins(
-                    "school_authority_ping", self.school_authority.plugins
-                )
-                school_authority_ping_coros: List[Coroutine] = school_authority_ping_caller(
-                    school_authority=self.school_authority
-                )
-                # TODO at this point we can't distinguish between hook collection + execution
-                connection_ok = all(await asyncio.gather(*school_authority_ping_coros))
-            except Exception as exc:
-                self.logger.exception("An exception was thrown during hook collection", exc_info=exc)
-                connection_ok = False
-            if not connection_ok:
-                self.logger.error(
-                    "One or more school_authority_ping hooks reported a faulty" "connection!"
-                )
-                await asyncio.sleep(API_COMMUNICATION_ERROR_WAIT)
+            if not await self.check_connection():
                 continue
             # communication is OK, handle queue
             while True:
-                api_error = False
-                # Cannot use `key` in list.sort() with async function. Creating
-                # tuple with key output instead and sorting that.
-                paths = [(await self.udm_object_queue_order(path), path) for path in self.queue_files()]
-                paths.sort()
-                if paths:
-                    lowest_queue_order_num = paths[0][0]
+                self.priority_pending = False
+                self.refill()
+                paths, retry_in = await self.due_queue_files()
+                if self.coalesce_enabled:
+                    paths, coalesced_objs = await self.coalesce(paths)
                 else:
-                    lowest_queue_order_num = 999  # make linter happy
-                for queue_order, path in paths:
-                    if queue_order > lowest_queue_order_num:
-                        # The UDM object type changed in `paths`. For example: e.g. was `users/user`, is
-                        # now `groups/group`. Before continuing, reread the queue directory (and sort
-                        # again) to see if new files of a higher priority (lower number) arrived.
-                        break
-                    self.head = path.name
-                    try:
-                        await self.handle(path)
-                    except ServerError as exc:
-                        # TODO errors from self.handle are not raised as ServerError
-                        self.logger.error(exc)
-                        self.discard_file(path)
-                    except APICommunicationError as exc:
-                        # TODO errors from self.handle are not raised as APICommunicationError
-                        # continue in outer loop where we wait until communication is OK
-                        self.logger.error("Error calling school authority API: %s", exc)
-                        api_error = True
-                        break
-                    except Exception as exc:
-                        self.logger.exception("Unhandled exception: %s", exc)
-                        self.keep_file(path)
-                    else:
-                        # success - delete item from queue
-                        try:
-                            path.unlink()
-                        except FileNotFoundError:
-                            pass
-                if api_error:
-                    # TODO: limit on number of retries, just delete job for now
-                    self.keep_file(path)
+                    coalesced_objs = {}
+                # Only handle the files of the leading priority that don't wait for other objects,
+                # then read the queue again, to see if their dependencies are done or if new files of
+                # a higher priority arrived.
+                tier = await self.next_tier(paths, coalesced_objs)
+                failed_paths, interrupted = await self.handle_tier(tier, coalesced_objs)
+                if failed_paths:
+                    # the files stay in the queue, they are retried when the connection works again
                     break
                 self.head = ""
-                # Sleep a while, to allow out-queue to be populated by the in-queue so there is actually
-                # something to be sorted, and we don't start with the first item the in-queue provides
-                # (which is usually the group change before the user change):
-                await asyncio.sleep(5)
+                if not interrupted and len(tier) == len(paths) and not self.refill():
+                    # Unless spilled files were moved back into the queue, sleep until the in-queue
+                    # adds files or a retry is due:
+                    await self.wait_for_changes(retry_in)
                 self._signal_alive()
 
-    async def handle(self, path: Path) -> None:
+    async def check_connection(self) -> bool:
+        """
+        Wait while the circuit breaker is open, then ping the school authority
+        if a probe is due. While the breaker is closed no ping is sent.
+
+        :return: whether items may be sent to the school authority
+        :rtype: bool
+        """
+        wait = self.circuit_breaker.retry_in()
+        if wait:
+            await asyncio.sleep(wait)
+        if not self.circuit_breaker.probe_due():
+            return True
+        try:
+            school_authority_ping_caller = filter_plugins(
+                "school_authority_ping", self.school_authority.plugins
+            )
+            school_authority_ping_coros: List[Coroutine] = school_authority_ping_caller(
+                school_authority=self.school_authority
+            )
+            # TODO at this point we can't distinguish between hook collection + execution
+            connection_ok = all(await asyncio.gather(*school_authority_ping_coros))
+        except Exception as exc:
+            self.logger.exception("An exception was thrown during hook collection", exc_info=exc)
+            connection_ok = False
+        if connection_ok:
+            self.circuit_breaker.record_success()
+        else:
+            self.logger.error("One or more school_authority_ping hooks reported a faulty connection!")
+            self.circuit_breaker.record_failure()
+        return connection_ok
+
+    @property
+    def num_workers(self) -> int:
+        return max(1, self.setting(get_ucrv_int, UCRV_OUT_QUEUE_WORKERS))
+
+    def partition(self, paths: List[Path], num_partitions: int) -> List[List[Path]]:
+        """
+        Split `paths` into `num_partitions` lists by the entryUUID of their
+        objects. All files of one object end up in the same list, keeping
+        their order.
+        """
+        partitions: List[List[Path]] = [[] for _ in range(num_partitions)]
+        for path in paths:
+            entry = self.backend.get_entry(path.name)
+            key = entry.entry_uuid if entry and entry.entry_uuid else path.name
+            partitions[zlib.crc32(key.encode()) % num_partitions].append(path)
+        return [partition for partition in partitions if partition]
+
+    async def handle_files(
+        self, paths: List[Path], coalesced_objs: Dict[Path, ListenerObject] = None
+    ) -> List[Path]:
+        """
+        Handle `paths` using :py:attr:`num_workers` concurrent workers.
+
+        Files of different objects are handled in parallel, files of the same
+        object are handled by the same worker in the order of `paths`. If a
+        worker encounters an error communicating with the school authority
+        (see :py:func:`is_communication_error`), the circuit breaker is opened
+        and all workers stop after their current file. Files that fail
+        otherwise (e.g. with a 4xx status) are retried later (see
+        :py:meth:`retry_later`). Failures during a communication error don't
+        count as attempts, so an outage doesn't move files to the dead-letter
+        store.
+
+        :param list paths: files to handle
+        :param dict coalesced_objs: objects to use instead of loading the file
+            (see :py:meth:`coalesce`)
+        :return: files that failed because of API communication errors, they
+            stay in the queue
+        :rtype: list(Path)
+        """
+        coalesced_objs = coalesced_objs or {}
+        failed_paths: List[Path] = []
+
+        async def retry_item_later(path: Path, exc: Exception) -> None:
+            if failed_paths:
+                # another worker ran into a communication error meanwhile, the failure may be
+                # caused by it, the file stays in the queue without counting the attempt
+                self.logger.info("Not counting failure of %r during communication error.", path.name)
+                return
+            await self.retry_later(path, exc)
+
+        async def worker(worker_paths: List[Path]) -> None:
+            for path in worker_paths:
+                if failed_paths:
+                    return
+                self.head = path.name
+                try:
+                    await self.handle(path, coalesced_objs.get(path))
+                except ServerError as exc:
+                    # TODO errors from self.handle are not raised as ServerError
+                    self.logger.error(exc)
+                    self.discard_file(path)
+                except APIRequestError as exc:
+                    # the request was rejected (4xx), caused by the item, not by the connection
+                    self.logger.error("School authority API rejected %r: %s", path.name, exc)
+                    await retry_item_later(path, exc)
+                except APICommunicationError as exc:
+                    # continue in outer loop where we wait until communication is OK, the
+                    # file stays in the queue
+                    self.logger.error("Error calling school authority API: %s", exc)
+                    failed_paths.append(path)
+                    return
+                except Exception as exc:
+                    if is_communication_error(exc):
+                        # raised by a plugin, e.g. by the Kelvin client, same as above
+                        self.logger.error("Error communicating with school authority: %s", exc)
+                        failed_paths.append(path)
+                        return
+                    self.logger.exception("Unhandled exception: %s", exc)
+                    await retry_item_later(path, exc)
+                else:
+                    # success - delete item from queue
+                    self.ack_file(path)
+
+        await asyncio.gather(*(worker(part) for part in self.partition(paths, self.num_workers)))
+        if failed_paths:
+            self.circuit_breaker.record_failure()
+        return failed_paths
+
+    @property
+    def max_attempts(self) -> int:
+        return max(1, self.setting(get_ucrv_int, UCRV_OUT_QUEUE_MAX_ATTEMPTS))
+
+    def retry_wait(self, attempts: int) -> float:
+        """Seconds to wait before handling an item again after its `attempts`th failure."""
+        wait = self.setting(get_ucrv_int, UCRV_OUT_QUEUE_RETRY_WAIT)
+        return min(OUT_QUEUE_RETRY_MAX_WAIT, wait * 2 ** (attempts - 1))
+
+    async def retry_later(self, path: Path, exc: Exception) -> None:
+        """
+        Schedule the file `path`, that failed with `exc`, to be handled again
+        after an exponentially growing wait time. Other files continue to be
+        handled meanwhile. After :py:attr:`max_attempts` failures the file is
+        moved to the dead-letter store (the `keep` directory). Only called for
+        failures caused by the item, not by communication errors (see
+        :py:meth:`handle_files`).
+        """
+        entry = await self.index_entry(path)
+        attempts = entry.attempts + 1
+        last_error = f"{type(exc).__name__}: {exc}"
+        if attempts >= self.max_attempts:
+            self.logger.error("Giving up handling %r after %d attempts.", path.name, attempts)
+            self.dead_letter(path, attempts, last_error)
+            return
+        wait = self.retry_wait(attempts)
+        self.logger.warning(
+            "Attempt %d to handle %r failed, retrying in %d seconds.", attempts, path.name, wait
+        )
+        self.backend.set_entry(
+            path.name,
+            entry._replace(attempts=attempts, next_due=time.time() + wait, last_error=last_error),
+        )
+
+    def dead_letter(self, path: Path, attempts: int, last_error: str) -> None:
+        """Move `path` to the `keep` directory, next to a file describing the failure."""
+        info = {"attempts": attempts, "last_error": last_error, "failed": time.time()}
+        try:
+            write_file_atomic(self.keep_dir / f"{path.name}{DEAD_LETTER_INFO_SUFFIX}", ujson.dumps(info))
+        except OSError as exc:
+            self.logger.error("Writing information about dead letter %r: %s", path.name, exc)
+        self.keep_file(path)
+
+    def dead_letter_path(self, name: str) -> Path:
+        """
+        :raises NoObjectError: if there is no dead letter `name`
+        """
+        path = self.keep_dir / name
+        if path.name != name or not name.lower().endswith(".json") or not path.is_file():
+            raise NoObjectError(key="name", value=name)
+        return path
+
+    def dead_letter_model(self, path: Path) -> DeadLetter:
+        try:
+            info = ujson.loads(Path(f"{path}{DEAD_LETTER_INFO_SUFFIX}").read_text())
+        except (OSError, ValueError):
+            # kept before the retry state was recorded
+            try:
+                info = {"failed": path.stat().st_mtime}
+            except OSError:
+                info = {}
+        return DeadLetter(
+            name=path.name,
+            queue=self.name,
+            attempts=info.get("attempts", 0),
+            last_error=info.get("last_error", ""),
+            failed=datetime.datetime.fromtimestamp(info["failed"]) if "failed" in info else None,
+        )
+
+    async def dead_letters(self, names: List[str] = None) -> List[DeadLetter]:
+        """
+        List the items in the dead-letter store.
+
+        :param list names: names of dead letters to return, including the
+            content of their listener files, all (without content) if empty
+        :return: list of dead letters, sorted by name
+        :rtype: list(DeadLetter)
+        :raises NoObjectError: if one of `names` is not a dead letter
+        """
+        if not names:
+            return [self.dead_letter_model(path) for path in sorted(self.keep_dir.glob("*.json"))]
+        res = []
+        for name in names:
+            path = self.dead_letter_path(name)
+            dead_letter = self.dead_letter_model(path)
+            try:
+                dead_letter.data = ujson.loads(await self.read_listener_file(path))
+            except ValueError:
+                pass
+            res.append(dead_letter)
+        return res
+
+    async def replay_dead_letters(self, names: List[str] = None) -> List[str]:
+        """
+        Put items from the dead-letter store back into the queue, with a fresh
+        retry state.
+
+        :param list names: names of the dead letters to replay, all if empty
+        :return: names of the replayed items
+        :rtype: list(str)
+        :raises NoObjectError: if one of `names` is not a dead letter
+        """
+        if names:
+            paths = [self.dead_letter_path(name) for name in names]
+        else:
+            paths = sorted(self.keep_dir.glob("*.json"))
+        replayed = []
+        for path in paths:
+            try:
+                obj = await self.load_listener_file(path)
+            except ListenerLoadingError:
+                self.logger.error("Not replaying invalid listener file %r.", path.name)
+                continue
+            self.uncache_listener_object(path)
+            self.enqueue_file(path, obj)
+            path.unlink()
+            Path(f"{path}{DEAD_LETTER_INFO_SUFFIX}").unlink(missing_ok=True)
+            replayed.append(path.name)
+        if replayed:
+            self.logger.info("Replayed %d dead letters: %s", len(replayed), ", ".join(replayed))
+        return replayed
+
+    async def handle(self, path: Path, obj: ListenerObject = None) -> None:
+        """
+        Send the object in the listener file at `path` to the school authority.
+
+        :param Path path: listener file
+        :param ListenerObject obj: object to handle instead of the content of
+            `path` (e.g. merged by :py:meth:`coalesce`)
+        :raises Exception: errors of the plugins handling the object
+        """
         self.logger.info("Start handling %r.", path.name)
         try:
-            obj = await self.load_listener_file(path)
+            obj = obj or await self.load_listener_file(path)
         except ListenerLoadingError:
             self.logger.error("Error loading or invalid listener file %r.", path.name)
             self.discard_file(path)
@@ -571,9 +1853,10 @@ class OutQueue(FileQueue):
             handled = any(await asyncio.gather(*handle_listener_object_coros))
             if not handled:
                 raise NotImplementedError(f"No registered plugin handled obj={obj!r}.")
-        except Exception as exc:
+        except NotImplementedError as exc:
             self.logger.exception(exc)
             self.discard_file(path)
+        # other exceptions are raised to handle_files(), which retries the file later
         self.logger.info("Finished handling %r.", path.name)
 
     @classmethod
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+Rate limiting of the requests to a school authority.
+
+A :py:class:`RateLimiter` combines a token bucket (requests per second, with
+bursts) and a cap on the number of requests in flight. Both limits adapt to
+the responses (AIMD): when the school authority asks to slow down (status 429,
+or 503 with a `Retry-After` header), they are halved and no requests are sent
+until the `Retry-After` time passed. With each successful request they grow
+again, by about one request per second, up to the configured values.
+
+The limits are configured per school authority in
+`plugin_configs[<plugin name>]["rate_limit"]`:
+
+.. code-block:: json
+
+    "rate_limit": {
+        "requests_per_second": 20,
+        "burst": 40,
+        "max_in_flight": 4
+    }
+
+A value of `0` (or a missing key) disables the respective limit.
+"""
+
+import asyncio
+import datetime
+import email.utils
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import lazy_object_proxy
+
+from .constants import LOG_FILE_PATH_QUEUES, RATE_LIMIT_MIN_REQUESTS_PER_SECOND
+from .models import SchoolAuthorityConfiguration
+from .utils import ConsoleAndFileLogging
+
+logger: logging.Logger = lazy_object_proxy.Proxy(
+    lambda: ConsoleAndFileLogging.get_logger(__name__, LOG_FILE_PATH_QUEUES)
+)
+# (school authority name, plugin name) -> (configuration, rate limiter)
+_rate_limiters: Dict[Tuple[str, str], Tuple[Dict[str, Any], "RateLimiter"]] = {}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds to wait according to a `Retry-After` header, which is either a
+    number of seconds or an HTTP date. `None` if missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        name: str,
+        requests_per_second: float = 0,
+        burst: int = 0,
+        max_in_flight: int = 0,
+    ) -> None:
+        """
+        :param str name: name of the school authority, used in log messages
+        :param float requests_per_second: maximum request rate, `0` for no limit
+        :param int burst: number of requests that may be sent at once after
+            a pause, defaults to one second worth of requests
+        :param int max_in_flight: maximum number of concurrent requests, `0`
+            for no limit
+        """
+        self.name = name
+        self.requests_per_second = 0.0
+        self.burst = 1
+        self.max_in_flight = 0
+        self.rate = 0.0
+        """current request rate, adapted to the responses"""
+        self.in_flight_limit = 0.0
+        """current cap on the requests in flight, adapted to the responses"""
+        self.in_flight = 0
+        self._tokens = 0.0
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.configure(requests_per_second, burst, max_in_flight)
+
+    def configure(self, requests_per_second: float = 0, burst: int = 0, max_in_flight: int = 0) -> None:
+        """Set new limits, resetting the adapted ones."""
+        self.requests_per_second = max(0.0, float(requests_per_second))
+        self.burst = max(1, int(burst) or math.ceil(self.requests_per_second))
+        self.max_in_flight = max(0, int(max_in_flight))
+        self.rate = self.requests_per_second
+        self.in_flight_limit = float(self.max_in_flight)
+        self._tokens = float(self.burst)
+        self._wake_waiters()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def wait_time(self) -> float:
+        """Seconds until the next request may be sent, not counting the cap on requests in flight."""
+        now = time.monotonic()
+        wait = max(0.0, self._paused_until - now)
+        if self.rate:
+            self._refill(now)
+            if self._tokens < 1:
+                wait = max(wait, (1 - self._tokens) / self.rate)
+        return wait
+
+    def _slot_free(self) -> bool:
+        return not self.max_in_flight or self.in_flight < int(self.in_flight_limit)
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent. Must be followed by :py:meth:`release`."""
+        while True:
+            wait = self.wait_time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            if not self._slot_free():
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+                try:
+                    await waiter
+                finally:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                continue
+            if self.rate:
+                self._tokens -= 1
+            self.in_flight += 1
+            return
+
+    def release(self, status: int = None, retry_after: float = None) -> None:
+        """
+        Mark a request as finished and adapt the limits to its response.
+
+        :param int status: HTTP status of the response, `None` if the request
+            failed without a response
+        :param float retry_after: seconds from the `Retry-After` header
+        """
+        self.in_flight = max(0, self.in_flight - 1)
+        if status == 429 or (status == 503 and retry_after is not None):
+            self.record_throttled(retry_after)
+        elif status is not None and status < 500:
+            self.record_success()
+        self._wake_waiters()
+
+    def record_success(self) -> None:
+        # additive increase: about one more request per second (or one more
+        # request in flight) per second of successful requests
+        if self.requests_per_second:
+            self.rate = min(self.requests_per_second, self.rate + 1 / max(self.rate, 1))
+        if self.max_in_flight:
+            self.in_flight_limit = min(
+                self.max_in_flight, self.in_flight_limit + 1 / max(self.in_flight_limit, 1)
+            )
+
+    def record_throttled(self, retry_after: float = None) -> None:
+        # multiplicative decrease
+        if self.requests_per_second:
+            self.rate = max(
+                min(RATE_LIMIT_MIN_REQUESTS_PER_SECOND, self.requests_per_second), self.rate / 2
+            )
+            self._tokens = min(self._tokens, 0.0)
+        if self.max_in_flight:
+            self.in_flight_limit = max(1.0, self.in_flight_limit / 2)
+        if retry_after:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        logger.warning(
+            "School authority %r asked to slow down, limiting to %s requests per second and %s "
+            "requests in flight%s.",
+            self.name,
+            f"{self.rate:.1f}" if self.rate else "unlimited",
+            int(self.in_flight_limit) if self.max_in_flight else "unlimited",
+            f", pausing for {retry_after:.0f} seconds" if retry_after else "",
+        )
+
+    def _wake_waiters(self) -> None:
+        free = (int(self.in_flight_limit) - self.in_flight) if self.max_in_flight else len(self._waiters)
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+def get_rate_limiter(
+    school_authority: SchoolAuthorityConfiguration, plugin_name: str = None
+) -> Optional[RateLimiter]:
+    """
+    Rate limiter for the requests to `school_authority`, configured in
+    `plugin_configs[plugin_name]["rate_limit"]`. Without `plugin_name`, the
+    configuration of the first plugin of the school authority that has one is
+    used. All requests with the same configuration share the rate limiter.
+
+    :return: the rate limiter, `None` if no rate limit is configured
+    :raises ValueError: if the configuration is invalid
+    """
+    plugin_names = [plugin_name] if plugin_name else school_authority.plugins
+    for name in plugin_names:
+        config = school_authority.plugin_configs.get(name, {}).get("rate_limit")
+        if config:
+            break
+    else:
+        return None
+    try:
+        kwargs = {
+            "requests_per_second": float(config.get("requests_per_second") or 0),
+            "burst": int(config.get("burst") or 0),
+            "max_in_flight": int(config.get("max_in_flight") or 0),
+        }
+    except (AttributeError, TypeError, ValueError) as exc:
+        raise ValueError(
+            f"Invalid 'rate_limit' in {name!r} plugin configuration of school authority "
+            f"{school_authority.name!r}: {exc!s}"
+        )
+    key = (school_authority.name, name)
+    try:
+        old_kwargs, rate_limiter = _rate_limiters[key]
+    except KeyError:
+        rate_limiter = RateLimiter(school_authority.name, **kwargs)
+    else:
+        if old_kwargs != kwargs:
+            rate_limiter.configure(**kwargs)
+    _rate_limiters[key] = (kwargs, rate_limiter)
+    return rate_limiter
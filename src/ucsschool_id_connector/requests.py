@@ -33,10 +33,12 @@ from typing import Any, Dict, List, Optional, Tuple, Union
 
 import aiofiles
 import aiohttp
+import httpx
 import lazy_object_proxy
 
 from ucsschool_id_connector.constants import HTTP_CLIENT_TIMEOUT, LOG_FILE_PATH_QUEUES
 from ucsschool_id_connector.plugins import filter_plugins
+from ucsschool_id_connector.rate_limit import get_rate_limiter, parse_retry_after
 from ucsschool_id_connector.utils import ConsoleAndFileLogging
 
 ParamType = Union[Dict[str, str], List[Tuple[str, str]]]
@@ -61,6 +63,29 @@ class ServerError(APICommunicationError):
         super().__init__(*args, **kwargs)
 
 
+def is_communication_error(exc: BaseException) -> bool:
+    """
+    Whether `exc`, or an exception it was raised from, is caused by the
+    connection to the school authority or by a server error (status 5xx),
+    rather than by the request. Plugins (e.g. the Kelvin client) raise their
+    own exceptions for those, not :py:class:`APICommunicationError`.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(
+            exc, (aiohttp.ClientConnectionError, httpx.TransportError, ConnectionError, TimeoutError)
+        ):
+            return True
+        status = getattr(exc, "status", None)
+        if status is None:
+            status = getattr(getattr(exc, "response", None), "status_code", None)
+        if isinstance(status, int) and status >= 500:
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
 async def _get_error_msg(
     response: aiohttp.ClientResponse,
 ) -> Union[Dict[str, Any], str]:
@@ -99,8 +124,14 @@ async def _do_request(  # noqa: C901
         )
     ):
         request_kwargs.update(update_kwargs)
+    rate_limiter = get_rate_limiter(school_authority)
+    if rate_limiter:
+        await rate_limiter.acquire()
+    status = retry_after = None
     try:
         async with meth(**request_kwargs) as response:
+            status = response.status
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
             if not session:
                 await session_to_use.close()
             if response.status in acceptable_statuses:
@@ -129,6 +160,9 @@ async def _do_request(  # noqa: C901
                     raise APIRequestError(msg, status=response.status)
     except aiohttp.ClientConnectionError as exc:
         raise APICommunicationError(str(exc))
+    finally:
+        if rate_limiter:
+            rate_limiter.release(status, retry_after)
 
 
 async def http_delete(
@@ -40,8 +40,10 @@ from ucsschool_id_connector.plugins import plugin_manager
 
 from .config_storage import ConfigurationStorage
 from .constants import LOG_FILE_PATH_QUEUES
+from .maintenance import Maintenance
 from .models import (
     AllQueues,
+    MaintenanceModel,
     NoObjectError,
     ObjectExistsError,
     RPCCommand,
@@ -60,10 +62,17 @@ class UnknownRPCCommand(Exception):
 
 
 class SimpleRPCServer:
-    def __init__(self, addr: str, in_queue: InQueue, out_queues: List[OutQueue]):
+    def __init__(
+        self,
+        addr: str,
+        in_queue: InQueue,
+        out_queues: List[OutQueue],
+        maintenance: Maintenance = None,
+    ):
         self.addr = addr
         self.in_queue = in_queue
         self.out_queues = out_queues
+        self.maintenance = maintenance
         self.task: Optional[Job] = None
         self.logger = ConsoleAndFileLogging.get_logger(self.__class__.__name__, LOG_FILE_PATH_QUEUES)
         context = zmq.asyncio.Context()
@@ -194,6 +203,26 @@ class SimpleRPCServer:
         else:
             raise NoObjectError(key="name", value=request.name)
 
+    def get_out_queue(self, name: str) -> OutQueue:
+        for queue in self.out_queues:
+            if queue.name == name:
+                return queue
+        raise NoObjectError(key="name", value=name)
+
+    async def get_dead_letters(self, request: RPCRequest) -> RPCResponseModel:
+        out_queue = self.get_out_queue(request.name)
+        return RPCResponseModel(result=await out_queue.dead_letters(request.items))
+
+    async def replay_dead_letters(self, request: RPCRequest) -> RPCResponseModel:
+        out_queue = self.get_out_queue(request.name)
+        self.logger.info("Replaying dead letters of out queue %r...", out_queue.name)
+        return RPCResponseModel(result=await out_queue.replay_dead_letters(request.items))
+
+    async def get_maintenance(self, request: RPCRequest) -> RPCResponseModel:
+        if not self.maintenance:
+            return RPCResponseModel(result=MaintenanceModel())
+        return RPCResponseModel(result=self.maintenance.as_model())
+
     async def get_school_authorities(self, request):
         return RPCResponseModel(
             result=sorted(
@@ -32,6 +32,7 @@ from typing import Callable, List
 
 from ldap3.utils.conv import escape_filter_chars
 
+from ucsschool_id_connector.constants import PRIORITY_NORMAL
 from ucsschool_id_connector.group_scheduler import GroupScheduler
 from ucsschool_id_connector.ldap_access import LDAPAccess
 from ucsschool_id_connector.user_scheduler import UserScheduler
@@ -83,18 +84,22 @@ class SchoolScheduler:
         )
         return [str(res.uid) for res in results]
 
-    async def queue_school(self, school: str, num_tasks: int):
+    async def queue_school(self, school: str, num_tasks: int, priority: int = PRIORITY_NORMAL):
         """We need to sync the users before the groups,
         because otherwise there will be missing members."""
         self.logger.info(f"Adding school to in-queue: {school}")
         usernames = await self._get_school_users(school=school)
         task_limiter = asyncio.Semaphore(num_tasks)
-        tasks = [limited_func(task_limiter, self.user_scheduler.queue_user, name) for name in usernames]
+        tasks = [
+            limited_func(task_limiter, self.user_scheduler.queue_user, name, priority)
+            for name in usernames
+        ]
         await asyncio.gather(*tasks)
         group_names = await self._get_school_groups(school=school)
         task_limiter = asyncio.Semaphore(num_tasks)
         tasks = [
-            limited_func(task_limiter, self.group_scheduler.queue_group, name) for name in group_names
+            limited_func(task_limiter, self.group_scheduler.queue_group, name, priority)
+            for name in group_names
         ]
         await asyncio.gather(*tasks)
         self.logger.info("Done.")
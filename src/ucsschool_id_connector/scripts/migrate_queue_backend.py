@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+Move the items of the out queues between the directory and SQLite backends.
+"""
+
+import sys
+
+import click
+
+from ucsschool_id_connector.constants import LOG_FILE_PATH_QUEUES, OUT_QUEUE_TOP_DIR
+from ucsschool_id_connector.queue_backends import (
+    BACKEND_DIRECTORY,
+    BACKEND_SQLITE,
+    SQLiteQueueBackend,
+    export_sqlite_db,
+)
+from ucsschool_id_connector.queues import OutQueue
+from ucsschool_id_connector.utils import ConsoleAndFileLogging
+
+
+@click.command(context_settings={"help_option_names": ["-h", "--help"]})
+@click.argument("backend", type=click.Choice([BACKEND_DIRECTORY, BACKEND_SQLITE]))
+@click.option("--queue", "queue_names", multiple=True, help="Migrate only this out queue (repeatable).")
+def migrate(backend: str, queue_names=()):
+    """Migrate the out queues to another storage backend.
+
+    Imports the JSON files of the out queue directories into an SQLite
+    database, or exports the SQLite database back into JSON files. The
+    connector migrates queues automatically on startup, this command is for
+    doing it while the app is stopped.
+
+    Set the app setting "ucsschool-id-connector/out_queue_backend"
+    accordingly, or the migration will be reverted at the next start.
+
+    Example:
+
+        # Store the items of all out queues in SQLite
+        migrate_queue_backend sqlite
+    """
+    logger = ConsoleAndFileLogging.get_logger("migrate_queue_backend", LOG_FILE_PATH_QUEUES)
+    ConsoleAndFileLogging.add_console_handler(logger)
+    if not OUT_QUEUE_TOP_DIR.is_dir():
+        logger.error("Out queue directory %s does not exist.", OUT_QUEUE_TOP_DIR)
+        sys.exit(1)
+    paths = sorted(path for path in OUT_QUEUE_TOP_DIR.iterdir() if path.is_dir())
+    if queue_names:
+        paths = [path for path in paths if path.name in queue_names]
+    for path in paths:
+        if backend == BACKEND_SQLITE:
+            sqlite_backend = SQLiteQueueBackend(path, logger, OutQueue.object_type_queue_order_of)
+            try:
+                num = sqlite_backend.import_directory()
+            finally:
+                sqlite_backend.close()
+        else:
+            num = export_sqlite_db(path, logger)
+        logger.info("Migrated %d items of out queue %r to the %s backend.", num, path.name, backend)
+
+
+if __name__ == "__main__":
+    migrate()
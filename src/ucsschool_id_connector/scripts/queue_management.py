@@ -43,6 +43,13 @@ from ucsschool_id_connector.config_storage import (
     SchoolMappingLoadingError,
 )
 from ucsschool_id_connector.constants import LOG_FILE_PATH_QUEUES, RPC_ADDR, SERVICE_NAME
+from ucsschool_id_connector.ldap_access import close_connection_pools
+from ucsschool_id_connector.maintenance import (
+    Maintenance,
+    OldDataDBMaintenance,
+    OldDataMigration,
+    QueueRetention,
+)
 from ucsschool_id_connector.plugin_loader import load_plugins
 from ucsschool_id_connector.plugins import plugin_manager
 from ucsschool_id_connector.queues import InQueue, OutQueue, get_out_queue_dirs
@@ -54,6 +61,7 @@ class IDConnectorService:
     out_queues: List[OutQueue]
     in_queue: InQueue
     rpc_server: SimpleRPCServer
+    maintenance: Maintenance
 
     def __init__(self):
         self.logger = ConsoleAndFileLogging.get_logger(self.__class__.__name__, LOG_FILE_PATH_QUEUES)
@@ -119,9 +127,21 @@ class IDConnectorService:
                     "Not starting out queue task for deactivated school authority %r.",
                     out_queue.school_authority.name,
                 )
+        self.logger.info("Starting maintenance task...")
+        self.maintenance = Maintenance(
+            [
+                QueueRetention(lambda: [self.in_queue] + list(self.out_queues)),
+                OldDataMigration(),
+                OldDataDBMaintenance(self.in_queue),
+            ]
+        )
+        await scheduler.spawn(self.maintenance.run())
         self.logger.info("Starting RPC server task...")
         self.rpc_server = SimpleRPCServer(
-            addr=RPC_ADDR, in_queue=self.in_queue, out_queues=self.out_queues
+            addr=RPC_ADDR,
+            in_queue=self.in_queue,
+            out_queues=self.out_queues,
+            maintenance=self.maintenance,
         )
         self.rpc_server.task = await scheduler.spawn(self.rpc_server.simple_rpc_server())
         self.logger.info("Started %d background tasks.", len(scheduler))
@@ -138,6 +158,7 @@ class IDConnectorService:
         # nothing to do at the moment
         self.logger.info("Shutting down all outgoing connections...")
         await asyncio.gather(*plugin_manager.hook.shutdown())
+        close_connection_pools()
         await asyncio.sleep(0.25)  # allow aiohttp SSL connections to close gracefully
 
 
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2026 Univention GmbH
+#
+# http://www.univention.de/
+#
+# All rights reserved.
+#
+# The source code of this program is made available
+# under the terms of the GNU Affero General Public License version 3
+# (GNU AGPL V3) as published by the Free Software Foundation.
+#
+# Binary versions of this program provided by Univention to you as
+# well as other copyrighted, protected or trademarked materials like
+# Logos, graphics, fonts, specific documentations and configurations,
+# cryptographic keys etc. are subject to a license agreement between
+# you and Univention and not subject to the GNU AGPL V3.
+#
+# In the case you use this program under the terms of the GNU AGPL V3,
+# the program is provided in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public
+# License with the Debian GNU/Linux or Univention distribution in file
+# /usr/share/common-licenses/AGPL-3; if not, see
+# <http://www.gnu.org/licenses/>.
+
+"""
+Rebuild the DB with the previous data of users and groups from LDAP.
+"""
+
+import asyncio
+
+import click
+
+from ucsschool_id_connector.constants import LDAP_PAGE_SIZE
+from ucsschool_id_connector.old_data_rebuild import OldDataRebuild
+from ucsschool_id_connector.utils import ConsoleAndFileLogging
+
+
+@click.command(context_settings={"help_option_names": ["-h", "--help"]})
+@click.option(
+    "--overwrite",
+    is_flag=True,
+    help="Replace existing entries with the current data from LDAP.",
+)
+@click.option("--no-users", "users", flag_value=False, default=True, help="Skip users.")
+@click.option("--no-groups", "groups", flag_value=False, default=True, help="Skip groups.")
+@click.option(
+    "--page-size",
+    type=click.IntRange(1, 10000),
+    default=LDAP_PAGE_SIZE,
+    show_default=True,
+    help="Number of LDAP objects read and written at once.",
+)
+def rebuild(
+    overwrite: bool = False, users: bool = True, groups: bool = True, page_size: int = LDAP_PAGE_SIZE
+):
+    """Rebuild the database with the previous data of users and groups.
+
+    The previous data is required to delete users and groups in the school
+    authorities. This command creates it for all school users, school
+    classes and work groups from LDAP, if the database was lost or the
+    objects were created before the app was installed.
+
+    Existing entries are kept, unless --overwrite is used. The command can
+    run while the app is running.
+
+    Example:
+
+        # Add the missing entries of all users and groups
+        rebuild_old_data
+    """
+    old_data_rebuild = OldDataRebuild(overwrite=overwrite, page_size=page_size)
+    ConsoleAndFileLogging.add_console_handler(old_data_rebuild.logger)
+    progress = asyncio.run(old_data_rebuild.run(users=users, groups=groups))
+    old_data_rebuild.logger.info(
+        "Done: %d of %d objects written.",
+        sum(p.written for p in progress),
+        sum(p.read for p in progress),
+    )
+
+
+if __name__ == "__main__":
+    rebuild()
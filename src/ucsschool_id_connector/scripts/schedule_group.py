@@ -36,13 +36,21 @@ import asyncio
 
 import click
 
+from ucsschool_id_connector.constants import PRIORITY_BY_NAME
 from ucsschool_id_connector.group_scheduler import GroupScheduler
 from ucsschool_id_connector.utils import ConsoleAndFileLogging
 
 
 @click.command(context_settings={"help_option_names": ["-h", "--help"]})
 @click.argument("groupname")
-def schedule(groupname: str = None):
+@click.option(
+    "--priority",
+    type=click.Choice(list(PRIORITY_BY_NAME)),
+    default="high",
+    show_default=True,
+    help="Send the group ahead of other changes (high) or in order of arrival (normal).",
+)
+def schedule(groupname: str = None, priority: str = "high"):
     """Schedule the distribution of a group.
 
     This command schedules the distribution of a group.
@@ -56,7 +64,7 @@ def schedule(groupname: str = None):
     """
     scheduler = GroupScheduler()
     ConsoleAndFileLogging.add_console_handler(scheduler.logger)
-    asyncio.run(scheduler.queue_group(groupname))
+    asyncio.run(scheduler.queue_group(groupname, PRIORITY_BY_NAME[priority]))
     scheduler.logger.debug("Done.")
 
 
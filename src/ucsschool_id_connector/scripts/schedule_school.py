@@ -36,6 +36,7 @@ import asyncio
 
 import click
 
+from ucsschool_id_connector.constants import PRIORITY_BY_NAME
 from ucsschool_id_connector.school_scheduler import SchoolScheduler
 from ucsschool_id_connector.utils import ConsoleAndFileLogging
 
@@ -43,7 +44,14 @@ from ucsschool_id_connector.utils import ConsoleAndFileLogging
 @click.command(context_settings={"help_option_names": ["-h", "--help"]})
 @click.argument("school")
 @click.argument("num_tasks", type=click.IntRange(1, 32), default=1)
-def schedule(num_tasks: int, school: str = None):
+@click.option(
+    "--priority",
+    type=click.Choice(list(PRIORITY_BY_NAME)),
+    default="normal",
+    show_default=True,
+    help="Send the objects ahead of other changes (high) or in order of arrival (normal).",
+)
+def schedule(num_tasks: int, school: str = None, priority: str = "normal"):
     """Schedule the distribution of a school.
 
     This command schedules the distribution of all school classes, work groups,
@@ -63,7 +71,9 @@ def schedule(num_tasks: int, school: str = None):
     ConsoleAndFileLogging.add_console_handler(scheduler.user_scheduler.logger)
     ConsoleAndFileLogging.add_console_handler(scheduler.group_scheduler.logger)
     ConsoleAndFileLogging.add_console_handler(scheduler.logger)
-    asyncio.run(scheduler.queue_school(school=school, num_tasks=num_tasks))
+    asyncio.run(
+        scheduler.queue_school(school=school, num_tasks=num_tasks, priority=PRIORITY_BY_NAME[priority])
+    )
     scheduler.logger.debug("Done.")
 
 
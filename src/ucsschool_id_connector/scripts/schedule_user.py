@@ -36,13 +36,21 @@ import asyncio
 
 import click
 
+from ucsschool_id_connector.constants import PRIORITY_BY_NAME
 from ucsschool_id_connector.user_scheduler import UserScheduler
 from ucsschool_id_connector.utils import ConsoleAndFileLogging
 
 
 @click.command(context_settings={"help_option_names": ["-h", "--help"]})
 @click.argument("username")
-def schedule(username: str = None):
+@click.option(
+    "--priority",
+    type=click.Choice(list(PRIORITY_BY_NAME)),
+    default="high",
+    show_default=True,
+    help="Send the user ahead of other changes (high) or in order of arrival (normal).",
+)
+def schedule(username: str = None, priority: str = "high"):
     """Schedule the distribution of a user.
 
     This command schedules the distribution of a user.
@@ -56,7 +64,7 @@ def schedule(username: str = None):
     """
     scheduler = UserScheduler()
     ConsoleAndFileLogging.add_console_handler(scheduler.logger)
-    asyncio.run(scheduler.queue_user(username))
+    asyncio.run(scheduler.queue_user(username, PRIORITY_BY_NAME[priority]))
     scheduler.logger.debug("Done.")
 
 
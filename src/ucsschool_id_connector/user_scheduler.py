@@ -34,10 +34,10 @@ from typing import Optional
 import aiofiles
 import ujson
 
-from ucsschool_id_connector.constants import APPCENTER_LISTENER_PATH
+from ucsschool_id_connector.constants import APPCENTER_LISTENER_PATH, PRIORITY_HIGH, PRIORITY_NORMAL
 from ucsschool_id_connector.ldap_access import LDAPAccess
 from ucsschool_id_connector.models import User
-from ucsschool_id_connector.utils import ConsoleAndFileLogging
+from ucsschool_id_connector.utils import ConsoleAndFileLogging, write_priority_marker
 
 
 class UserScheduler:
@@ -49,7 +49,7 @@ class UserScheduler:
         return await self.ldap_access.get_user(username, attributes=["*", "entryUUID"])
 
     @staticmethod
-    async def write_listener_file(user: User) -> None:
+    async def write_listener_file(user: User, priority: int = PRIORITY_NORMAL) -> None:
         """
         Create JSON file to trigger appcenter converter service to create JSON
         file for our app container.
@@ -62,6 +62,10 @@ class UserScheduler:
         This is what the appcenter listener does in
         management/univention-appcenter/python/appcenter/listener.py in
         `AppListener._write_json()`.
+
+        The appcenter converter service doesn't keep additional data, so a
+        `priority` other than `PRIORITY_NORMAL` is stored separately (see
+        :py:func:`ucsschool_id_connector.utils.write_priority_marker`).
         """
         attrs = {
             "entry_uuid": user.attributes["entryUUID"][0],
@@ -70,17 +74,23 @@ class UserScheduler:
             "command": "m",
         }
         entry_uuid = attrs["entry_uuid"]
+        if priority != PRIORITY_NORMAL:
+            write_priority_marker(entry_uuid, priority)
         json_s = ujson.dumps(attrs, sort_keys=True, indent=4)
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S-%f")
         path = Path(APPCENTER_LISTENER_PATH, f"{timestamp}_{entry_uuid}.json")
         async with aiofiles.open(path, "w") as fp:
             await fp.write(json_s)
 
-    async def queue_user(self, username: str) -> None:
+    async def queue_user(self, username: str, priority: int = PRIORITY_HIGH) -> None:
+        """
+        Add user `username` to the in-queue. By default it is sent to the
+        school authorities ahead of other changes (`PRIORITY_HIGH`).
+        """
         self.logger.debug("Searching LDAP for user with username %r...", username)
         user = await self.get_user_from_ldap(username)
         if user:
             self.logger.info("Adding user to in-queue: %r.", user.dn)
-            await self.write_listener_file(user)
+            await self.write_listener_file(user, priority)
         else:
             self.logger.error("No school user with username %r could be found.", username)
@@ -49,6 +49,7 @@ from .constants import (
     LOG_ENTRY_CMDLINE_FORMAT,
     LOG_ENTRY_DEBUG_FORMAT,
     LOG_FILE_PATH_QUEUES,
+    PRIORITY_MARKER_DIR,
     PYPROJECT_FILE,
     SERVICE_NAME,
     UCR_CONTAINER_CLASS,
@@ -71,7 +72,8 @@ _ucr_db_mtime = 0.0
 UCRValue = Union[bool, int, str, None]
 
 
-@lru_cache(maxsize=16)
+# one entry per UCR variable read (per queue settings add one per queue), cleared when base.conf changes
+@lru_cache(maxsize=None)
 def _get_ucrv_cached(ucr: str, default: UCRValue = None) -> UCRValue:
     """Cached reading of UCR values from disk."""
     try:
@@ -103,6 +105,39 @@ def get_ucrv(ucr: str, default: UCRValue = None) -> UCRValue:
     return _get_ucrv_cached(ucr, default)
 
 
+def _get_ucrv_for_queue(ucr: str, default: UCRValue, queue_name: str = None) -> UCRValue:
+    """
+    Get UCR value. If `queue_name` is set, `<ucr>/<queue_name>` takes
+    precedence over `<ucr>`, so a setting can be changed for a single queue.
+    """
+    if queue_name:
+        value = get_ucrv(f"{ucr}/{queue_name}")
+        if value is not None:
+            return value
+    return get_ucrv(ucr, default)
+
+
+def get_ucrv_str(ucr: str, default: str, queue_name: str = None) -> str:
+    """Get UCR value as stripped, lower case string, `default` if unset."""
+    return str(_get_ucrv_for_queue(ucr, default, queue_name)).strip().lower()
+
+
+def get_ucrv_int(ucr: str, default: int, queue_name: str = None) -> int:
+    """Get UCR value as integer, `default` if unset or not a number."""
+    try:
+        return int(_get_ucrv_for_queue(ucr, default, queue_name))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_ucrv_bool(ucr: str, default: bool, queue_name: str = None) -> bool:
+    """Get UCR value as boolean, `default` if unset."""
+    value = _get_ucrv_for_queue(ucr, None, queue_name)
+    if value is None:
+        return default
+    return str(value).strip().lower() in ("1", "yes", "true", "enable", "enabled", "on")
+
+
 def get_log_level() -> int:
     ucr_level = get_ucrv(*UCRV_LOG_LEVEL)
     if ucr_level not in ("DEBUG", "INFO", "WARNING", "ERROR"):
@@ -341,6 +376,16 @@ def base58_to_entry_uuid(b58_s: str) -> str:
     return str(uuid)
 
 
+def write_priority_marker(entry_uuid: str, priority: int) -> None:
+    """
+    Request that the next change of the object with `entry_uuid` arriving in
+    the in-queue is sent to the school authorities with `priority`. Must be
+    called before the change is created.
+    """
+    PRIORITY_MARKER_DIR.mkdir(mode=0o750, parents=True, exist_ok=True)
+    Path(PRIORITY_MARKER_DIR, entry_uuid).write_text(str(priority))
+
+
 def recursive_dict_update(
     ori: Dict[Any, Any], updater: Dict[Any, Any], update_none_values: bool = True
 ) -> Dict[Any, Any]: